@@ -5,6 +5,8 @@
 # SPDX-License-Identifier:    BSD-3-Clause
 #
 # This code is provided as an example of a REST API server
+# NOTE: The magserver tool, installed with pymagnum, replaces this example. It reads the devices in the
+# background and answers every request from the latest snapshot. Run `magserver --help` for details.
 # run the program with --help for details of options.
 import json
 import signal
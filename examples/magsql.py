@@ -5,6 +5,8 @@
 # SPDX-License-Identifier:    BSD-3-Clause
 #
 # This code is provided as an example of loading data into MySql/MariaDB database
+# NOTE: The magsql tool, installed with pymagnum, replaces this example. It keeps one connection
+# open and batches inserts. Run `magsql --help` for details.
 # run the program with --help for details of options.
 #  python3 magsql.py --help
 #
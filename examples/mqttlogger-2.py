@@ -4,6 +4,8 @@
 # SPDX-License-Identifier:    BSD-3-Clause
 #
 # This code is provided as an example of a JSON logger that writes to MQTT
+# NOTE: The magmqtt tool, installed with pymagnum, publishes only what has changed and keeps the same
+# device topics for full records. Run `magmqtt --help` for details.
 # The data is published at every interval seconds
 # If you publish the subtopic 'refresh' (i.e magnum/refresh) this will publish data immediately
 # run the program with --help for details of options.
@@ -4,51 +4,148 @@
 #
 # SPDX-License-Identifier:    BSD-3-Clause
 #
-# This code is provided to print a MySQL schema definition from a JSON file generate by magdump
+# This code is provided to print a SQL schema definition from JSON generated by magdump
 # run the program with --help for details of options.
 #  mag2sql --help
 #
 #  magdump|mag2sql
 #  or
 #  magdump|mag2sql>[filename].sql
+#  or, for a better guess at the column types, from many samples
+#  magdump --interval 60 > samples.json
+#  mag2sql --input samples.json --dialect sqlite
+#
+# The input can be any number of magdump documents, new line delimited or concatenated.
+# The type of each column is the widest type seen in any sample; a field that is 0 in one sample
+# and 12.5 in another is a float.
 #
 import sys
-import json
 import argparse
 
+from magnum.magjson import iterload
+from magnum.magsql import SQL_TYPES
+
+#
+# types in order from narrowest to widest, by their position in SQL_TYPES
+#
+BOOL = 2
+INT = 1
+FLOAT = 0
+TEXT = 3
+WIDTH = {BOOL: 0, INT: 1, FLOAT: 2, TEXT: 3}
+
+
+def valuetype(value):
+    if type(value) == bool:
+        return BOOL
+    elif type(value) == int:
+        return INT
+    elif type(value) == float:
+        return FLOAT
+    return TEXT
+
+
+def collect(documents):
+    '''
+    Scan magdump documents for the widest type of every column of every table
+
+    :return: The database name and a dictionary of table to a dictionary of column to type
+    :rtype: tuple
+    '''
+    database = None
+    tables = {}
+    for document in documents:
+        if type(document) != list:
+            document = [document]
+        for alldata in document:
+            if database == None:
+                database = alldata['device']
+            for item in alldata['data']:
+                columns = tables.setdefault(item['device'], {})
+                for variable, value in item['data'].items():
+                    if value == None:
+                        #
+                        # typed by the first sample that has a value, text if none of them do
+                        #
+                        columns.setdefault(variable, None)
+                        continue
+                    newtype = valuetype(value)
+                    oldtype = columns.get(variable)
+                    if oldtype == None or WIDTH[newtype] > WIDTH[oldtype]:
+                        columns[variable] = newtype
+    for columns in tables.values():
+        for variable, columntype in columns.items():
+            if columntype == None:
+                columns[variable] = TEXT
+    return database, tables
+
+
+def quote(name, dialect):
+    if dialect == "mysql":
+        return f"`{name}`"
+    return f'"{name}"'
+
+
+def ddl(database, tables, dialect="mysql"):
+    '''
+    The statements to create the tables
+
+    :rtype: list
+    '''
+    types = SQL_TYPES[dialect]
+    keyfield = quote("datetime", dialect)
+    statements = []
+    if dialect == "mysql":
+        statements.append(f"create schema if not exists {database};")
+        statements.append(f"use {database};")
+    elif dialect == "postgresql":
+        statements.append(f"create schema if not exists {database};")
+        statements.append(f"set search_path to {database};")
+    for table, columns in tables.items():
+        lines = []
+        if dialect == "mysql":
+            lines.append(f"\t{keyfield} datetime DEFAULT now()")
+        elif dialect == "sqlite":
+            lines.append(f"\t{keyfield} text DEFAULT current_timestamp")
+        else:
+            lines.append(f"\t{keyfield} timestamp DEFAULT now()")
+        for variable, columntype in columns.items():
+            lines.append(f"\t{quote(variable, dialect)} {types[columntype]} default NULL")
+        if dialect == "mysql":
+            #
+            # the primary key is the clustered index in InnoDB so time ranges are contiguous
+            #
+            lines.append(f"\tPRIMARY KEY ({keyfield})")
+            statements.append(f"create table if not exists {quote(table, dialect)} (\n" + ",\n".join(lines) + "\n\t) ENGINE=InnoDB;\n")
+        else:
+            statements.append(f"create table if not exists {quote(table, dialect)} (\n" + ",\n".join(lines) + "\n\t);")
+            statements.append(f"create index if not exists {table}_datetime on {quote(table, dialect)} ({keyfield});\n")
+    return statements
+
 
 def main():
-    parser = argparse.ArgumentParser(description="Magnum JSON to MySQL Generator", prog="mag2sql", fromfile_prefix_chars='@',
+    parser = argparse.ArgumentParser(description="Magnum JSON to SQL Generator", prog="mag2sql", fromfile_prefix_chars='@',
                                      epilog="Expects input to be JSON generated by magdump. Refer to https://github.com/CharlesGodwin/pymagnum for details")
-    parser.add_argument("--input", "-i", default=None,
-                        help="Input file name `None` implies stdin (default: %(default)s)")
+    parser.add_argument("--input", "-i", default=None, nargs='+',
+                        help="Input file name(s) `None` implies stdin (default: %(default)s)")
+    parser.add_argument("--dialect", default="mysql", choices=list(SQL_TYPES),
+                        help="SQL dialect of the output (default: %(default)s)")
     args = parser.parse_args()
-    if args.input == None:
-        inputjson = sys.stdin.read()
-        alldata = json.loads(inputjson)
-    else:
-        f = open(args.input, "r")
-        alldata = json.load(f)
-    db_database = alldata['device']
-    print(f"create schema if not exists {db_database};")
-    print(f"use {db_database};")
-    for item in alldata['data']:
-        table = item['device']
-        print(f"create table if not exists {table} (")
-        keyfield = "datetime"
-        print(f"\t`{keyfield}` datetime DEFAULT now(),")
-        for variable, value in item['data'].items():
-            if type(value) == float:
-                dbtype = "float"
-            elif type(value) == int:
-                dbtype = "integer"
-            elif type(value) == bool:
-                dbtype = "integer(1)"
-            else:
-                dbtype = "varchar(25)"
-            print(f"\t`{variable}` {dbtype} default NULL,")
-        print(
-            f"\tPRIMARY KEY (`{keyfield}`)\n\t) ENGINE=InnoDB;\n")
+
+    def documents():
+        if args.input == None:
+            yield from iterload(sys.stdin)
+        else:
+            for filename in args.input:
+                with open(filename, "rb") as file:
+                    yield from iterload(file)
+    database, tables = collect(documents())
+    if database == None:
+        print("Error: There was no data in the input.", file=sys.stderr)
+        exit(2)
+    for statement in ddl(database, tables, args.dialect):
+        print(statement)
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# An archive of every raw packet read from the network, compressed, for diagnosing decoding problems later.
+# run the program with --help for details of options.
+#
+#  magarchive --device /dev/ttyUSB0 --directory /var/lib/magnum/archive
+#  magarchive --directory /var/lib/magnum/archive --list
+#  magarchive --directory /var/lib/magnum/archive --start 2026-01-01T12:00 --end 2026-01-01T13:00 --output hour.txt
+#  magdump --device !hour.txt
+#
+# The port is read continuously, not in samples, and each packet has the time its first byte arrived.
+# Packets are collected into chunks, about one a minute, and each chunk is compressed with zstd, if the
+# zstandard package is installed, or zlib. There is one archive file per UTC day, named prefix-YYYY-MM-DD.mga,
+# and beside it an index file, .idx, with the time span and file offset of each chunk. Finding an hour reads the
+# index and only that hour's chunks are decompressed. A missing or short index is rebuilt from the chunk headers.
+#
+# A chunk is a header
+#   magic MAGC, codec (0 zlib, 1 zstd), packet count, first and last timestamp, raw size and compressed size
+# followed by the compressed packets, stored as columns as they compress better that way
+#   milliseconds since the previous packet, 4 bytes each
+#   length of each packet, 2 bytes each
+#   how many packets back is the packet it is XORed with, 1 byte each, 0 for none
+#   the packets
+#
+# Most packets are the same as the last one of their type, or nearly so, so each packet is XORed with the
+# last packet of the same length, first and last byte, leaving mostly zeros which compress very well.
+#
+# Extracted packets are in the capture file format read by Magnum(device="!filename") with the time of each
+# packet as a comment.
+#
+import os
+import signal
+import sys
+import time
+import zlib
+
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from struct import Struct
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import magnum
+
+CHUNK = Struct("<4sBIddII")
+CHUNK_MAGIC = b"MAGC"
+INDEX = Struct("<ddQ")
+ZLIB = 0
+ZSTD = 1
+SUFFIX = ".mga"
+
+
+def _compress(codec, data, level):
+    if codec == ZSTD:
+        return zstandard.ZstdCompressor(level=level or 19).compress(data)
+    return zlib.compress(data, level or 9)
+
+
+def _decompress(codec, data, rawsize):
+    if codec == ZSTD:
+        if zstandard == None:
+            raise ValueError("This archive was compressed with zstd, it requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompress(data, max_output_size=rawsize)
+    return zlib.decompress(data)
+
+
+def encodeChunk(frames, codec=None, level=None):
+    '''
+    Compress a list of (timestamp, packet) in time order to a chunk
+
+    :param codec: ZLIB or ZSTD, defaults to ZSTD if zstandard is installed
+    :param level: Compression level, defaults to 19 for zstd and 9 for zlib
+    :rtype: bytes
+    '''
+    if codec == None:
+        codec = ZLIB if zstandard == None else ZSTD
+    first = frames[0][0]
+    count = len(frames)
+    offsets = [round((timestamp - first) * 1000) for timestamp, packet in frames]
+    deltas = [max(0, offset - previous) for offset, previous in zip(offsets, [0] + offsets[:-1])]
+    latest = {}
+    references = []
+    packets = []
+    for index, (timestamp, packet) in enumerate(frames):
+        packet = bytes(packet)
+        key = (len(packet), packet[:1], packet[-1:])
+        previous = latest.get(key)
+        if previous != None and index - previous <= 255:
+            references.append(index - previous)
+            packets.append(bytes([byte ^ other for byte, other in zip(packet, frames[previous][1])]))
+        else:
+            references.append(0)
+            packets.append(packet)
+        latest[key] = index
+    raw = (Struct(f"<{count}I").pack(*deltas) + Struct(f"<{count}H").pack(*[len(packet) for packet in packets])
+           + bytes(references) + b"".join(packets))
+    data = _compress(codec, raw, level)
+    return CHUNK.pack(CHUNK_MAGIC, codec, len(frames), first, frames[-1][0], len(raw), len(data)) + data
+
+
+def decodeChunk(header, data):
+    '''
+    The (timestamp, packet) list of a chunk
+
+    :param header: The unpacked CHUNK header
+    :param data: The compressed packets
+    '''
+    magic, codec, count, first, last, rawsize, size = header
+    raw = _decompress(codec, data, rawsize)
+    deltas = Struct(f"<{count}I").unpack_from(raw)
+    lengths = Struct(f"<{count}H").unpack_from(raw, count * 4)
+    references = raw[count * 6:count * 7]
+    position = count * 7
+    offset = 0
+    frames = []
+    for index, (delta, length, reference) in enumerate(zip(deltas, lengths, references)):
+        offset += delta
+        packet = raw[position:position + length]
+        if reference != 0:
+            packet = bytes([byte ^ other for byte, other in zip(packet, frames[index - reference][1])])
+        frames.append((first + offset / 1000, packet))
+        position += length
+    return frames
+
+
+class ArchiveWriter:
+    '''
+    Append packets to a daily compressed archive
+
+    :param directory: Folder for the archive files, defaults to the current folder
+    :type directory: str, optional
+    :param prefix: Start of each file name, defaults to magnum
+    :type prefix: str, optional
+    :param chunkseconds: Seconds of packets in each chunk, defaults to 60
+    :type chunkseconds: float, optional
+    :param codec: ZLIB or ZSTD, defaults to ZSTD if zstandard is installed
+    :param level: Compression level, defaults to 19 for zstd and 9 for zlib
+    :type level: int, optional
+    '''
+
+    def __init__(self, directory=".", prefix="magnum", chunkseconds=60, codec=None, level=None):
+        if codec == ZSTD and zstandard == None:
+            raise ValueError("zstd compression requires the zstandard package")
+        self.directory = directory
+        self.prefix = prefix
+        self.chunkseconds = chunkseconds
+        self.codec = codec
+        self.level = level
+        self.frames = []
+        self.newest = None
+        os.makedirs(directory, exist_ok=True)
+
+    def append(self, timestamp, packet):
+        '''
+        Add a packet. Packets older than the newest are given its time so the archive stays in order.
+
+        :param timestamp: Unix epoch seconds
+        :type timestamp: float
+        :param packet: The raw packet
+        :type packet: bytes
+        '''
+        if self.newest != None and timestamp < self.newest:
+            timestamp = self.newest
+        if len(self.frames) > 0 and timestamp - self.frames[0][0] >= self.chunkseconds:
+            self.flush()
+        self.frames.append((timestamp, bytes(packet)))
+        self.newest = timestamp
+
+    def extend(self, timestamp, packets):
+        '''
+        Add a list of packets read at the same time, such as from Magnum.readPackets()
+        '''
+        for packet in packets:
+            self.append(timestamp, packet)
+
+    def flush(self):
+        '''
+        Compress the collected packets and write them as a chunk
+        '''
+        if len(self.frames) == 0:
+            return
+        first = self.frames[0][0]
+        chunk = encodeChunk(self.frames, self.codec, self.level)
+        filename = os.path.join(self.directory, archiveName(self.prefix, first))
+        with open(filename, "ab") as file:
+            offset = file.tell()
+            file.write(chunk)
+        with open(filename + ".idx", "ab") as file:
+            file.write(INDEX.pack(first, self.frames[-1][0], offset))
+        self.frames = []
+
+    def discard(self):
+        '''
+        Drop the collected packets
+        '''
+        self.frames = []
+
+    def close(self):
+        self.flush()
+
+
+def archiveName(prefix, timestamp):
+    return f"{prefix}-{datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%d')}{SUFFIX}"
+
+
+class ArchiveReader:
+    '''
+    Find and read packets in an archive made by ArchiveWriter
+
+    :param directory: Folder of the archive files, defaults to the current folder
+    :type directory: str, optional
+    :param prefix: Start of each file name, defaults to magnum
+    :type prefix: str, optional
+    '''
+
+    def __init__(self, directory=".", prefix="magnum"):
+        self.directory = directory
+        self.prefix = prefix
+
+    def files(self):
+        '''
+        The archive file names in time order
+        '''
+        return sorted([os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                       if name.startswith(self.prefix + "-") and name.endswith(SUFFIX)])
+
+    def index(self, filename):
+        '''
+        The (first timestamp, last timestamp, offset) of each chunk of a file.
+        The index file is rebuilt if it is missing or doesn't cover the whole file.
+        '''
+        size = os.path.getsize(filename)
+        entries = []
+        if os.path.exists(filename + ".idx"):
+            with open(filename + ".idx", "rb") as file:
+                data = file.read()
+            entries = [INDEX.unpack_from(data, position)
+                       for position in range(0, len(data) - INDEX.size + 1, INDEX.size)]
+        if len(entries) > 0:
+            with open(filename, "rb") as file:
+                file.seek(entries[-1][2])
+                header = file.read(CHUNK.size)
+            if len(header) == CHUNK.size and entries[-1][2] + CHUNK.size + CHUNK.unpack(header)[6] == size:
+                return entries
+        entries = self._scan(filename, size)
+        with open(filename + ".idx", "wb") as file:
+            for entry in entries:
+                file.write(INDEX.pack(*entry))
+        return entries
+
+    def _scan(self, filename, size):
+        entries = []
+        with open(filename, "rb") as file:
+            offset = 0
+            while offset + CHUNK.size <= size:
+                header = CHUNK.unpack(file.read(CHUNK.size))
+                if header[0] != CHUNK_MAGIC or offset + CHUNK.size + header[6] > size:
+                    #
+                    # a chunk cut short by a crash is ignored
+                    #
+                    break
+                entries.append((header[3], header[4], offset))
+                offset += CHUNK.size + header[6]
+                file.seek(offset)
+        return entries
+
+    def chunks(self, start=None, end=None):
+        '''
+        The chunks that overlap a time span
+
+        :return: Iterator of (filename, first timestamp, last timestamp, offset)
+        '''
+        for filename in self.files():
+            day = datetime.strptime(os.path.basename(filename)[len(self.prefix) + 1:-len(SUFFIX)],
+                                    "%Y-%m-%d").replace(tzinfo=timezone.utc)
+            #
+            # a chunk can run past midnight into the next day
+            #
+            if start != None and (day + timedelta(days=2)).timestamp() <= start:
+                continue
+            if end != None and day.timestamp() >= end:
+                continue
+            entries = self.index(filename)
+            position = 0 if start == None else bisect_left([entry[1] for entry in entries], start)
+            for first, last, offset in entries[position:]:
+                if end != None and first >= end:
+                    break
+                yield (filename, first, last, offset)
+
+    def frames(self, start=None, end=None):
+        '''
+        The packets in a time span. Only the chunks that overlap the span are decompressed.
+
+        :param start: Unix epoch seconds of the first packet, defaults to the oldest
+        :type start: float, optional
+        :param end: Unix epoch seconds after the last packet, defaults to after the newest
+        :type end: float, optional
+        :return: Iterator of (timestamp, packet)
+        '''
+        file = None
+        try:
+            for filename, first, last, offset in self.chunks(start, end):
+                if file == None or file.name != filename:
+                    if file != None:
+                        file.close()
+                    file = open(filename, "rb")
+                file.seek(offset)
+                header = CHUNK.unpack(file.read(CHUNK.size))
+                for timestamp, packet in decodeChunk(header, file.read(header[6])):
+                    if (start == None or timestamp >= start) and (end == None or timestamp < end):
+                        yield (timestamp, packet)
+        finally:
+            if file != None:
+                file.close()
+
+    def extract(self, file, start=None, end=None):
+        '''
+        Write the packets in a time span in the capture file format read by Magnum(device="!filename")
+
+        :param file: A file opened for writing text
+        :return: Number of packets written
+        :rtype: int
+        '''
+        count = 0
+        for timestamp, packet in self.frames(start, end):
+            moment = datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="milliseconds")
+            file.write(f"Length:{len(packet):2} {'PACKET':10}=>{packet.hex().upper()} # {moment}\n")
+            count += 1
+        return count
+
+
+def sigint_handler(signal, frame):
+    print('Interrupted. Shutting down.')
+    sys.exit(0)
+
+
+def main():
+    from magnum.magparser import MagnumArgumentParser
+    from magnum.magquery import parseTime
+
+    parser = MagnumArgumentParser(description="Magnum Packet Archive", prog="magarchive", fromfile_prefix_chars='@',
+                                  epilog="Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    parser.add_argument("--device", "-d", default=f"{'/dev/ttyUSB0' if parser.isPosix else 'COM1'}",
+                        help="Serial device name to record (default: %(default)s)")
+    parser.add_argument("--directory", default=".",
+                        help="Folder for the archive files (default: %(default)s)")
+    parser.add_argument("--list", action="store_true", default=False,
+                        help="List the archive files instead of recording (default: %(default)s)")
+    parser.add_argument("--start", default=None,
+                        help="Extract packets from this time instead of recording, ISO 8601, epoch seconds or relative such as -1h (default: %(default)s)")
+    parser.add_argument("--end", default=None,
+                        help="Time after the last packet to extract (default: %(default)s)")
+    parser.add_argument("--output", "-o", default=None,
+                        help="Capture file for the extracted packets, None implies stdout (default: %(default)s)")
+    parser.add_argument("--verbose", '-v', action="store_true", default=False,
+                        help="Display options at runtime (default: %(default)s)")
+    seldom = parser.add_argument_group("Seldom used")
+    seldom.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    seldom.add_argument("--prefix", default="magnum",
+                        help="Start of each archive file name (default: %(default)s)")
+    seldom.add_argument("--chunkseconds", default=60, type=int,
+                        help="Seconds of packets in each compressed chunk (default: %(default)s)")
+    seldom.add_argument("--zlib", action="store_true", default=False,
+                        help="Use zlib even if zstandard is installed (default: %(default)s)")
+    seldom.add_argument("--timeout", default=0.005, type=float,
+                        help="Timeout for serial read (default: %(default)s)")
+    args = parser.parse_args()
+    if args.list or args.start != None or args.end != None:
+        reader = ArchiveReader(args.directory, args.prefix)
+        if args.list:
+            for filename in reader.files():
+                entries = reader.index(filename)
+                span = ""
+                if len(entries) > 0:
+                    span = (f"{datetime.fromtimestamp(entries[0][0], timezone.utc).isoformat()} to "
+                            f"{datetime.fromtimestamp(entries[-1][1], timezone.utc).isoformat()}")
+                print(f"{filename} {os.path.getsize(filename)} bytes {len(entries)} chunks {span}")
+            return
+        output = sys.stdout if args.output == None else open(args.output, "w")
+        try:
+            count = reader.extract(output, parseTime(args.start), parseTime(args.end))
+        finally:
+            if output != sys.stdout:
+                output.close()
+        print(f"{count} packets extracted", file=sys.stderr)
+        return
+    #
+    # imported here as importing magnum.magnum may wait for the system to settle after boot
+    #
+    from magnum.magnum import Magnum
+
+    signal.signal(signal.SIGINT, sigint_handler)
+    args = parser.magnum_parse_args()
+    if args.verbose:
+        print('Magnum Archive Version:{0}'.format(magnum.__version__))
+        print(f"Options:{str(args)[10:-1]}")
+    reader = Magnum(device=args.device[0], timeout=args.timeout)
+    writer = ArchiveWriter(args.directory, prefix=args.prefix, chunkseconds=args.chunkseconds,
+                           codec=ZLIB if args.zlib else None)
+    try:
+        while True:
+            #
+            # the port is read continuously, not in samples, so no packet is missed between reads
+            #
+            try:
+                for timestamp, packet in reader.streamPackets():
+                    writer.append(timestamp, packet)
+                if reader.stored_packets != None:
+                    break
+            except Exception as e:
+                print("{0} {1}".format(args.device[0], str(e)))
+                time.sleep(1)
+    finally:
+        reader._closePort()
+        writer.close()
+
+
+if __name__ == '__main__':
+    main()
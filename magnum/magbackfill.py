@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# Rebuilds history from archived raw packets, as fast as they can be decoded.
+# run the program with --help for details of options.
+#
+#  magbackfill --directory /var/lib/magnum/archive --start 2026-01-01 --end 2026-02-01 --output january.json
+#  magbackfill --directory /var/lib/magnum/archive --interval 10 --store magnum.db
+#  magbackfill --capture hour.txt --history magnum.ring
+#
+# Packets from a magarchive archive, or a capture file extracted from one, are classified and passed to the
+# devices' parse() methods with no serial port and no waiting. Time is the capture time of the packets, not the
+# clock, and a snapshot of the devices is taken at the end of every interval of capture time that has packets.
+# Each snapshot is a magdump style document written to a JSON lines file, which magload can load, a SQLite store
+# or a maghistory ring file. Use it after changing how a device derives its fields.
+# A store has the rows of the comm_device in the time of the packets replaced, not added to. A ring file is refused
+# if it has records newer than the first snapshot.
+#
+import math
+import os
+import sys
+import time
+
+from datetime import datetime, timezone
+
+import magnum
+from magnum.magjson import dumps
+
+
+def captureFrames(filename):
+    '''
+    The packets of a capture file written by magarchive, each line has the packet time as a comment
+
+    :return: Iterator of (timestamp, packet)
+    '''
+    with open(filename) as file:
+        for line in file:
+            data, separator, comment = line.partition("#")
+            position = data.find("=>")
+            if position < 0:
+                continue
+            if comment.strip() == "":
+                raise ValueError(f"{filename} has a packet without a time, it must be extracted by magarchive")
+            yield (datetime.fromisoformat(comment.strip()).timestamp(), bytes.fromhex(data[position + 2:].strip()))
+
+
+class JsonLinesWriter:
+    '''
+    Writes each document as a line of JSON, the format read by magload
+
+    :param file: A file opened for writing bytes
+    '''
+
+    def __init__(self, file):
+        self.file = file
+        self.pending = []
+
+    def write(self, alldata, flush=True):
+        if type(alldata) != list:
+            alldata = [alldata]
+        self.pending.extend([dumps(item) + b"\n" for item in alldata])
+        if flush:
+            self._record()
+
+    def _record(self):
+        self.file.write(b"".join(self.pending))
+        self.pending = []
+
+    def flush(self):
+        self._record()
+        self.file.flush()
+
+    def discard(self):
+        self.pending = []
+
+    def close(self):
+        self.flush()
+
+
+class Backfill:
+    '''
+    Replays timestamped packets through a reader and writes a snapshot at the end of every interval
+
+    :param sink: Any object with write(), such as JsonLinesWriter, SQLiteStore or HistoryRing
+    :param interval: Seconds of capture time between snapshots, defaults to 60
+    :type interval: float, optional
+    :param comm_device: The comm_device of the snapshots, defaults to archive
+    :type comm_device: str, optional
+    :param packets: Packets classified together, the same as the packets of a reader, defaults to 50
+    :type packets: int, optional
+    :param cleanpackets: Clean up unknown packets, defaults to True
+    :type cleanpackets: boolean, optional
+    :param decoder: The reader class, defaults to Magnum
+    '''
+
+    def __init__(self, sink, interval=60, comm_device="archive", packets=50, cleanpackets=True, decoder=None):
+        if decoder == None:
+            from magnum.magnum import Magnum
+            decoder = Magnum
+        self.sink = sink
+        self.interval = interval
+        self.comm_device = comm_device
+        self.packets = packets
+        self.reader = decoder(device=comm_device, packets=packets, cleanpackets=cleanpackets)
+        self.frames = 0
+        self.snapshots = 0
+        self.skipped = 0
+        self.first = None
+        self.last = None
+
+    def run(self, frames):
+        '''
+        Replay packets, in time order
+
+        :param frames: Iterator of (timestamp, packet)
+        :return: Number of snapshots written, snapshots the sink refused are counted in skipped
+        :rtype: int
+        '''
+        reader = self.reader
+        interval = self.interval
+        packets = self.packets
+        boundary = None
+        batch = []
+        messages = []
+        before = self.snapshots
+        for timestamp, packet in frames:
+            if boundary == None:
+                boundary = (timestamp // interval + 1) * interval
+                if self.first == None:
+                    self.first = timestamp
+            elif timestamp >= boundary:
+                if len(batch) > 0:
+                    messages.extend(reader._parsePackets(batch))
+                    batch = []
+                self._snapshot(boundary, messages)
+                messages = []
+                boundary = (timestamp // interval + 1) * interval
+            batch.append(packet)
+            self.frames += 1
+            self.last = timestamp
+            if len(batch) >= packets:
+                messages.extend(reader._parsePackets(batch))
+                batch = []
+        if len(batch) > 0:
+            messages.extend(reader._parsePackets(batch))
+        if boundary != None:
+            self._snapshot(boundary, messages)
+        return self.snapshots - before
+
+    def _snapshot(self, timestamp, messages):
+        devices = self.reader._updateDevices(messages)
+        if len(devices) == 0:
+            return
+        moment = datetime.fromtimestamp(timestamp, timezone.utc).replace(microsecond=0).astimezone().isoformat()
+        #
+        # a HistoryRing says how many it recorded, it refuses snapshots older than its newest record
+        #
+        if self.sink.write({"datetime": moment, "device": "MAGNUM", "comm_device": self.comm_device, "data": devices}) == 0:
+            self.skipped += 1
+            return
+        self.snapshots += 1
+
+
+def main():
+    import argparse
+
+    #
+    # no serial port is used so don't wait for the system to settle
+    #
+    os.environ.setdefault("MAGNUM_DELAY", "0")
+    from magnum.magquery import parseTime
+    parser = argparse.ArgumentParser(description="Magnum History Backfill", prog="magbackfill", fromfile_prefix_chars='@',
+                                     epilog="Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--directory", default=None,
+                        help="Folder of a magarchive archive (default: %(default)s)")
+    source.add_argument("--capture", default=None,
+                        help="Capture file extracted by magarchive (default: %(default)s)")
+    parser.add_argument("--start", default=None,
+                        help="Capture time of the first packet, ISO 8601, epoch seconds or relative such as -7d (default: %(default)s)")
+    parser.add_argument("--end", default=None,
+                        help="Capture time after the last packet (default: %(default)s)")
+    parser.add_argument("--interval", "-i", default=60, type=float,
+                        help="Seconds of capture time between snapshots (default: %(default)s)")
+    sink = parser.add_mutually_exclusive_group()
+    sink.add_argument("--output", "-o", default=None,
+                      help="JSON lines file for the snapshots, None implies stdout (default: %(default)s)")
+    sink.add_argument("--store", default=None,
+                      help="SQLite time series store file (default: %(default)s)")
+    sink.add_argument("--history", default=None,
+                      help="maghistory ring file, created if it doesn't exist (default: %(default)s)")
+    seldom = parser.add_argument_group("Seldom used")
+    seldom.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    seldom.add_argument("--prefix", default="magnum",
+                        help="Start of each archive file name (default: %(default)s)")
+    seldom.add_argument("--comm_device", default="archive",
+                        help="comm_device of the snapshots (default: %(default)s)")
+    seldom.add_argument("--capacity", default=None, type=int,
+                        help="Records in a new --history file (default: one per interval of the archive)")
+    seldom.add_argument("--decoder", default="magnum.magnum:Magnum",
+                        help="Reader class, as module:class (default: %(default)s)")
+    seldom.add_argument("--packets", default=50, type=int,
+                        help="Packets classified together (default: %(default)s)")
+    seldom.add_argument("--nocleanup", action="store_false", default=True, dest='cleanpackets',
+                        help="Suppress clean up of unknown packets (default: False)")
+    args = parser.parse_args()
+    start = parseTime(args.start)
+    end = parseTime(args.end)
+    if args.directory != None:
+        from magnum.magarchive import ArchiveReader
+        archive = ArchiveReader(args.directory, args.prefix)
+
+        def frames():
+            return archive.frames(start, end)
+    else:
+        def frames():
+            return ((timestamp, packet) for timestamp, packet in captureFrames(args.capture)
+                    if (start == None or timestamp >= start) and (end == None or timestamp < end))
+
+    def span():
+        '''
+        Capture time of the first and last packet, None if there are no packets
+        '''
+        if args.directory != None:
+            chunks = [(first, last) for filename, first, last, offset in archive.chunks(start, end)]
+            if len(chunks) == 0:
+                return None
+            return (chunks[0][0] if start == None else max(chunks[0][0], start),
+                    chunks[-1][1] if end == None else min(chunks[-1][1], end))
+        first = None
+        for timestamp, packet in frames():
+            if first == None:
+                first = timestamp
+        return None if first == None else (first, timestamp)
+
+    def moment(timestamp):
+        return datetime.fromtimestamp(timestamp, timezone.utc).replace(microsecond=0).astimezone().isoformat()
+    from magnum.magverify import loadDecoder
+    decoder = loadDecoder(args.decoder)
+    output = None
+    if args.store != None:
+        from magnum.magstore import SQLiteStore
+        writer = SQLiteStore(args.store, batchrows=1000)
+        limits = span()
+        if limits != None:
+            #
+            # the snapshots replace those of an earlier backfill of the same time instead of being added again,
+            # the last snapshot is at the end of the interval of the last packet
+            #
+            removed = writer.deleteRange(limits[0], (limits[1] // args.interval + 1) * args.interval + 1, args.comm_device)
+            if removed > 0:
+                print(f"Replaced {removed} rows of {args.comm_device} from {moment(limits[0])} in {args.store}",
+                      file=sys.stderr)
+    elif args.history != None:
+        from magnum.maghistory import HistoryRing, numericColumns
+        columns = None
+        capacity = args.capacity
+        if not os.path.exists(args.history):
+            #
+            # the columns of a new ring file come from the first few thousand packets
+            #
+            probe = decoder(device=args.comm_device, packets=args.packets)
+            sample = []
+            for timestamp, packet in frames():
+                sample.append(packet)
+                if len(sample) >= 5000:
+                    break
+            columns = numericColumns(probe._updateDevices(probe._parsePackets(sample)))
+            if capacity == None:
+                limits = span()
+                capacity = 1
+                if limits != None:
+                    capacity = int((limits[1] - limits[0]) // args.interval) + 2
+        writer = HistoryRing(args.history, columns=columns, capacity=capacity)
+        newest = writer.newest
+        if not math.isnan(newest):
+            #
+            # a ring file only takes records newer than the newest it has
+            #
+            limits = span()
+            if limits != None and (limits[0] // args.interval + 1) * args.interval <= newest:
+                writer.close()
+                parser.error(f"{args.history} has records up to {moment(newest)} and the packets start at "
+                             f"{moment(limits[0])}, use --start after its newest record or a new file")
+    else:
+        output = sys.stdout.buffer if args.output == None else open(args.output, "wb")
+        writer = JsonLinesWriter(output)
+    backfill = Backfill(writer, interval=args.interval, comm_device=args.comm_device, packets=args.packets,
+                        cleanpackets=args.cleanpackets, decoder=decoder)
+    began = time.perf_counter()
+    try:
+        backfill.run(frames())
+    finally:
+        writer.close()
+        if output != None and output != sys.stdout.buffer:
+            output.close()
+    elapsed = time.perf_counter() - began
+    if backfill.frames > 0:
+        captured = backfill.last - backfill.first
+        print(f"{backfill.frames} packets, {backfill.snapshots} snapshots, {captured:.0f} s of capture in {elapsed:.1f} s, "
+              f"{captured / elapsed if elapsed > 0 else 0:.0f} times real time", file=sys.stderr)
+        if backfill.skipped > 0:
+            print(f"{backfill.skipped} snapshots were older than the newest record of {args.history} and were skipped",
+                  file=sys.stderr)
+    else:
+        print("No packets found", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# Benchmarks of the stages of reading Magnum data. No hardware is needed.
+# run the program with --help for details of options.
+#
+#  magbench
+#  magbench --frames 1000000 --output results.json
+#  magbench --save_budgets mybudgets.json --margin 0.5
+#  magbench --budgets mybudgets.json
+#
+# The synthetic corpus is made by magnum.maggen, a simulated network with stacked inverters and every accessory.
+# The fragmented corpus splits some packets in two, as happens on a busy network, so that cleanup() has work to do.
+#
+# Every benchmark reports a rate, operations per second. A budget file is a JSON dictionary of benchmark name to
+# the lowest acceptable rate. With --budgets, if any rate is below its budget the program exits with status 1.
+# Rates depend on the machine so budgets are only checked when asked for, with a file saved on the same machine.
+# The budgets bundled with the package, benchmark_budgets.json, are for a desktop PC, --budgets alone uses them.
+#
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import magnum
+
+#
+# half the rates of a desktop PC, installed with the package
+#
+BUDGETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_budgets.json")
+
+
+def corpus(frames, split=0.0):
+    '''
+    A list of packets from a simulated network, the same every time
+
+    :param frames: Number of packets
+    :type frames: int
+    :param split: Chance of a packet being split in two, defaults to 0
+    :type split: float, optional
+    :rtype: list of bytes
+    '''
+    from magnum.maggen import TrafficGenerator
+
+    generator = TrafficGenerator(seed=1, stacked=True, start=1767268800, split=split)
+    return [packet for timestamp, label, packet in generator.frames(count=frames)]
+
+
+def writeCapture(packets, filename):
+    '''
+    Write packets to a file in the format used by magtest and Magnum(device="!filename")
+    '''
+    with open(filename, "w") as file:
+        for packet in packets:
+            file.write(f"Length:{len(packet):2} {'PACKET':10}=>{packet.hex().upper()}\n")
+
+
+def measure(function, operations, repeat=3):
+    '''
+    Run function repeat times and keep the fastest
+
+    :param operations: The number of operations in one run of function, used for the rate
+    :return: Dictionary of operations, seconds and rate
+    '''
+    best = None
+    for attempt in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+        if best == None or seconds < best:
+            best = seconds
+    return {"operations": operations, "seconds": best, "rate": operations / best if best > 0 else float("inf")}
+
+
+def run(frames=100000, packets=50, repeat=3):
+    '''
+    Run every benchmark
+
+    :param frames: Packets in the corpus, defaults to 100000
+    :type frames: int, optional
+    :param packets: Packets per sample, defaults to 50
+    :type packets: int, optional
+    :return: Dictionary of benchmark name to its result, each with a unit
+    :rtype: dict
+    '''
+    from magnum.magjson import DeviceEncoder, dumps
+    from magnum.magnum import Magnum
+
+    results = {}
+    clean = corpus(frames)
+    fragmented = corpus(frames, split=0.15)
+    samples = max(1, frames // packets)
+    with tempfile.TemporaryDirectory() as directory:
+        capture = os.path.join(directory, "corpus.txt")
+        writeCapture(clean, capture)
+        reader = Magnum(device="!" + capture, packets=packets)
+
+        def classify():
+            for packet in clean:
+                reader._parsePacket(packet)
+        results["classify"] = dict(measure(classify, len(clean), repeat), unit="frames/s")
+        messages = [[reader._parsePacket(packet) for packet in fragmented[start:start + packets]]
+                    for start in range(0, len(fragmented), packets)]
+
+        def cleanup():
+            for sample in messages:
+                reader.cleanup(sample)
+        results["cleanup"] = dict(measure(cleanup, len(fragmented), repeat), unit="frames/s")
+
+        def getdevices():
+            for sample in range(samples):
+                reader.getDevices()
+        results["getdevices"] = dict(measure(getdevices, samples, repeat), unit="samples/s")
+        devices = reader.getDevices()
+        document = {"datetime": "2026-01-01T00:00:00+00:00", "device": "MAGNUM",
+                    "comm_device": reader.getComm_Device(), "data": devices}
+
+        def allinone():
+            for sample in range(samples):
+                reader.allinone(document)
+        results["allinone"] = dict(measure(allinone, samples, repeat), unit="samples/s")
+
+        def encode():
+            for sample in range(samples):
+                dumps(document)
+        results["json"] = dict(measure(encode, samples, repeat), unit="samples/s")
+        encoder = DeviceEncoder(reader)
+        #
+        # successive readings, as on a live network, so only devices whose data didn't change are cached
+        #
+        readings = [reader.getDevices() for sample in range(min(samples, 100))]
+
+        def encodecached():
+            for sample in range(samples):
+                encoder.encodeSnapshot(document["datetime"], readings[sample % len(readings)])
+        results["json_cached"] = dict(measure(encodecached, samples, repeat), unit="samples/s")
+
+        def replay():
+            replayer = Magnum(device="!" + capture, packets=packets)
+            for sample in range(samples):
+                replayer.getDevices()
+        results["replay"] = dict(measure(replay, samples * packets, repeat), unit="frames/s")
+    return results
+
+
+def check(results, budgets):
+    '''
+    Compare results to budgets
+
+    :return: List of messages for the benchmarks slower than their budget
+    :rtype: list
+    '''
+    failures = []
+    for name, budget in budgets.items():
+        result = results.get(name)
+        if result != None and result["rate"] < budget:
+            failures.append(f"{name} {result['rate']:.0f} {result['unit']} is below the budget of {budget:.0f}")
+    return failures
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Magnum Benchmarks", prog="magbench",
+                                     epilog="Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    parser.add_argument("--frames", "-f", default=100000, type=int,
+                        help="Packets in the synthetic corpus (default: %(default)s)")
+    parser.add_argument("--packets", default=50, type=int,
+                        help="Packets per sample (default: %(default)s)")
+    parser.add_argument("--repeat", default=3, type=int,
+                        help="Runs of each benchmark, the fastest is kept (default: %(default)s)")
+    parser.add_argument("--output", "-o", default=None,
+                        help="Write the results as JSON to this file, - for stdout (default: %(default)s)")
+    parser.add_argument("--budgets", "-b", default=None, nargs="?", const=BUDGETS,
+                        help="Check the rates against a JSON file of benchmark name to lowest acceptable rate, "
+                             "saved on this machine. Alone it uses the budgets of a desktop PC (default: %(default)s)")
+    parser.add_argument("--save_budgets", default=None,
+                        help="Write a budget file from these results (default: %(default)s)")
+    parser.add_argument("--margin", default=0.5, type=float,
+                        help="Fraction of each rate used by --save_budgets (default: %(default)s)")
+    parser.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    args = parser.parse_args()
+    #
+    # no serial port is used so don't wait for the system to settle
+    #
+    os.environ.setdefault("MAGNUM_DELAY", "0")
+    results = run(frames=args.frames, packets=args.packets, repeat=args.repeat)
+    report = {"version": magnum.__version__, "python": platform.python_version(), "machine": platform.machine(),
+              "frames": args.frames, "packets": args.packets, "results": results}
+    for name, result in results.items():
+        print(f"{name:12}{result['rate']:14.0f} {result['unit']:10}{result['seconds']:8.3f} s", file=sys.stderr)
+    if args.output == "-":
+        print(json.dumps(report, indent=2))
+    elif args.output != None:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.save_budgets != None:
+        with open(args.save_budgets, "w") as file:
+            json.dump({name: round(result["rate"] * args.margin) for name, result in results.items()}, file, indent=2)
+    if args.budgets != None:
+        with open(args.budgets) as file:
+            failures = check(results, json.load(file))
+        for failure in failures:
+            print(f"FAILED {failure}", file=sys.stderr)
+        if len(failures) > 0:
+            exit(1)
+
+
+if __name__ == '__main__':
+    main()
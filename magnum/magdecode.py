@@ -0,0 +1,115 @@
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# A table driven packet decoder.
+# It identifies packets with dictionary lookups on their length and first or last byte, and unpacks them with
+# precompiled struct.Struct objects, instead of a chain of comparisons and a format string per packet.
+# The results must be exactly the same as Magnum._parsePacket, use magverify to check.
+#
+#  reader = TableDecoder(device="/dev/ttyUSB0")
+#
+from magnum import *
+from magnum.inverterdevice import InverterDevice
+from magnum.magnum import Magnum, logger
+
+from struct import Struct
+
+#
+# packets identified by their length and first byte
+#
+FIRST_BYTE_TYPES = {
+    (2, 0x91): RTR_91,
+    (6, 0xa1): AGS_A1,
+    (6, 0xa2): AGS_A2,
+    (8, 0xD1): ACLD_D1,
+    (13, 0xC2): PT_C2,
+    (14, 0xC3): PT_C3,
+    (16, 0xC1): PT_C1,
+    (18, 0x81): BMK_81,
+}
+#
+# 21 byte remote packets identified by their last byte
+#
+LAST_BYTE_TYPES = {
+    0xa0: REMOTE_A0,
+    0xa1: REMOTE_A1,
+    0xa2: REMOTE_A2,
+    0xa3: REMOTE_A3,
+    0xa4: REMOTE_A4,
+    0x80: REMOTE_80,
+    0xC0: REMOTE_C0,
+    0xC1: REMOTE_C1,
+    0xC2: REMOTE_C2,
+    0xC3: REMOTE_C3,
+    0x11: REMOTE_11,
+    0xD0: REMOTE_D0,
+}
+
+
+class TableDecoder(Magnum):
+    '''
+    A Magnum reader with a table driven _parsePacket(). It takes the same parameters as Magnum.
+    '''
+    structs = {packetType: Struct(">" + packetFormat) for packetType, packetFormat in Magnum.unpackFormats.items()
+               if packetFormat != ''}
+
+    def _parsePacket(self, packet):
+        if self.flip and len(packet) > 0:
+            packet = bytearray([(~byte) & 0xff for byte in packet])
+        packetLen = len(packet)
+        if packetLen == 22:
+            packet = packet[:21]
+            packetLen = 21
+        elif packetLen == 17:
+            packet = packet[:16]
+            packetLen = 16
+        if packetLen == 0:
+            return [UNKNOWN, packet, {}, self.unpackFormats[UNKNOWN]]
+        firstbyte = packet[0]
+        packetType = FIRST_BYTE_TYPES.get((packetLen, firstbyte), UNKNOWN)
+        if packetType == UNKNOWN:
+            if packetLen == 21:
+                packetType = self._classify21(packet, firstbyte)
+            elif packetLen == 16:
+                if packet[10] <= 0x27 and packet[14] in InverterDevice.inverter_models:
+                    packetType = INV_C
+                    if self.inverter_revision == -1:
+                        self.inverter_revision = packet[10]
+                        self.inverter_model = packet[14]
+                else:
+                    packetType = REMOTE_C
+        unpacker = self.structs.get(packetType)
+        if unpacker == None:
+            return [packetType, packet, {}, self.unpackFormats[packetType]]
+        try:
+            return [packetType, packet, unpacker.unpack(packet), self.unpackFormats[packetType]]
+        except Exception as e:
+            self.statistics.failures += 1
+            logger.warning("{0} Converting {1} - {2} bytes".format(e.args[0], packetType, packetLen))
+            return [UNKNOWN, packet, {}, self.unpackFormats[UNKNOWN]]
+
+    def _classify21(self, packet, firstbyte):
+        lastbyte = packet[20]
+        if lastbyte != 0:
+            return LAST_BYTE_TYPES.get(lastbyte, UNKNOWN)
+        version = packet[10]
+        model = packet[14]
+        if firstbyte == 0:
+            if packet[14:] == self.sevenzeros:
+                return REMOTE_00
+            #
+            # the same comparison as Magnum._parsePacket, including its grouping
+            #
+            if version == (self.inverter_revision and model == self.inverter_model) or self.inverter_revision == -1:
+                return INV
+            return REMOTE_00
+        if (version == self.inverter_revision and model == self.inverter_model) or self.inverter_revision == -1:
+            if model in InverterDevice.inverter_models:
+                if self.inverter_revision == -1:
+                    self.inverter_revision = version
+                    self.inverter_model = model
+                return INV
+            return UNKNOWN
+        return REMOTE_00
@@ -6,7 +6,6 @@
 # This code is provided as an example of a JSON object
 # run the program with --help for details of options.
 #
-import json
 import signal
 import sys
 import time
@@ -16,6 +15,7 @@ from datetime import datetime, timezone
 # from tzlocal import get_localzone
 
 import magnum
+from magnum.magjson import DeviceEncoder, dumps
 from magnum.magnum import Magnum
 from magnum.magparser import MagnumArgumentParser
 
@@ -50,6 +50,8 @@ def main():
                         help="Suppress clean up of unknown packets (default: False)")
     seldom.add_argument("--allinone", action="store_true", default=False,
                         help="Process data as a flat single row (default: %(default)s)")
+    seldom.add_argument("--stale", default=None, type=float, dest='staleness',
+                        help="Leave out devices that have sent no data for this many seconds (default: %(default)s)")
     args = parser.magnum_parse_args()
     if hasattr(args, 'v1'): # a relic but not harmful
         args.allinone = True
@@ -65,7 +67,8 @@ def main():
     for device in args.device:
         try:
             magnumReader = Magnum(device=device, packets=args.packets, trace=args.trace,
-                                  timeout=args.timeout, cleanpackets=args.cleanpackets)
+                                  timeout=args.timeout, cleanpackets=args.cleanpackets,
+                                  staleness=args.staleness, dropstale=True)
             magnumReader.getDevices()  # test read to see if all's good
             magnumReaders[magnumReader.getComm_Device()] = magnumReader
         except Exception as e:
@@ -76,18 +79,25 @@ def main():
     if args.interval != 0 and args.verbose == True:
         print("Dumping every:{1} seconds. Using: {0} ".format(
             list(magnumReaders.keys()), args.interval))
-    if args.pretty:
-        indent = 2
-    else:
-        indent = None
+    encoders = {}
+    for comm_device, magnumReader in magnumReaders.items():
+        encoders[comm_device] = DeviceEncoder(magnumReader)
+    output = sys.stdout.buffer
     while True:
         start = time.time()
         commdevices = []
+        encoded = []
         timestamp = datetime.now(timezone.utc).replace(microsecond=0).astimezone().isoformat()
         for comm_device, magnumReader in magnumReaders.items():
             try:
                 devices = magnumReader.getDevices()
                 if len(devices) != 0:
+                    if not (args.allinone or args.pretty):
+                        #
+                        # fast path, devices that have not changed are not encoded again
+                        #
+                        encoded.append(encoders[comm_device].encodeSnapshot(timestamp, devices))
+                        continue
                     alldata = {}
                     alldata["datetime"] = timestamp
                     alldata["device"] = 'MAGNUM'
@@ -105,11 +115,16 @@ def main():
             except Exception as e:
                 print("{0} {1}".format(comm_device, str(e)))
         if len(commdevices) == 1:
-            outputdata = commdevices [0]
+            outputdata = dumps(commdevices[0], pretty=args.pretty)
+        elif len(commdevices) > 1:
+            outputdata = dumps(commdevices, pretty=args.pretty)
+        elif len(encoded) == 1:
+            outputdata = encoded[0]
         else:
-            outputdata = commdevices
-        print(json.dumps(
-            outputdata, indent=indent, ensure_ascii=True, allow_nan=True, separators=(',', ':')))
+            outputdata = b'[' + b','.join(encoded) + b']'
+        sys.stdout.flush()
+        output.write(outputdata + b'\n')
+        output.flush()
         if args.interval == 0:
             break
         interval = time.time() - start
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# Generates synthetic Magnum network traffic for testing and benchmarks.
+# run the program with --help for details of options.
+#
+#  maggen --seconds 3600 --output hour.txt
+#  magdump --device !hour.txt
+#
+#  maggen --pty --stacked
+#  magdump --device /dev/pts/5
+#
+# Packets are built with struct.pack from the same formats the reader unpacks them with, Magnum.unpackFormats.
+# Each bus cycle is an inverter packet, or two for stacked inverters, the remote's reply, cycling through
+# its packet types, then one accessory in turn: BMK, AGS, PT100 and the router.
+# The values follow a simple off grid system. Solar charging rises and falls over the day, the load wanders,
+# and the battery state of charge, voltage and temperatures follow.
+#
+# Damage seen on real networks can be added: packets split in two, pairs of packets run together and flipped bits.
+#
+# PT_C3, ACLD_D1 and the old style INVERTER_C and REMOTE_C packets are not generated.
+#
+import math
+import os
+import random
+import struct
+import sys
+import time
+
+from magnum import *
+
+#
+# a real example of each packet type, used for the fields that aren't modelled
+#
+SEEDS = {
+    INV: "400000F60016770001003D1133246B010005025800",
+    REMOTE_00: "00002808640A280000C89B840C1412200000000000",
+    REMOTE_A0: "00002808640A280000C89B840C14122014007300A0",
+    REMOTE_A1: "00002808640A280000C89B840C14600090787878A1",
+    REMOTE_A2: "00003C04500F170601C8A5860100465500781478A2",
+    REMOTE_A3: "00003C04500F170601C8A58601005E5F00240200A3",
+    REMOTE_A4: "00003C04500F170601C8A58601001E1E00000000A4",
+    REMOTE_80: "00002808640A280000C89B840C1412200000280080",
+    REMOTE_11: "00002808640A280000C89B840C1414000000000011",
+    REMOTE_C0: "00002808640A280000C89B840C14000000080000C0",
+    REMOTE_C1: "00002808640A280000C89B840C14000000080000C1",
+    REMOTE_C2: "00002808640A280000C89B840C14000000080000C2",
+    REMOTE_C3: "00002808640A280000C89B840C14000000080000C3",
+    REMOTE_D0: "00002808640A280000C89B840C14000000000000D0",
+    BMK_81: "814C09F1007407E00C08FF984FF000140A01",
+    AGS_A1: "A102343A007F",
+    AGS_A2: "A20000000000",
+    PT_C1: "C1001300024D008505BC1194101B313E",
+    PT_C2: "C200000200AC0002050B641425",
+    RTR_91: "9120",
+}
+ACCESSORIES = (BMK, AGS, PT100, RTR)
+#
+# bits per byte on the wire, 8 data, 1 start and 1 stop, at 19200 baud
+#
+BYTE_SECONDS = 10 / 19200
+
+
+class TrafficGenerator:
+    '''
+    Generates the packets of a simulated Magnum network
+
+    :param seed: Seed for the random numbers, the same seed gives the same traffic, defaults to None
+    :type seed: int, optional
+    :param stacked: Two inverters, master and slave, defaults to False
+    :type stacked: boolean, optional
+    :param accessories: The accessories on the network, defaults to BMK, AGS, PT100 and RTR
+    :type accessories: tuple, optional
+    :param start: Epoch seconds of the first packet, defaults to now
+    :type start: float, optional
+    :param cycle: Seconds per bus cycle, defaults to 0.1
+    :type cycle: float, optional
+    :param split: Chance of a packet being split in two, defaults to 0
+    :type split: float, optional
+    :param merge: Chance of a packet running into the next one, defaults to 0
+    :type merge: float, optional
+    :param errors: Chance of a bit being flipped in a packet, defaults to 0
+    :type errors: float, optional
+    '''
+
+    def __init__(self, seed=None, stacked=False, accessories=ACCESSORIES, start=None, cycle=0.1,
+                 split=0.0, merge=0.0, errors=0.0):
+        from magnum.magnum import Magnum
+
+        self.formats = {packetType: ">" + packetFormat for packetType, packetFormat in Magnum.unpackFormats.items()}
+        self.templates = {packetType: list(struct.unpack(self.formats[packetType], bytes.fromhex(frame)))
+                          for packetType, frame in SEEDS.items()}
+        self.random = random.Random(seed)
+        self.stacked = stacked
+        self.accessories = accessories
+        self.clock = time.time() if start == None else start
+        self.cycle = cycle
+        self.split = split
+        self.merge = merge
+        self.errors = errors
+        self.remotes = [REMOTE_00, REMOTE_A0, REMOTE_A1, REMOTE_A2, REMOTE_A3, REMOTE_A4]
+        if BMK in accessories:
+            self.remotes.append(REMOTE_80)
+        if PT100 in accessories:
+            self.remotes.extend([REMOTE_C0, REMOTE_C1, REMOTE_C2, REMOTE_C3])
+        self.slots = []
+        for accessory in accessories:
+            self.slots.extend({BMK: [BMK_81], AGS: [AGS_A1, AGS_A2], PT100: [PT_C1, PT_C2], RTR: [RTR_91]}[accessory])
+        self.cycles = 0
+        #
+        # the state of the simulated system
+        #
+        self.soc = 75.0
+        self.load = 20.0
+        self.temperature = 20.0
+
+    def build(self, packetType, fields):
+        '''
+        Pack fields into a packet, the reverse of unpacking it
+
+        :param packetType: One of the packet types in Magnum.unpackFormats
+        :type packetType: str
+        :param fields: The field values in unpack order
+        :type fields: list
+        :rtype: bytes
+        '''
+        return struct.pack(self.formats[packetType], *fields)
+
+    def _step(self):
+        hour = time.localtime(self.clock).tm_hour + time.localtime(self.clock).tm_min / 60
+        self.solar = max(0.0, math.sin((hour - 6) / 12 * math.pi)) * 40
+        self.load = min(80.0, max(2.0, self.load + self.random.gauss(0, 0.5)))
+        self.current = self.solar - self.load
+        self.soc = min(100.0, max(5.0, self.soc + self.current * self.cycle / 3600 / 400 * 100))
+        self.vdc = 23.6 + self.soc / 100 * 2.4 + self.current * 0.01
+        self.temperature = min(60.0, max(-20.0, self.temperature + self.random.gauss(0, 0.02)))
+
+    def _inverter(self, stackmode):
+        fields = list(self.templates[INV])
+        fields[2] = round(self.vdc * 10)
+        fields[3] = round(self.load)
+        fields[4] = 119 + self.random.randint(0, 2)
+        fields[9] = round(self.temperature)
+        fields[10] = round(self.temperature + 10 + self.load / 4)
+        fields[11] = round(self.temperature + 5 + self.load / 6)
+        fields[13] = stackmode
+        fields[15] = round(self.load * self.vdc / 120)
+        fields[16] = 600 + self.random.randint(-1, 1)
+        return self.build(INV, fields)
+
+    def _accessory(self, packetType):
+        fields = list(self.templates[packetType])
+        if packetType == BMK_81:
+            fields[1] = round(self.soc)
+            fields[2] = round(self.vdc * 100)
+            fields[3] = round(self.current * 10)
+        elif packetType == AGS_A1:
+            fields[3] = round(self.temperature * 9 / 5 + 32) if self.temperature < 52 else 127
+            fields[5] = round(self.vdc * 10 / 2)
+        elif packetType == PT_C1:
+            fields[4] = round(self.vdc * 10 + 2)
+            fields[5] = round(self.solar * 10)
+            fields[6] = round((60 + self.solar) * 10) if self.solar > 0 else 0
+        return self.build(packetType, fields)
+
+    def cycleFrames(self):
+        '''
+        The packets of one bus cycle
+
+        :return: List of (packet type, packet)
+        :rtype: list
+        '''
+        self._step()
+        frames = [(INV, self._inverter(1))]
+        if self.stacked:
+            frames.append((INV, self._inverter(2)))
+        remote = self.remotes[self.cycles % len(self.remotes)]
+        frames.append((remote, self.build(remote, self.templates[remote])))
+        if len(self.slots) > 0:
+            accessory = self.slots[self.cycles % len(self.slots)]
+            frames.append((accessory, self._accessory(accessory)))
+        self.cycles += 1
+        return frames
+
+    def frames(self, count=None, seconds=None):
+        '''
+        Generate packets, with damage if it was asked for
+
+        :param count: Stop after this many packets, defaults to None
+        :type count: int, optional
+        :param seconds: Stop after this many seconds of traffic, defaults to None
+        :type seconds: float, optional
+        :return: Iterator of (epoch seconds, label, packet). The label is the packet type, or SPLIT, MERGED or ERROR
+        '''
+        end = None if seconds == None else self.clock + seconds
+        produced = 0
+        carry = None
+        while (count == None or produced < count) and (end == None or self.clock < end):
+            start = self.clock
+            offset = 0.0
+            for packetType, packet in self.cycleFrames():
+                label = packetType
+                if carry != None:
+                    packet = carry + packet
+                    label = "MERGED"
+                    carry = None
+                elif self.merge > 0 and self.random.random() < self.merge:
+                    carry = packet
+                    continue
+                if self.errors > 0 and self.random.random() < self.errors:
+                    damaged = bytearray(packet)
+                    damaged[self.random.randrange(len(damaged))] ^= 1 << self.random.randrange(8)
+                    packet = bytes(damaged)
+                    label = "ERROR"
+                if self.split > 0 and len(packet) > 1 and self.random.random() < self.split:
+                    middle = self.random.randrange(1, len(packet))
+                    parts = [packet[:middle], packet[middle:]]
+                    label = "SPLIT"
+                else:
+                    parts = [packet]
+                for part in parts:
+                    yield (start + offset, label, part)
+                    offset += len(part) * BYTE_SECONDS + 0.002
+                    produced += 1
+                    if count != None and produced >= count:
+                        return
+            self.clock = start + self.cycle
+
+
+def writeCapture(frames, file):
+    '''
+    Write packets in the format read by Magnum(device="!filename"), the same as magtest --log
+
+    :param frames: Iterator of (epoch seconds, label, packet)
+    :param file: A file opened for writing text
+    :return: Number of packets written
+    :rtype: int
+    '''
+    count = 0
+    for timestamp, label, packet in frames:
+        file.write(f"Length:{len(packet):2} {label:10}=>{packet.hex().upper()}\n")
+        count += 1
+    return count
+
+
+def writePty(frames, speed=1.0):
+    '''
+    Write packets to a new pseudo terminal with the timing of a real network, until interrupted.
+    The name of the terminal is printed, use it as the device of the reader.
+
+    :param frames: Iterator of (epoch seconds, label, packet)
+    :param speed: How much faster than real time, defaults to 1
+    :type speed: float, optional
+    '''
+    import tty
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    print(f"Writing to {os.ttyname(slave)}")
+    sys.stdout.flush()
+    first = None
+    started = time.monotonic()
+    try:
+        for timestamp, label, packet in frames:
+            if first == None:
+                first = timestamp
+            delay = (timestamp - first) / speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+            os.write(master, packet)
+    finally:
+        os.close(master)
+        os.close(slave)
+
+
+def main():
+    import argparse
+    import signal
+
+    import magnum
+
+    def sigint_handler(signal, frame):
+        print('Interrupted. Shutting down.', file=sys.stderr)
+        sys.exit(0)
+    signal.signal(signal.SIGINT, sigint_handler)
+    parser = argparse.ArgumentParser(description="Magnum Traffic Generator", prog="maggen",
+                                     epilog="Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    parser.add_argument("--frames", "-f", default=None, type=int,
+                        help="Number of packets to generate (default: %(default)s)")
+    parser.add_argument("--seconds", "-s", default=None, type=float,
+                        help="Seconds of traffic to generate (default: 60 unless --frames or --pty is used)")
+    parser.add_argument("--output", "-o", default=None,
+                        help="Capture file to write, None implies stdout (default: %(default)s)")
+    parser.add_argument("--pty", action="store_true", default=False,
+                        help="Write to a new pseudo terminal in real time instead of a file (default: %(default)s)")
+    parser.add_argument("--speed", default=1.0, type=float,
+                        help="With --pty, how many times faster than real time (default: %(default)s)")
+    parser.add_argument("--stacked", action="store_true", default=False,
+                        help="Two stacked inverters (default: %(default)s)")
+    parser.add_argument("--accessories", nargs='*', default=list(ACCESSORIES), choices=list(ACCESSORIES),
+                        help="Accessories on the network (default: %(default)s)")
+    parser.add_argument("--split", default=0.0, type=float,
+                        help="Chance, 0 to 1, of a packet being split in two (default: %(default)s)")
+    parser.add_argument("--merge", default=0.0, type=float,
+                        help="Chance, 0 to 1, of a packet running into the next (default: %(default)s)")
+    parser.add_argument("--errors", default=0.0, type=float,
+                        help="Chance, 0 to 1, of a bit being flipped in a packet (default: %(default)s)")
+    parser.add_argument("--seed", default=None, type=int,
+                        help="Random number seed, the same seed gives the same traffic (default: %(default)s)")
+    parser.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    args = parser.parse_args()
+    if args.frames == None and args.seconds == None and not args.pty:
+        args.seconds = 60
+    #
+    # no serial port is used so don't wait for the system to settle
+    #
+    os.environ.setdefault("MAGNUM_DELAY", "0")
+    generator = TrafficGenerator(seed=args.seed, stacked=args.stacked, accessories=tuple(args.accessories),
+                                 split=args.split, merge=args.merge, errors=args.errors)
+    frames = generator.frames(count=args.frames, seconds=args.seconds)
+    if args.pty:
+        writePty(frames, speed=args.speed)
+    elif args.output == None:
+        writeCapture(frames, sys.stdout)
+    else:
+        with open(args.output, "w") as file:
+            count = writeCapture(frames, file)
+        print(f"{count} packets written to {args.output}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
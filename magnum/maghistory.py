@@ -0,0 +1,504 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# A local history of samples in a fixed size, memory mapped, ring file. No database is needed.
+# run the program with --help for details of options.
+#
+#  maghistory --file /var/lib/magnum/history.ring --days 7 --interval 10
+#
+# The file is allocated once, at its full size, and every sample is written as a fixed size record in the
+# next slot, overwriting the oldest when the ring is full. Only the record and a few bytes of the header
+# change for each sample, which is kind to SD cards.
+#
+# The layout, all little endian, is
+#   header      magic, header size, record size, capacity, count of records ever written, newest timestamp,
+#               length of the metadata and the metadata, JSON with the columns and comm_devices.
+#               It is padded to a multiple of 4096 bytes
+#   records     capacity records of
+#                   timestamp     8 byte float, Unix epoch seconds
+#                   comm_device   2 byte unsigned integer, index into the comm_devices of the metadata
+#                   6 bytes of padding
+#                   one 8 byte float per column, NaN for a missing value
+#
+# The columns are the numeric fields of the allinone layout, such as INV_vdc and BMK_soc. When a device that
+# wasn't there when the file was created appears, such as an AGS that is switched on later, the file is rewritten
+# once with the new columns added and the records kept. Records are in time order, so finding a time is a binary
+# search, and if NumPy is installed a range of records can be read as a NumPy structured array that is a view of
+# the file, not a copy.
+#
+import json
+import math
+import mmap
+import os
+import signal
+import sys
+import time
+
+from datetime import datetime, timezone
+from struct import Struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import magnum
+from magnum.magschema import FlatSchema
+
+MAGIC = b"MAGRING1"
+HEADER = Struct("<8sIIQQdI")
+PAGE = 4096
+#
+# room left in the header for comm_devices added later
+#
+METADATA_SLACK = 1024
+RECORD_PREFIX = "<dH6x"
+
+
+def numericColumns(devices):
+    '''
+    The allinone column names of the numeric fields of a list of device dictionaries
+
+    :rtype: tuple
+    '''
+    schema = FlatSchema()
+    return tuple([key for key, value in schema.rowdata(devices).items() if type(value) in (int, float, bool)])
+
+
+class HistoryRing:
+    '''
+    A fixed size ring of sample records in a memory mapped file. An existing file is opened with its own
+    columns and capacity, otherwise a new one is created and columns and capacity are required.
+
+    It can be used wherever RollingWriter or SQLSink are, with write(), flush(), discard() and close().
+
+    :param filename: The ring file
+    :type filename: str
+    :param columns: Names of the columns, usually from numericColumns(), defaults to None
+    :type columns: tuple, optional
+    :param capacity: Number of records in the ring, defaults to None
+    :type capacity: int, optional
+    :param readonly: Open an existing file for reading only, such as while another process writes to it, defaults to False
+    :type readonly: boolean, optional
+    :param syncseconds: Seconds between writes of the changes to the file by write(), defaults to 60
+    :type syncseconds: float, optional
+    '''
+
+    def __init__(self, filename, columns=None, capacity=None, readonly=False, syncseconds=60):
+        self.filename = filename
+        self.readonly = readonly
+        self.syncseconds = syncseconds
+        if not os.path.exists(filename):
+            if readonly:
+                raise FileNotFoundError(f"History file {filename} does not exist")
+            if columns == None or capacity == None or capacity < 1:
+                raise ValueError("A new history file requires columns and a capacity")
+            self._create(filename, tuple(columns), capacity)
+        self._open()
+        self.schema = FlatSchema()
+        self.pending = []
+        self.synced = time.monotonic()
+
+    def _open(self):
+        filename = self.filename
+        self.file = open(filename, "rb" if self.readonly else "r+b")
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ if self.readonly else mmap.ACCESS_WRITE)
+            magic, self.headersize, self.recordsize, self.capacity, count, newest, metalength = HEADER.unpack_from(self.map)
+            if magic != MAGIC:
+                raise ValueError(f"{filename} is not a history file")
+            metadata = json.loads(self.map[HEADER.size:HEADER.size + metalength].decode("utf-8"))
+        except Exception:
+            self.file.close()
+            raise
+        self.columns = tuple(metadata["columns"])
+        self.comm_devices = metadata["comm_devices"]
+        self.record = Struct(RECORD_PREFIX + "d" * len(self.columns))
+        self.positions = {column: index for index, column in enumerate(self.columns)}
+
+    def _create(self, filename, columns, capacity):
+        record = Struct(RECORD_PREFIX + "d" * len(columns))
+        metadata = json.dumps({"columns": columns, "comm_devices": []}).encode("utf-8")
+        headersize = (HEADER.size + len(metadata) + METADATA_SLACK + PAGE - 1) // PAGE * PAGE
+        with open(filename, "wb") as file:
+            file.write(HEADER.pack(MAGIC, headersize, record.size, capacity, 0, float("nan"), len(metadata)) + metadata)
+            size = headersize + record.size * capacity
+            if hasattr(os, "posix_fallocate"):
+                os.posix_fallocate(file.fileno(), 0, size)
+            else:
+                file.truncate(size)
+
+    @property
+    def count(self):
+        '''
+        Number of records ever written
+        '''
+        return HEADER.unpack_from(self.map)[4]
+
+    @property
+    def newest(self):
+        '''
+        Timestamp of the newest record, NaN if there are none
+        '''
+        return HEADER.unpack_from(self.map)[5]
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _slot(self, index, count):
+        '''
+        The file offset of a record, index 0 is the oldest
+        '''
+        first = count % self.capacity if count >= self.capacity else 0
+        return self.headersize + ((first + index) % self.capacity) * self.recordsize
+
+    def timestamp(self, index):
+        '''
+        The timestamp of a record, index 0 is the oldest
+        '''
+        return self.record.unpack_from(self.map, self._slot(index, self.count))[0]
+
+    def find(self, timestamp):
+        '''
+        Binary search for the index of the first record at or after a time
+
+        :param timestamp: Unix epoch seconds
+        :type timestamp: float
+        :return: An index from 0 to len(), len() if every record is older
+        :rtype: int
+        '''
+        count = self.count
+        low = 0
+        high = min(count, self.capacity)
+        while low < high:
+            middle = (low + high) // 2
+            if self.record.unpack_from(self.map, self._slot(middle, count))[0] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _range(self, start, end):
+        low = 0 if start == None else self.find(start)
+        high = len(self) if end == None else self.find(end)
+        return low, max(low, high)
+
+    def append(self, timestamp, comm_device, values):
+        '''
+        Write one record into the next slot
+
+        :param timestamp: Unix epoch seconds
+        :type timestamp: float
+        :param comm_device: Name of the device the sample was read from
+        :type comm_device: str
+        :param values: Dictionary of column name to value, columns that aren't in the file are ignored
+        :type values: dict
+        :return: False if the record was not written as it is older than the newest record
+        :rtype: boolean
+        '''
+        count, newest = HEADER.unpack_from(self.map)[4:6]
+        if not math.isnan(newest) and timestamp < newest:
+            return False
+        row = [math.nan] * len(self.columns)
+        for column, value in values.items():
+            position = self.positions.get(column)
+            if position != None and value != None:
+                try:
+                    row[position] = float(value)
+                except (TypeError, ValueError):
+                    #
+                    # a field that is usually a number but not this time, it is recorded as missing
+                    #
+                    pass
+        self.record.pack_into(self.map, self.headersize + (count % self.capacity) * self.recordsize,
+                              timestamp, self._device(comm_device), *row)
+        #
+        # the record is complete before the count says it is there
+        #
+        HEADER.pack_into(self.map, 0, MAGIC, self.headersize, self.recordsize, self.capacity, count + 1, timestamp,
+                         HEADER.unpack_from(self.map)[6])
+        return True
+
+    def _device(self, comm_device):
+        if comm_device in self.comm_devices:
+            return self.comm_devices.index(comm_device)
+        self.comm_devices.append(comm_device)
+        metadata = json.dumps({"columns": self.columns, "comm_devices": self.comm_devices}).encode("utf-8")
+        if HEADER.size + len(metadata) > self.headersize:
+            self.comm_devices.pop()
+            raise ValueError(f"No room in the header of {self.filename} for {comm_device}")
+        self.map[HEADER.size:HEADER.size + len(metadata)] = metadata
+        HEADER.pack_into(self.map, 0, MAGIC, self.headersize, self.recordsize, self.capacity, self.count,
+                         self.newest, len(metadata))
+        return len(self.comm_devices) - 1
+
+    def rows(self, start=None, end=None, comm_device=None):
+        '''
+        Read records in time order
+
+        :param start: Unix epoch seconds of the first record, defaults to the oldest
+        :type start: float, optional
+        :param end: Unix epoch seconds after the last record, defaults to after the newest
+        :type end: float, optional
+        :param comm_device: Only the records of this device, defaults to all
+        :type comm_device: str, optional
+        :return: Iterator of (timestamp, comm_device, dictionary of column to value), missing values are left out
+        '''
+        low, high = self._range(start, end)
+        count = self.count
+        columns = self.columns
+        for index in range(low, high):
+            record = self.record.unpack_from(self.map, self._slot(index, count))
+            name = self.comm_devices[record[1]]
+            if comm_device != None and name != comm_device:
+                continue
+            yield (record[0], name, {column: value for column, value in zip(columns, record[2:]) if value == value})
+
+    def select(self, columns, start=None, end=None, comm_device=None):
+        '''
+        Read some columns of records in time order, quicker than rows() for a few columns
+
+        :param columns: Names of the columns
+        :type columns: list
+        :return: Iterator of (timestamp, comm_device, tuple of values in the order of columns), None for a missing value
+        '''
+        positions = [self.positions[column] + 2 for column in columns]
+        low, high = self._range(start, end)
+        count = self.count
+        for index in range(low, high):
+            record = self.record.unpack_from(self.map, self._slot(index, count))
+            name = self.comm_devices[record[1]]
+            if comm_device != None and name != comm_device:
+                continue
+            values = tuple([record[position] for position in positions])
+            yield (record[0], name, tuple([None if value != value else value for value in values]))
+
+    def dtype(self):
+        '''
+        The NumPy dtype of a record, fields timestamp, comm_device and the columns
+        '''
+        if numpy == None:
+            raise ValueError("NumPy views require the numpy package")
+        names = ["timestamp", "comm_device"] + list(self.columns)
+        formats = ["<f8", "<u2"] + ["<f8"] * len(self.columns)
+        offsets = [0, 8] + [16 + 8 * index for index in range(len(self.columns))]
+        return numpy.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": self.recordsize})
+
+    def views(self, start=None, end=None):
+        '''
+        Records as NumPy structured arrays that are views of the file, not copies.
+        There are two arrays if the range wraps around the end of the ring.
+        The file can't be closed while a view is in use.
+
+        :param start: Unix epoch seconds of the first record, defaults to the oldest
+        :type start: float, optional
+        :param end: Unix epoch seconds after the last record, defaults to after the newest
+        :type end: float, optional
+        :rtype: list
+        '''
+        dtype = self.dtype()
+        low, high = self._range(start, end)
+        count = self.count
+        views = []
+        while low < high:
+            offset = self._slot(low, count)
+            slot = (offset - self.headersize) // self.recordsize
+            length = min(high - low, self.capacity - slot)
+            views.append(numpy.ndarray(shape=(length,), dtype=dtype, buffer=self.map, offset=offset))
+            low += length
+        return views
+
+    def array(self, start=None, end=None):
+        '''
+        Records as one NumPy structured array. It is a view of the file unless the range wraps around
+        the end of the ring, then it is a copy.
+        '''
+        views = self.views(start, end)
+        if len(views) == 0:
+            return numpy.empty((0,), dtype=self.dtype())
+        if len(views) == 1:
+            return views[0]
+        return numpy.concatenate(views)
+
+    def write(self, alldata, flush=True):
+        '''
+        Record a magdump style document, or list of documents
+
+        :param alldata: A dictionary with datetime, comm_device and data items
+        :type alldata: dict
+        :param flush: Record the documents now, False holds them until flush(), defaults to True
+        :type flush: boolean, optional
+        :return: Number of documents recorded, documents older than the newest record are not
+        :rtype: int
+        '''
+        if type(alldata) != list:
+            alldata = [alldata]
+        self.pending.extend(alldata)
+        if not flush:
+            return 0
+        recorded = self._record()
+        if time.monotonic() - self.synced >= self.syncseconds:
+            self.flush()
+        return recorded
+
+    def _record(self):
+        pending = self.pending
+        self.pending = []
+        recorded = 0
+        for item in pending:
+            timestamp = datetime.fromisoformat(item['datetime']).timestamp()
+            rowdata = self.schema.rowdata(item['data'])
+            added = [column for column, value in rowdata.items()
+                     if column not in self.positions and type(value) in (int, float, bool)]
+            if len(added) > 0:
+                self.addColumns(added)
+            if self.append(timestamp, item['comm_device'], rowdata):
+                recorded += 1
+        return recorded
+
+    def addColumns(self, columns):
+        '''
+        Rewrite the file with more columns, keeping the records. The new columns are missing in the old records.
+
+        :param columns: Names of the new columns, names already in the file are ignored
+        :type columns: list
+        '''
+        added = tuple(sorted(set(columns) - set(self.columns)))
+        if len(added) == 0:
+            return
+        if self.readonly:
+            raise ValueError(f"{self.filename} is open for reading only")
+        temporary = self.filename + ".tmp"
+        self._create(temporary, self.columns + added, self.capacity)
+        with HistoryRing(temporary) as target:
+            for timestamp, comm_device, values in self.rows():
+                target.append(timestamp, comm_device, values)
+        self.map.close()
+        self.file.close()
+        os.replace(temporary, self.filename)
+        self._open()
+        print(f"{self.filename} added columns {', '.join(added)}")
+
+    def flush(self):
+        '''
+        Record the documents held by write() and write the changes to the file
+        '''
+        self._record()
+        self.synced = time.monotonic()
+        if not self.readonly:
+            self.map.flush()
+
+    def discard(self):
+        '''
+        Drop the documents held by write()
+        '''
+        self.pending = []
+
+    def close(self):
+        '''
+        Write the changes and close the file
+        '''
+        if self.map.closed:
+            return
+        try:
+            self.flush()
+            self.map.close()
+        finally:
+            self.file.close()
+
+
+def sigint_handler(signal, frame):
+    print('Interrupted. Shutting down.')
+    sys.exit(0)
+
+
+def main():
+    #
+    # imported here as importing magnum.magnum may wait for the system to settle after boot
+    #
+    from magnum.magnum import Magnum
+    from magnum.magparser import MagnumArgumentParser
+
+    signal.signal(signal.SIGINT, sigint_handler)
+    parser = MagnumArgumentParser(description="Magnum History Recorder", prog="maghistory", fromfile_prefix_chars='@',
+                                  epilog="Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    parser.add_argument("--device", "-d", nargs='+', default=f"{'/dev/ttyUSB0' if parser.isPosix else 'COM1'}",
+                        help="Serial device name (default: %(default)s). You can specify more than one.")
+    parser.add_argument("--file", "-f", default="magnum.ring",
+                        help="The history file, created if it doesn't exist (default: %(default)s)")
+    parser.add_argument("--interval", "-i", default=10, type=int, dest='interval',
+                        help="Interval, in seconds, between samples (default: %(default)s)")
+    parser.add_argument("--days", default=7, type=float,
+                        help="Days of history kept by a new file (default: %(default)s)")
+    parser.add_argument("--verbose", '-v', action="store_true", default=False,
+                        help="Display options at runtime (default: %(default)s)")
+    seldom = parser.add_argument_group("Seldom used")
+    seldom.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    seldom.add_argument("--capacity", default=None, type=int,
+                        help="Records in a new file, instead of using --days (default: %(default)s)")
+    seldom.add_argument("--syncseconds", default=60, type=int,
+                        help="Seconds between writes of changes to the file (default: %(default)s)")
+    seldom.add_argument("--packets", default=50, type=int,
+                        help="Number of packets to generate in reader (default: %(default)s)")
+    seldom.add_argument("--timeout", default=0.005, type=float,
+                        help="Timeout for serial read (default: %(default)s)")
+    seldom.add_argument("--nocleanup", action="store_true", default=False, dest='cleanpackets',
+                        help="Suppress clean up of unknown packets (default: False)")
+    args = parser.magnum_parse_args()
+    if args.verbose:
+        print('Magnum History Version:{0}'.format(magnum.__version__))
+        print(f"Options:{str(args)[10:-1]}")
+    magnumReaders = {}
+    columns = set()
+    #
+    # devices that appear later, such as an AGS, add their columns to the file when they do
+    #
+    for device in args.device:
+        try:
+            magnumReader = Magnum(device=device, packets=args.packets,
+                                  timeout=args.timeout, cleanpackets=args.cleanpackets)
+            columns.update(numericColumns(magnumReader.getDevices()))
+            magnumReaders[magnumReader.getComm_Device()] = magnumReader
+        except Exception as e:
+            print("{0} {1}".format(device, str(e)))
+    if len(magnumReaders) == 0:
+        print("Error: There are no usable devices connected.")
+        exit(2)
+    capacity = args.capacity
+    if capacity == None:
+        capacity = max(1, int(args.days * 86400 / args.interval) * len(magnumReaders))
+    history = HistoryRing(args.file, columns=sorted(columns), capacity=capacity, syncseconds=args.syncseconds)
+    if args.verbose:
+        print(f"{args.file} {len(history.columns)} columns, {len(history)} of {history.capacity} records used")
+    try:
+        while True:
+            start = time.time()
+            timestamp = datetime.now(timezone.utc).replace(microsecond=0).astimezone().isoformat()
+            for comm_device, magnumReader in magnumReaders.items():
+                try:
+                    devices = magnumReader.getDevices()
+                    if len(devices) != 0:
+                        history.write({"datetime": timestamp, "device": "MAGNUM",
+                                       "comm_device": comm_device, "data": devices})
+                except Exception as e:
+                    print("{0} {1}".format(comm_device, str(e)))
+            sleep = args.interval - (time.time() - start)
+            if sleep > 0:
+                time.sleep(sleep)
+    finally:
+        history.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# JSON encoding used by the tools.
+# orjson is used if it is installed, otherwise the standard library json module.
+# The output of orjson is the same JSON except that text is not escaped to ASCII and NaN is null.
+# Pretty output always uses the standard library so it looks the same as it always has.
+# Everything here returns bytes so output can be written straight to a buffered stream or socket.
+#
+import codecs
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(data, pretty=False):
+    '''
+    Encode data as JSON
+
+    :param data: The object to encode
+    :param pretty: Indent the output, defaults to False
+    :type pretty: boolean, optional
+    :return: UTF-8 encoded JSON
+    :rtype: bytes
+    '''
+    if orjson != None and not pretty:
+        return orjson.dumps(data)
+    return json.dumps(data, indent=2 if pretty else None, ensure_ascii=True,
+                      allow_nan=True, separators=(',', ':')).encode('ascii')
+
+
+def loads(data):
+    '''
+    Decode a JSON document from str or bytes
+    '''
+    if orjson != None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def iterload(file, chunksize=65536):
+    '''
+    Read JSON documents from a file one at a time. The documents can be new line delimited (NDJSON)
+    or simply concatenated, such as the output of several runs of magdump, pretty or not.
+    Files of any size can be read as only the current document is held in memory.
+
+    :param file: A file opened for reading, text or binary
+    :param chunksize: How much to read at a time, defaults to 65536
+    :type chunksize: int, optional
+    :return: An iterator of the documents
+    '''
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    while True:
+        chunk = file.read(chunksize)
+        more = len(chunk) > 0
+        if type(chunk) == bytes:
+            chunk = utf8.decode(chunk, final=not more)
+        buffer += chunk
+        position = 0
+        length = len(buffer)
+        while True:
+            while position < length and buffer[position].isspace():
+                position += 1
+            if position == length:
+                break
+            #
+            # most documents are a single line, try the fast decoder on that first
+            #
+            end = buffer.find("\n", position)
+            if end > 0 and orjson != None:
+                try:
+                    data = orjson.loads(buffer[position:end])
+                    position = end
+                    yield data
+                    continue
+                except orjson.JSONDecodeError:
+                    pass
+            try:
+                data, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if more:
+                    break  # the document is incomplete, read more
+                raise
+            yield data
+        buffer = buffer[position:]
+        if not more:
+            break
+
+
+class DeviceEncoder:
+    '''
+    Encodes the devices from one reader and keeps the encoded bytes of each device
+    until the data of the device changes. Comparing the data is much quicker than encoding it.
+
+    :param reader: The reader the devices come from
+    :type reader: Magnum
+    '''
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.cache = {}
+
+    def encodeDevice(self, device):
+        '''
+        Encode a device dictionary from getDevices() as {"device":name,"data":{...}}
+
+        :return: UTF-8 encoded JSON
+        :rtype: bytes
+        '''
+        name = device["device"]
+        data = device["data"]
+        cached = self.cache.get(name)
+        if cached != None and cached[0] == data:
+            return cached[1]
+        encoded = dumps({"device": name, "data": data})
+        #
+        # trace is a list that is changed in place so a device with it is never cached
+        #
+        if "trace" not in data:
+            self.cache[name] = (dict(data), encoded)
+        return encoded
+
+    def encodeSnapshot(self, timestamp, devices):
+        '''
+        Encode a list of devices in the same layout as magdump output
+
+        :param timestamp: The datetime value of the snapshot
+        :type timestamp: str
+        :param devices: List of device dictionaries from getDevices()
+        :type devices: list
+        :return: UTF-8 encoded JSON
+        :rtype: bytes
+        '''
+        parts = [b'{"datetime":', dumps(timestamp),
+                 b',"device":"MAGNUM","comm_device":', dumps(self.reader.getComm_Device()),
+                 b',"data":[', b','.join([self.encodeDevice(device) for device in devices]), b']}']
+        return b''.join(parts)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# Bulk loads archives of magdump output into a database.
+# The archives can be any size, new line delimited or concatenated JSON, they are read one document at a time.
+#
+#  magload --sqlite magnum.db archive1.json archive2.json
+#  magload --store history.db archive.json
+#  magload --db_username me --db_password secret archive.json
+#  magload --postgresql archive.json | psql magnum
+#
+# SQLite and MySQL/MariaDB are loaded with executemany in large transactions.
+# For PostgreSQL a script of COPY statements is written, which psql loads with its fastest path.
+# The tables must already exist, except for --store. Use mag2sql to draft them.
+#
+import argparse
+import sys
+import time
+
+import magnum
+from magnum.magjson import iterload
+from magnum.magschema import FlatSchema
+from magnum.magsql import ALLINONE_TABLE, SQLSink
+
+
+class CopyWriter:
+    '''
+    Write magdump style documents as PostgreSQL COPY text, one COPY block per table per batch
+
+    :param output: A file opened for writing text
+    :param allinone: Load each sample as a single flat row, defaults to False
+    :type allinone: boolean, optional
+    :param batchrows: Rows to buffer before writing, defaults to 10000
+    :type batchrows: int, optional
+    '''
+
+    def __init__(self, output, allinone=False, batchrows=10000):
+        self.output = output
+        self.allinone = allinone
+        self.batchrows = batchrows
+        self.pending = {}
+        self.pendingrows = 0
+        self.schema = FlatSchema()
+
+    def write(self, alldata, flush=True):
+        if type(alldata) != list:
+            alldata = [alldata]
+        for item in alldata:
+            if self.allinone:
+                if item['data'][0]['device'] == ALLINONE_TABLE:
+                    tables = [(ALLINONE_TABLE, item['data'][0]['data'])]
+                else:
+                    tables = [(ALLINONE_TABLE, self.schema.rowdata(item['data']))]
+            else:
+                tables = [(device['device'], device['data']) for device in item['data']]
+            for table, rowdata in tables:
+                fields = ["datetime"]
+                values = [item['datetime']]
+                for field, value in rowdata.items():
+                    if type(value) not in (list, dict):
+                        fields.append(field)
+                        values.append(value)
+                self.pending.setdefault((table, tuple(fields)), []).append(
+                    "\t".join([self._text(value) for value in values]))
+                self.pendingrows += 1
+        if flush and self.pendingrows >= self.batchrows:
+            self.flush()
+
+    def _text(self, value):
+        if value == None:
+            return "\\N"
+        if type(value) == bool:
+            return "t" if value else "f"
+        if type(value) == str:
+            return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+        return str(value)
+
+    def flush(self):
+        for (table, fields), rows in self.pending.items():
+            columns = ", ".join([f'"{field}"' for field in fields])
+            self.output.write(f'COPY "{table}" ({columns}) FROM stdin;\n')
+            self.output.write("\n".join(rows))
+            self.output.write("\n\\.\n")
+        self.output.flush()
+        self.pending = {}
+        self.pendingrows = 0
+
+    def discard(self):
+        self.pending = {}
+        self.pendingrows = 0
+
+    def close(self):
+        self.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Magnum Bulk Loader", prog="magload", fromfile_prefix_chars='@',
+                                     epilog="Expects input to be JSON generated by magdump. Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    parser.add_argument("input", nargs='*', default=None,
+                        help="Archive file name(s). None implies stdin")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--sqlite", default=None,
+                        help="Load a SQLite database file (default: %(default)s)")
+    target.add_argument("--store", default=None,
+                        help="Load a SQLite time series store, see magsql --store (default: %(default)s)")
+    target.add_argument("--postgresql", action="store_true", default=False,
+                        help="Write PostgreSQL COPY statements to stdout, pipe them to psql (default: %(default)s)")
+    parser.add_argument("--db_username", default=None,
+                        help="MySQL User name(default: %(default)s)")
+    parser.add_argument("--db_password", default=None,
+                        help="MySQL User password(default: %(default)s)")
+    parser.add_argument("--db_database", default='magnum',
+                        help="MySQL database name(default: %(default)s)")
+    parser.add_argument("--db_host", default='localhost',
+                        help="MySQL Server host name(default: %(default)s)")
+    seldom = parser.add_argument_group("Seldom used")
+    seldom.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    seldom.add_argument("--db_port", default=3306, type=int,
+                        help="MySQL port(default: %(default)s)")
+    seldom.add_argument("--allinone", action="store_true", default=False,
+                        help="Load data as a flat single row (default: %(default)s)")
+    seldom.add_argument("--batch", default=10000, type=int,
+                        help="Rows per transaction (default: %(default)s)")
+    args = parser.parse_args()
+    if args.sqlite == None and args.store == None and not args.postgresql and \
+            (args.db_username == None or args.db_password == None):
+        parser.error("--db_username and --db_password are required unless --sqlite, --store or --postgresql is used.")
+    if args.postgresql:
+        sink = CopyWriter(sys.stdout, allinone=args.allinone, batchrows=args.batch)
+    elif args.store != None:
+        from magnum.magstore import SQLiteStore
+        sink = SQLiteStore(args.store, batchrows=args.batch, batchseconds=float("inf"))
+    elif args.sqlite != None:
+        import sqlite3
+
+        def connect():
+            return sqlite3.connect(args.sqlite)
+        sink = SQLSink(connect, dialect="sqlite", allinone=args.allinone, batchrows=args.batch,
+                       batchseconds=float("inf"))
+    else:
+        import mariadb
+
+        def connect():
+            return mariadb.connect(user=args.db_username, password=args.db_password, host=args.db_host,
+                                   port=args.db_port, database=args.db_database)
+        sink = SQLSink(connect, dialect="mysql", database=args.db_database, allinone=args.allinone,
+                       batchrows=args.batch, batchseconds=float("inf"))
+
+    def documents():
+        if len(args.input) == 0:
+            yield from iterload(sys.stdin.buffer)
+        else:
+            for filename in args.input:
+                with open(filename, "rb") as file:
+                    yield from iterload(file)
+    start = time.monotonic()
+    reported = start
+    samples = 0
+    rows = 0
+    for document in documents():
+        sink.write(document)
+        if type(document) != list:
+            document = [document]
+        samples += len(document)
+        for item in document:
+            rows += 1 if args.allinone else len(item['data'])
+        now = time.monotonic()
+        if now - reported >= 10:
+            reported = now
+            print(f"Loaded {samples} samples, {rows / (now - start):.0f} rows/second", file=sys.stderr)
+    sink.close()
+    duration = max(time.monotonic() - start, 0.001)
+    print(f"Loaded {samples} samples, {rows} rows in {duration:.1f} seconds, {rows / duration:.0f} rows/second",
+          file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
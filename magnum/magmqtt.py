@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# Publishes Magnum data to MQTT only when it changes.
+# run the program with --help for details of options.
+#
+#  magmqtt --broker localhost:1883 --topic magnum/ --interval 10
+#
+# Topics, for a --topic of magnum/
+#   magnum/inverter          the whole device, as published by examples/mqttlogger-2.py. This is a keyframe,
+#                            sent at start up, every --heartbeat seconds and when magnum/refresh is published
+#   magnum/inverter/vdc      one field, published when it moves by more than its deadband. The payload is the JSON value
+#   magnum/inverter/changes  with --per_device, the fields that changed as one JSON object, instead of a topic per field
+#
+# REMOTE settings, and revision and model fields, are published retained so new subscribers get them at once.
+# Changes within --coalesce seconds of each other are sent together, only the latest value of each field.
+#
+# Requires paho-mqtt version 2.0 or newer, `pip install pymagnum[mqtt]`
+#
+import signal
+import sys
+import time
+import uuid
+
+from datetime import datetime, timezone
+
+import magnum
+from magnum.magjson import dumps
+
+#
+# smallest change, in the field's own units, that is worth publishing
+# keys are a field name or DEVICE.field
+#
+DEADBANDS = {
+    "vdc": 0.1,
+    "adc": 0.5,
+    "VACin": 1.0,
+    "VACout": 1.0,
+    "AACin": 0.5,
+    "AACout": 0.5,
+    "Hz": 0.2,
+    "bat": 1.0,
+    "tfmr": 1.0,
+    "fet": 1.0,
+    "BMK.soc": 1.0,
+    "PT100.battery": 0.1,
+    "PT100.battery_amps": 0.5,
+    "PT100.pv_voltage": 1.0,
+}
+#
+# devices whose data is settings, and fields that never change, are published retained
+#
+RETAINED_DEVICES = ("REMOTE",)
+RETAINED_FIELDS = ("revision", "model", "model_text")
+
+
+class ChangePublisher:
+    '''
+    Publish devices to MQTT topics when their values change by more than a deadband
+
+    :param client: Any object with a publish(topic, payload, qos, retain) method, such as a paho mqtt.Client
+    :param topic: Topic prefix, defaults to magnum/
+    :type topic: str, optional
+    :param deadbands: Dictionary of field, or DEVICE.field, to the smallest change to publish, defaults to DEADBANDS
+    :type deadbands: dict, optional
+    :param heartbeat: Seconds between keyframes of every device, defaults to 900
+    :type heartbeat: float, optional
+    :param coalesce: Seconds to gather changes before they are sent, defaults to 0
+    :type coalesce: float, optional
+    :param perdevice: Publish changes as one object per device instead of a topic per field, defaults to False
+    :type perdevice: boolean, optional
+    :param qos: MQTT quality of service, defaults to 0
+    :type qos: int, optional
+    '''
+
+    def __init__(self, client, topic="magnum/", deadbands=DEADBANDS, heartbeat=900, coalesce=0, perdevice=False, qos=0):
+        self.client = client
+        self.topic = topic if topic.endswith("/") else topic + "/"
+        self.deadbands = deadbands
+        self.heartbeat = heartbeat
+        self.coalesce = coalesce
+        self.perdevice = perdevice
+        self.qos = qos
+        self.published = {}
+        self.pending = {}
+        self.keyframed = {}
+        self.flushed = 0.0
+        self.messages = 0
+        self.bytes = 0
+
+    def refresh(self):
+        '''
+        Send a keyframe of every device with the next publish()
+        '''
+        self.keyframed = {}
+
+    def publish(self, comm_device, devices, timestamp=None, flush=True):
+        '''
+        Publish what has changed in a list of devices from getDevices()
+
+        :param comm_device: The reader's comm_device
+        :type comm_device: str
+        :param devices: List of device dictionaries
+        :type devices: list
+        :param timestamp: Local time as an ISO 8601 string, defaults to now
+        :type timestamp: str, optional
+        :param flush: Send the changes when the coalesce time is up, False holds them until flush(), defaults to True
+        :type flush: boolean, optional
+        '''
+        now = time.monotonic()
+        if timestamp == None:
+            timestamp = datetime.now(timezone.utc).replace(microsecond=0).astimezone().isoformat()
+        keyframe = comm_device not in self.keyframed or now - self.keyframed[comm_device] >= self.heartbeat
+        for device in devices:
+            name = device["device"]
+            devicetopic = self.topic + name.lower()
+            key = (comm_device, name)
+            published = self.published.setdefault(key, {})
+            if keyframe:
+                #
+                # a keyframe replaces any changes waiting to be sent
+                #
+                for topic in [topic for topic in self.pending if topic.startswith(devicetopic + "/")]:
+                    del self.pending[topic]
+                self.pending[devicetopic] = (dumps({"datetime": timestamp, "comm_device": comm_device,
+                                                    "device": name, "data": device["data"]}), name in RETAINED_DEVICES)
+                published.clear()
+                published.update(device["data"])
+                continue
+            changes = {}
+            for field, value in device["data"].items():
+                if field not in published or self._changed(name, field, published[field], value):
+                    changes[field] = value
+                    published[field] = value
+            if len(changes) == 0:
+                continue
+            if self.perdevice:
+                topic = devicetopic + "/changes"
+                previous = self.pending.get(topic)
+                if previous != None:
+                    #
+                    # merge with changes not yet sent
+                    #
+                    changes = dict(previous[2], **changes)
+                self.pending[topic] = (dumps({"datetime": timestamp, "comm_device": comm_device, "data": changes}),
+                                       name in RETAINED_DEVICES, changes)
+            else:
+                for field, value in changes.items():
+                    self.pending[f"{devicetopic}/{field}"] = (dumps(value),
+                                                             name in RETAINED_DEVICES or field in RETAINED_FIELDS)
+        if keyframe:
+            self.keyframed[comm_device] = now
+        if flush:
+            self.flush(now - self.flushed >= self.coalesce or keyframe)
+
+    def write(self, alldata, flush=True):
+        '''
+        Publish a magdump style document, or list of documents, so the publisher can be used as a sink
+
+        :param alldata: A dictionary with datetime, comm_device and data items
+        :type alldata: dict
+        :param flush: Send the changes when the coalesce time is up, False holds them until flush(), defaults to True
+        :type flush: boolean, optional
+        '''
+        if type(alldata) != list:
+            alldata = [alldata]
+        for item in alldata:
+            self.publish(item['comm_device'], item['data'], item['datetime'], flush=flush)
+
+    def _changed(self, device, field, old, new):
+        if type(new) in (int, float) and type(old) in (int, float) and type(new) != bool and type(old) != bool:
+            deadband = self.deadbands.get(f"{device}.{field}", self.deadbands.get(field, 0))
+            return abs(new - old) > deadband
+        return new != old
+
+    def flush(self, force=True):
+        '''
+        Send the changes that are waiting
+
+        :param force: Send them even if within the coalesce time, defaults to True
+        :type force: boolean, optional
+        '''
+        if not force or len(self.pending) == 0:
+            return
+        for topic, message in self.pending.items():
+            payload, retain = message[0], message[1]
+            self.client.publish(topic, payload=payload, qos=self.qos, retain=retain)
+            self.messages += 1
+            self.bytes += len(payload)
+        self.pending = {}
+        self.flushed = time.monotonic()
+
+    def discard(self):
+        '''
+        Drop the changes that are waiting. The next publish() sends a keyframe so nothing is missed
+        '''
+        self.pending = {}
+        self.refresh()
+
+    def close(self):
+        '''
+        Send the changes that are waiting
+        '''
+        self.flush()
+
+
+def sigint_handler(signal, frame):
+    print('Interrupted. Shutting down.')
+    sys.exit(0)
+
+
+def main():
+    #
+    # imported here as importing magnum.magnum may wait for the system to settle after boot
+    #
+    from magnum.magnum import Magnum
+    from magnum.magparser import MagnumArgumentParser
+
+    signal.signal(signal.SIGINT, sigint_handler)
+    parser = MagnumArgumentParser(description="Magnum Data MQTT Publisher", prog="magmqtt", fromfile_prefix_chars='@',
+                                  epilog="Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    logger = parser.add_argument_group("MQTT publish")
+    reader = parser.add_argument_group("Magnum reader")
+    logger.add_argument("--topic", "-t", default='magnum/', help="Topic prefix (default: %(default)s)")
+    logger.add_argument("--broker", "-b", default='localhost:1883', help="MQTT Broker address and (optional port)(default: %(default)s)")
+    logger.add_argument("--interval", "-i", default=10, type=int, dest='interval', help="Interval, in seconds, between reading the devices (default: %(default)s)")
+    logger.add_argument("--username", "-u", default='None', help="MQTT User name, if needed (default: %(default)s)")
+    logger.add_argument("--password", "-p", default='None', help="MQTT User password, if needed (default: %(default)s)")
+    logger.add_argument("--heartbeat", default=900, type=float, help="Seconds between publishing every device in full (default: %(default)s)")
+    logger.add_argument("--coalesce", default=0, type=float, help="Seconds to gather changes before sending them (default: %(default)s)")
+    logger.add_argument("--deadband", nargs='*', default=[], metavar="FIELD=CHANGE",
+                        help="Smallest change to publish, such as vdc=0.2 or BMK.soc=2. Adds to or replaces the built in deadbands")
+    logger.add_argument("--per_device", action="store_true", default=False, dest='perdevice',
+                        help="Publish changes as one object per device instead of a topic per field (default: %(default)s)")
+    logger.add_argument("--qos", default=0, type=int, choices=[0, 1, 2], help="MQTT quality of service (default: %(default)s)")
+    parser.add_argument("--device", "-d", nargs='+', default=f"{'/dev/ttyUSB0' if parser.isPosix else 'COM1'}",
+                        help="Serial device name (default: %(default)s). You can specify more than one.")
+    parser.add_argument("--verbose", '-v', action="store_true", default=False,
+                        help="Display options at runtime (default: %(default)s)")
+    reader.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    reader.add_argument("--packets", default=50, type=int, help="Number of packets to generate in reader (default: %(default)s)")
+    reader.add_argument("--timeout", default=0.005, type=float, help="Timeout for serial read (default: %(default)s)")
+    reader.add_argument("--nocleanup", action="store_true", default=False, dest='cleanpackets', help="Suppress clean up of unknown packets (default: False)")
+    args = parser.magnum_parse_args()
+    if args.interval < 1 or args.interval > (60*60):
+        parser.error("Argument -i/--interval: Must be between 1 second and 3600 (1 hour)")
+    deadbands = dict(DEADBANDS)
+    for deadband in args.deadband:
+        try:
+            field, change = deadband.split("=")
+            deadbands[field] = float(change)
+        except ValueError:
+            parser.error(f"Argument --deadband: {deadband} must be FIELD=CHANGE")
+    if args.topic[-1] != "/":
+        args.topic += "/"
+    if args.verbose:
+        savepw = args.password
+        args.password = "******"
+        print('Magnum MQTT Publisher Version:{0}'.format(magnum.__version__))
+        print(f"Options:{str(args)[10:-1]}")
+        args.password = savepw
+    import paho.mqtt.client as mqtt
+    from paho.mqtt.enums import CallbackAPIVersion
+
+    magnumReaders = {}
+    for device in args.device:
+        try:
+            magnumReader = Magnum(device=device, packets=args.packets, timeout=args.timeout, cleanpackets=args.cleanpackets)
+            magnumReaders[magnumReader.getComm_Device()] = magnumReader
+        except Exception as e:
+            print(f"{e} {device}")
+    if len(magnumReaders) == 0:
+        print("Error: There are no usable devices connected.")
+        exit(2)
+    brokerinfo = args.broker.split(':')
+    if len(brokerinfo) == 1:
+        brokerinfo.append(1883)
+    client = mqtt.Client(callback_api_version=CallbackAPIVersion.VERSION2, client_id=str(uuid.uuid1()), clean_session=False)
+    if args.username != 'None':
+        client.username_pw_set(username=args.username, password=args.password)
+    publisher = ChangePublisher(client, topic=args.topic, deadbands=deadbands, heartbeat=args.heartbeat,
+                                coalesce=args.coalesce, perdevice=args.perdevice, qos=args.qos)
+
+    def on_connect(client, userdata, connect_flags, reason_code, properties):
+        if reason_code.is_failure:
+            print(f"Connection failed. {reason_code}")
+        else:
+            client.subscribe(f"{args.topic}refresh")
+
+    def on_message(client, userdata, message):
+        if message.topic == f"{args.topic}refresh":
+            publisher.refresh()
+    client.on_connect = on_connect
+    client.on_message = on_message
+    try:
+        client.connect(brokerinfo[0], port=int(brokerinfo[1]))
+    except Exception as e:
+        print(f"Failed to connect to broker {brokerinfo[0]}:{brokerinfo[1]}, exiting")
+        print(f"Reason: {e}")
+        exit(2)
+    print(f"Publishing to broker:{brokerinfo[0]}:{brokerinfo[1]} Every:{args.interval} seconds. Using: {list(magnumReaders.keys())}")
+    client.loop_start()
+    try:
+        while True:
+            start = time.time()
+            for comm_device, magnumReader in magnumReaders.items():
+                try:
+                    devices = magnumReader.getDevices()
+                    if len(devices) != 0:
+                        publisher.publish(comm_device, devices)
+                except Exception as e:
+                    print(f"{comm_device} {str(e)}")
+            sleep = args.interval - (time.time() - start)
+            if sleep > 0:
+                time.sleep(sleep)
+    finally:
+        publisher.flush()
+        client.loop_stop()
+        client.disconnect()
+
+
+if __name__ == '__main__':
+    main()
@@ -6,9 +6,11 @@
 # DO NOT SORT IMPORTS
 #
 
+import logging
 import os
+from datetime import datetime, timezone
 from struct import unpack
-from time import sleep
+from time import monotonic, sleep, time
 
 from uptime import uptime
 
@@ -19,6 +21,9 @@ from magnum.aclddevice import ACLDDevice
 from magnum.agsdevice import AGSDevice
 from magnum.bmkdevice import BMKDevice
 from magnum.inverterdevice import InverterDevice
+from magnum.magprofile import CLASSIFY, CLEANUP, DEVICE, PARSE, READ, wrap
+from magnum.magschema import FlatSchema
+from magnum.magstats import ReaderStats
 from magnum.pt100device import PT100Device
 from magnum.remotedevice import RemoteDevice
 from magnum.rtrdevice import RTRDevice
@@ -37,9 +42,11 @@ if delay > 0.0:
 # This must be after the sleep(delay)
 import serial  # noqa
 
+logger = logging.getLogger(__name__)
+
 class Magnum:
     '''
-    :param device: The serial device to connect to, defaults to /dev/ttyUSB0
+    :param device: The serial device to connect to, ! and a capture file name, or unix: and the socket of magnumd, defaults to /dev/ttyUSB0
     :type device: str, optional
     :param packets: How many packets to capture in one sample, defaults to 50
     :type packets: int, optional
@@ -49,6 +56,10 @@ class Magnum:
     :type timeout: float, optional
     :param trace: Enable adding last of every packet type processed. The packets, as HEX strings, are appended to data object, Defaults to False
     :type trace: boolean, optional
+    :param staleness: Seconds without a packet before a device is considered stale, defaults to None which never marks devices as stale
+    :type staleness: float, optional
+    :param dropstale: Leave stale devices out of getDevices() instead of marking them, defaults to False
+    :type dropstale: boolean, optional
     '''
 
     sevenzeros = bytes([0, 0, 0, 0, 0, 0, 0])
@@ -84,12 +95,20 @@ class Magnum:
         UNKNOWN: ''
     }
 
-    def __init__(self, device="/dev/ttyUSB0", timeout=0.005, packets=50, cleanpackets=True, trace=False, flip=False):
+    def __init__(self, device="/dev/ttyUSB0", timeout=0.005, packets=50, cleanpackets=True, trace=False, flip=False,
+                 staleness=None, dropstale=False):
         self.packetcount = packets
         self.timeout = timeout
         self.cleanpackets = cleanpackets
         self.trace = trace
         self.flip = flip
+        self.staleness = staleness
+        self.dropstale = dropstale
+        self.freshness = {}
+        self.schemas = {}
+        self.statistics = ReaderStats()
+        self.marked = self.statistics.copy()
+        self.hooks = None
         self.reader = None
         self.inverter = None
         self.remote = None
@@ -100,9 +119,18 @@ class Magnum:
         self.acld = None
         self.inverter_revision = -1
         self.inverter_model = -1
+        self.socketpath = None
         if device.startswith("!"):
             self.comm_device = device[1:]
-            self.stored_packets = self._load_packets(device)
+            self.stored_packets = self._load_packets(self.comm_device)
+            self.stored_index = 0
+        elif device.startswith("unix:"):
+            #
+            # packets are read from magnumd, which owns the serial port
+            #
+            self.stored_packets = None
+            self.comm_device = device
+            self.socketpath = device[5:]
         else:
             self.stored_packets = None
             self.comm_device = device
@@ -148,7 +176,10 @@ class Magnum:
         - bytes of packet
         - tuple of unpacked values - Based on ME documentation
         '''
-        packets = self.readPackets()
+        return self._parsePackets(self.readPackets())
+
+    def _parsePackets(self, packets):
+        start = monotonic()
         messages = []
         unknown = 0
         for packet in packets:
@@ -156,27 +187,107 @@ class Magnum:
             if message[0] == UNKNOWN:
                 unknown += 1
             messages.append(message)
+        self.statistics.unknown += unknown
         #
         # if there at least 2 UNKNOWN packets
         # attempt to clean them up
         #
         if unknown > 1 and self.cleanpackets:
             messages = self.cleanup(messages)
+        types = self.statistics.types
+        for message in messages:
+            types[message[0]] = types.get(message[0], 0) + 1
+        self.statistics.parses.observe(monotonic() - start)
         return messages
-        #
-
+    #
     #  raw read of packets to bytes[]
+    #  keepopen leaves the port open so that a series of samples
+    #  can be read without paying the open and probe delay each time
     #
 
-    def readPackets(self):
-        packet = bytearray()
+    def readPackets(self, keepopen=False):
+        self.marked = self.statistics.copy()
         packets = []
         if self.stored_packets != None:
+            start = monotonic()
+            stored = len(self.stored_packets)
             for ix in range(self.packetcount):
-                packet = self.stored_packets.pop(0)
-                packets.append(packet)
-                self.stored_packets.append(packet)
+                packets.append(self.stored_packets[self.stored_index])
+                self.stored_index = (self.stored_index + 1) % stored
+            self._count(packets, monotonic() - start)
             return packets
+        if self.reader == None or not self.reader.is_open:
+            self._openPort()
+        try:
+            start = monotonic()
+            packets = self._readPort()
+            self._count(packets, monotonic() - start)
+        finally:
+            if not keepopen:
+                self._closePort()
+        return packets
+
+    def streamPackets(self):
+        '''
+        Read packets continuously, for as long as the caller keeps asking, without dropping what arrives
+        between reads as readPackets() does. A capture file is read once from start to finish.
+
+        :return: Iterator of (timestamp, packet), timestamp is the Unix epoch seconds of the first byte of the packet
+        '''
+        if self.stored_packets != None:
+            for packet in self.stored_packets:
+                self._count([packet])
+                yield (time(), packet)
+            return
+        if self.reader == None or not self.reader.is_open:
+            self._openPort()
+        try:
+            if self.socketpath != None:
+                for timestamp, packet in self.reader.frames():
+                    self._count([packet])
+                    yield (timestamp, packet)
+                return
+            packet = bytearray()
+            timestamp = None
+            #
+            # only what arrived before the first read is dropped, a packet may be cut short there
+            #
+            self.reader.reset_input_buffer()
+            while True:
+                readbytes = self.reader.read(self.reader.in_waiting or 1)
+                if len(readbytes) == 0:
+                    #
+                    # an empty read is an inter packet gap
+                    #
+                    if len(packet) != 0:
+                        self._count([packet])
+                        yield (timestamp, packet)
+                        packet = bytearray()
+                    continue
+                if len(packet) == 0:
+                    timestamp = time()
+                packet += readbytes
+        finally:
+            self._closePort()
+
+    def _count(self, packets, duration=None):
+        self.statistics.packets += len(packets)
+        self.statistics.bytes += sum([len(packet) for packet in packets])
+        #
+        # streamed packets aren't a capture, they are counted without one
+        #
+        if duration != None:
+            self.statistics.captures.observe(duration)
+
+    def _openPort(self):
+        if self.socketpath != None:
+            if self.reader == None:
+                from magnum.magnumd import FanoutClient
+                self.reader = FanoutClient(self.socketpath)
+            start = monotonic()
+            self.reader.open()
+            self.statistics.opens.observe(monotonic() - start)
+            return
         if self.reader == None:
             self.reader = serial.serial_for_url(self.comm_device,
                                                 baudrate=19200,
@@ -186,19 +297,30 @@ class Magnum:
                                                 dsrdtr=False,
                                                 parity=serial.PARITY_NONE)
             self.reader.close()
-
-        #
-        # open port every time
-        #
+        start = monotonic()
         self.reader.open()
+        probe = monotonic()
+        self.statistics.opens.observe(probe - start)
         #
         # wait to see if there is any traffic on the device
         #
         sleep(0.25)
-        if self.reader.in_waiting == 0:
+        waiting = self.reader.in_waiting
+        self.statistics.probes.observe(monotonic() - probe)
+        if waiting == 0:
             self.reader.close()
             self.reader = None
             raise ConnectionError("There doesn't seem to be a network")
+
+    def _closePort(self):
+        if self.reader != None:
+            self.reader.close()
+
+    def _readPort(self):
+        if self.socketpath != None:
+            return self.reader.readPackets(self.packetcount)
+        packet = bytearray()
+        packets = []
         packetsleft = self.packetcount
         self.reader.reset_input_buffer()
         #
@@ -215,7 +337,6 @@ class Magnum:
                 packets.append(packet)
                 packetsleft -= 1
                 packet = bytearray()
-        self.reader.close()
         return packets
     #
     #
@@ -327,7 +448,8 @@ class Magnum:
                     msg = "{0} Converting {1} - {2} bytes".format(
                         e.args[0], packetType, len(packet))
                     fields = {}
-                    print(msg)
+                    self.statistics.failures += 1
+                    logger.warning(msg)
                     packetType = UNKNOWN
                     # raise unpack_error(msg) from e
             else:
@@ -353,6 +475,7 @@ class Magnum:
                 if nextmessage[0] == UNKNOWN:
                     # we may have a match
                     newmessage = self._parsePacket(message[1] + nextmessage[1])
+                    self.statistics.merges += 1
                     ignoreit = True
                     cleaned.append(newmessage)
         return cleaned
@@ -378,6 +501,8 @@ class Magnum:
         - **device**  One of INVERTER, REMOTE, AGS, BMK or PT100
         - **data** A dictionary of name/value pairs for the device.
         - **trace** If trace is set to True then trace will have a list of tupples of every packet since last time invoked
+        - **stale** Only if staleness is set. True if the device has not sent a packet within staleness seconds
+        - **updates** Only if staleness is set. The number of packets for the device since the last time invoked
         '''
         # pass each the packets to the correct object
         #
@@ -386,12 +511,56 @@ class Magnum:
         #     raw packet (bytes) the raw binary bytes of the packet
         #     unpacked data (tuple int) integers of data deconstructed to match ME documentation
         #
-        for packet in self.getPackets():
+        return self._updateDevices(self.getPackets())
+
+    def getSamples(self, samples=1, spacing=1.0):
+        '''
+        Capture a series of samples in one session on the serial port.
+        The port is opened and probed once rather than once per sample.
+
+        :param samples: How many samples to capture, defaults to 1
+        :type samples: int, optional
+        :param spacing: Seconds between the start of each sample, defaults to 1.0
+        :type spacing: float, optional
+        :return: List of sample dictionaries
+        :rtype: list
+
+        Each dictionary has four items:
+
+        - **datetime** Local time of the sample as an ISO 8601 string
+        - **timestamp** Wall clock time of the sample, seconds since the epoch
+        - **monotonic** Monotonic clock time of the sample, useful for intervals
+        - **devices** List of device dictionaries as returned by getDevices()
+        '''
+        snapshots = []
+        first = monotonic()
+        try:
+            for sample in range(samples):
+                delay = first + sample * spacing - monotonic()
+                if delay > 0:
+                    sleep(delay)
+                wallclock = time()
+                snapshot = {}
+                snapshot["datetime"] = datetime.fromtimestamp(wallclock, timezone.utc).replace(
+                    microsecond=0).astimezone().isoformat()
+                snapshot["timestamp"] = wallclock
+                snapshot["monotonic"] = monotonic()
+                packets = self.readPackets(keepopen=True)
+                snapshot["devices"] = self._updateDevices(self._parsePackets(packets))
+                snapshots.append(snapshot)
+        finally:
+            self._closePort()
+        return snapshots
+
+    def _updateDevices(self, packets):
+        now = monotonic()
+        for packet in packets:
             packetType = packet[0]
+            device = None
             if packetType in (INV, INV_C):
                 if self.inverter == None:
-                    self.inverter = InverterDevice(trace=self.trace)
-                self.inverter.parse(packet)
+                    self.inverter = self._newDevice(InverterDevice)
+                device = self.inverter
             elif packetType in (REMOTE_C,
                                 REMOTE_00,
                                 REMOTE_11,
@@ -407,28 +576,31 @@ class Magnum:
                                 REMOTE_C3,
                                 REMOTE_D0):
                 if self.remote == None:
-                    self.remote = RemoteDevice(trace=self.trace)
-                self.remote.parse(packet)
+                    self.remote = self._newDevice(RemoteDevice)
+                device = self.remote
             elif packetType == BMK_81:
                 if self.bmk == None:
-                    self.bmk = BMKDevice(trace=self.trace)
-                self.bmk.parse(packet)
+                    self.bmk = self._newDevice(BMKDevice)
+                device = self.bmk
             elif packetType in (AGS_A1, AGS_A2):
                 if self.ags == None:
-                    self.ags = AGSDevice(trace=self.trace)
-                self.ags.parse(packet)
+                    self.ags = self._newDevice(AGSDevice)
+                device = self.ags
             elif packetType == RTR_91:
                 if self.rtr == None:
-                    self.rtr = RTRDevice(trace=self.trace)
-                self.rtr.parse(packet)
+                    self.rtr = self._newDevice(RTRDevice)
+                device = self.rtr
             elif packetType in (PT_C1, PT_C2, PT_C3):
                 if self.pt100 == None:
-                    self.pt100 = PT100Device(trace=self.trace)
-                self.pt100.parse(packet)
+                    self.pt100 = self._newDevice(PT100Device)
+                device = self.pt100
             elif packetType == ACLD_D1:
                 if self.acld == None:
-                    self.acld = ACLDDevice(trace=self.trace)
-                self.acld.parse(packet)
+                    self.acld = self._newDevice(ACLDDevice)
+                device = self.acld
+            if device != None:
+                device.parse(packet)
+                self._refresh(device.deviceData["device"], packetType, now)
         if self.remote:
             #
             # remove extraneous REMOTE fields if corresponding device is not present
@@ -439,26 +611,137 @@ class Magnum:
             if device:
                 deviceinfo = device.getDevice()
                 if deviceinfo:
+                    freshness = self.freshness[deviceinfo["device"]]
+                    if self.staleness != None:
+                        stale = now - freshness["updated"] > self.staleness
+                        if stale and self.dropstale:
+                            continue
+                        deviceinfo["stale"] = stale
+                        deviceinfo["updates"] = freshness["updates"]
+                    freshness["updates"] = 0
                     devices.append(deviceinfo)
+        self.statistics.updates.observe(monotonic() - now)
         return devices
 
+    #
+    # keep track of when each device, and each packet type, was last updated
+    # updates counts the packets since the last time the device was reported
+    #
+    def _refresh(self, name, packetType, now):
+        freshness = self.freshness.get(name)
+        if freshness == None:
+            freshness = {"updated": now, "updates": 0, "total": 0, "packets": {}}
+            self.freshness[name] = freshness
+        freshness["updated"] = now
+        freshness["updates"] += 1
+        freshness["total"] += 1
+        freshness["packets"][packetType] = now
+
+    def _newDevice(self, deviceclass):
+        device = deviceclass(trace=self.trace)
+        if self.hooks != None:
+            self._hookDevice(device)
+        return device
+
+    def _hookDevice(self, device):
+        device.parse = wrap(PARSE, device.parse, self.hooks)
+        device.getDevice = wrap(DEVICE, device.getDevice, self.hooks)
+
+    def addHook(self, hook):
+        '''
+        Report the time taken by each stage of reading and parsing to a hook, see magnum.magprofile
+
+        :param hook: An object with begin(stage) and end(stage, elapsed) methods
+        '''
+        if self.hooks == None:
+            self.hooks = []
+            #
+            # wrap the stages of this reader only, without hooks they are left untouched
+            #
+            self.readPackets = wrap(READ, self.readPackets, self.hooks)
+            self._parsePacket = wrap(CLASSIFY, self._parsePacket, self.hooks)
+            self.cleanup = wrap(CLEANUP, self.cleanup, self.hooks)
+            for device in [self.inverter, self.remote, self.bmk, self.ags, self.rtr, self.pt100, self.acld]:
+                if device:
+                    self._hookDevice(device)
+        self.hooks.append(hook)
+
+    def removeHook(self, hook):
+        '''
+        Stop reporting to a hook. When the last hook is removed the stages are unwrapped.
+        '''
+        self.hooks.remove(hook)
+        if len(self.hooks) == 0:
+            self.hooks = None
+            del self.readPackets
+            del self._parsePacket
+            del self.cleanup
+            for device in [self.inverter, self.remote, self.bmk, self.ags, self.rtr, self.pt100, self.acld]:
+                if device:
+                    del device.parse
+                    del device.getDevice
+
+    def stats(self):
+        '''
+        Counters of the reader's work, in total and for the latest sample
+
+        :return: Dictionary with two items, **total** since the reader was created and **sample**
+            since the latest read of packets began. Each is a dictionary of:
+
+            - **packets** Packets read
+            - **bytes** Bytes read
+            - **types** Dictionary of packet type to the number parsed, after clean up
+            - **unknown** Packets that could not be identified, before clean up
+            - **merges** Pairs of UNKNOWN packets joined by clean up
+            - **failures** Packets of a known type that could not be unpacked
+            - **captures**, **parses** and **updates** Histograms of the seconds taken to read packets,
+              parse them and update the devices
+            - **opens** and **probes** Histograms of the seconds taken to open the serial port and probe it for traffic
+
+            Each histogram is a dictionary of **count**, **sum** and **buckets**, the count of values at or below each upper bound
+        :rtype: dict
+        '''
+        statistics = self.statistics.copy()
+        return {"total": statistics.asdict(), "sample": statistics.subtract(self.marked).asdict()}
+
+    def getFreshness(self):
+        '''
+        Report how recently each device was updated
+
+        :return: Dictionary keyed by device name
+        :rtype: dict
+
+        Each value is a dictionary of:
+
+        - **updated** Monotonic clock time of the last packet for the device
+        - **age** Seconds since the last packet for the device
+        - **updates** Packets received since the device was last reported by getDevices()
+        - **total** Packets received since the reader was created
+        - **stale** True if the age exceeds the staleness setting
+        - **packets** Dictionary of the age, in seconds, of each packet type for the device
+        '''
+        now = monotonic()
+        report = {}
+        for name, freshness in self.freshness.items():
+            age = now - freshness["updated"]
+            report[name] = {"updated": freshness["updated"],
+                            "age": age,
+                            "updates": freshness["updates"],
+                            "total": freshness["total"],
+                            "stale": self.staleness != None and age > self.staleness,
+                            "packets": {packetType: now - updated for packetType, updated in freshness["packets"].items()}
+                            }
+        return report
+
+
 # 2023-11-08 15:22:24 Added
 
 # This merges all device data into one long dictionary. Each variable is prefixed with device name
 # consistent with the values used in the old Java based magnum software (v1)
+# The column layout is kept in a FlatSchema, one per comm_device, and only rebuilt when the devices change
 #
     def allinone(self, devices):
         returndata = []
-
-        deviceprefixes = {"INVERTER": "INV",
-                        "AGS": "AGS",
-                        "BMK": "BMK",
-                        "RTR": "RTR",
-                        "PT100": "PT",
-                        "REMOTE": "ARC",
-                        "RTR": "RTR"
-                        }
-
         if (type(devices) != list):
             devices = [devices]
         for device in devices:
@@ -466,23 +749,39 @@ class Magnum:
             newdata['datetime'] = device['datetime']
             newdata['comm_device'] = device['comm_device']
             newdata['device'] = device["device"]
-            data = []
-            itemdata={}
-            for item in device['data']:
-                if item['device'] in deviceprefixes:
-                    deviceprefix = deviceprefixes[item['device']]
-                else:
-                    deviceprefix = item['device']
-                itemstuff = item['data']
-                for itemkey, itemvalue in itemstuff.items():
-                    key = f"{deviceprefix}_{itemkey}"
-                    itemdata[key] = itemvalue
             newblock = {}
             newblock['device'] = "log_data"
-            newblock['data'] = dict(sorted(itemdata.items()))
+            newblock['data'] = self.getSchema(device['comm_device']).rowdata(device['data'])
             newdata['data'] = [newblock]
             returndata.append(newdata)
         if len(returndata) == 1:
             return returndata[0]
         else:
             return returndata
+
+    def allinoneRow(self, devices):
+        '''
+        Convert magdump style data to flat rows. The values are in the order of the columns of getSchema()
+
+        :param devices: A dictionary, or list of dictionaries, with datetime, comm_device and data items
+        :return: A tuple, or a list of tuples if given a list
+        '''
+        if (type(devices) != list):
+            return self.getSchema(devices['comm_device']).row(devices)
+        return [self.getSchema(device['comm_device']).row(device) for device in devices]
+
+    def getSchema(self, comm_device=None):
+        '''
+        The flat row layout used by allinone() and allinoneRow()
+
+        :param comm_device: defaults to the comm_device of this reader
+        :type comm_device: str, optional
+        :rtype: FlatSchema
+        '''
+        if comm_device == None:
+            comm_device = self.comm_device
+        schema = self.schemas.get(comm_device)
+        if schema == None:
+            schema = FlatSchema()
+            self.schemas[comm_device] = schema
+        return schema
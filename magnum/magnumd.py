@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# A daemon that owns the serial port and shares what it reads with any number of local programs
+# through a Unix domain socket. run the program with --help for details of options.
+#
+#  magnumd --device /dev/ttyUSB0 --socket /run/magnum.sock
+#  magdump --device unix:/run/magnum.sock
+#
+# The port is read continuously, once, no matter how many clients there are, and nothing that arrives is dropped.
+# The packets are sent in batches of --packets. A client connects and sends one line to choose what it receives,
+# one line for each batch:
+#   frames      each packet as its capture time, Unix epoch seconds, a colon and the packet in hex, separated by spaces
+#   snapshots   a magdump style JSON document of the devices after the batch, decoded once by the daemon
+#
+# Magnum(device="unix:/run/magnum.sock") is a frames client. It decodes the packets itself so getDevices() and
+# the rest of the API behave as if the port were its own.
+#
+# A client that falls too far behind is disconnected rather than slowing the daemon or the other clients.
+#
+import os
+import selectors
+import signal
+import socket
+import stat
+import threading
+import time
+
+from datetime import datetime, timezone
+
+import magnum
+from magnum.magjson import dumps, loads
+
+FRAMES = b"frames"
+SNAPSHOTS = b"snapshots"
+
+
+class FanoutClient:
+    '''
+    Reads from magnumd. It has the parts of a serial port used by Magnum so it can stand in for one.
+
+    :param path: The daemon's socket
+    :type path: str
+    :param subscription: frames or snapshots, defaults to frames
+    :type subscription: str, optional
+    :param timeout: Seconds to wait for the daemon, defaults to 10
+    :type timeout: float, optional
+    '''
+
+    def __init__(self, path, subscription="frames", timeout=10):
+        self.path = path
+        self.subscription = subscription
+        self.timeout = timeout
+        self.socket = None
+        self.buffer = b""
+
+    @property
+    def is_open(self):
+        return self.socket != None
+
+    def open(self):
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(self.timeout)
+        try:
+            client.connect(self.path)
+            client.sendall(self.subscription.encode("ascii") + b"\n")
+        except OSError as e:
+            client.close()
+            raise ConnectionError(f"Unable to connect to magnumd at {self.path}: {e}") from e
+        self.socket = client
+        self.buffer = b""
+
+    def close(self):
+        if self.socket != None:
+            self.socket.close()
+            self.socket = None
+
+    def reset_input_buffer(self):
+        '''
+        Drop the lines that arrived since the last read, as Magnum does with a serial port
+        '''
+        self.socket.setblocking(False)
+        try:
+            while True:
+                data = self.socket.recv(65536)
+                if len(data) == 0:
+                    break
+                self.buffer += data
+        except BlockingIOError:
+            pass
+        finally:
+            self.socket.settimeout(self.timeout)
+        end = self.buffer.rfind(b"\n")
+        if end >= 0:
+            self.buffer = self.buffer[end + 1:]
+
+    def readline(self):
+        while True:
+            end = self.buffer.find(b"\n")
+            if end >= 0:
+                line = self.buffer[:end]
+                self.buffer = self.buffer[end + 1:]
+                return line
+            data = self.socket.recv(65536)
+            if len(data) == 0:
+                self.close()
+                raise ConnectionError(f"magnumd at {self.path} closed the connection")
+            self.buffer += data
+
+    def readPackets(self, count):
+        '''
+        The next count packets
+
+        :rtype: list of bytes
+        '''
+        self.reset_input_buffer()
+        packets = []
+        while len(packets) < count:
+            parts = self.readline().split()
+            packets.extend([bytes.fromhex(part.split(b":")[1].decode("ascii")) for part in parts])
+        return packets[:count]
+
+    def frames(self):
+        '''
+        Every packet as it arrives, nothing is dropped between reads
+
+        :return: Iterator of (timestamp, packet), timestamp is the time the daemon read the first byte of the packet
+        '''
+        if self.socket == None:
+            self.open()
+        while True:
+            for part in self.readline().split():
+                timestamp, packet = part.split(b":")
+                yield (float(timestamp), bytes.fromhex(packet.decode("ascii")))
+
+    def snapshots(self):
+        '''
+        The documents of a snapshots subscription as they arrive
+
+        :return: Iterator of dict
+        '''
+        if self.socket == None:
+            self.open()
+        while True:
+            yield loads(self.readline())
+
+
+class _Client:
+    def __init__(self, connection):
+        self.connection = connection
+        self.subscription = None
+        self.request = b""
+        self.pending = b""
+
+
+class FanoutServer:
+    '''
+    Reads a Magnum reader continuously and sends every packet, in batches of the reader's packets, to the clients of
+    a Unix domain socket
+
+    :param reader: The reader that owns the port
+    :type reader: Magnum
+    :param path: The socket file, replaced if it is left over from before
+    :type path: str
+    :param mode: File permissions of the socket, defaults to 0o660
+    :type mode: int, optional
+    :param maxbuffer: Most bytes waiting for a client before it is disconnected, defaults to 1 MB
+    :type maxbuffer: int, optional
+    :param interval: Least seconds between batches, packets are gathered meanwhile, defaults to 0, as fast as the port delivers
+    :type interval: float, optional
+    '''
+
+    def __init__(self, reader, path, mode=0o660, maxbuffer=1 << 20, interval=0):
+        self.reader = reader
+        self.path = path
+        self.maxbuffer = maxbuffer
+        self.interval = interval
+        self.clients = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.reads = 0
+        self.errors = 0
+        if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+            os.unlink(path)
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.listener.bind(path)
+        os.chmod(path, mode)
+        self.listener.listen(16)
+        self.listener.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.listener, selectors.EVENT_READ)
+        self.thread = threading.Thread(target=self._read, name="magnumd-reader", daemon=True)
+
+    def _read(self):
+        reader = self.reader
+        while not self.stopping.is_set():
+            #
+            # streamPackets() keeps the port open and reads every byte, a read with readPackets() drops what
+            # arrived since the one before
+            #
+            stream = reader.streamPackets()
+            batch = []
+            started = time.monotonic()
+            try:
+                for timestamp, packet in stream:
+                    batch.append((timestamp, packet))
+                    if len(batch) >= reader.packetcount and time.monotonic() - started >= self.interval:
+                        self._send(batch)
+                        batch = []
+                        started = time.monotonic()
+                    if self.stopping.is_set():
+                        break
+                #
+                # the end of a capture file, it is read again
+                #
+                if len(batch) > 0:
+                    self._send(batch)
+            except Exception as e:
+                print("{0} {1}".format(reader.getComm_Device(), str(e)))
+                self.errors += 1
+                self.stopping.wait(1)
+            finally:
+                stream.close()
+        reader._closePort()
+
+    def _send(self, batch):
+        reader = self.reader
+        packets = [packet for timestamp, packet in batch]
+        devices = reader._updateDevices(reader._parsePackets(packets))
+        self.reads += 1
+        frames = b" ".join([f"{timestamp:.3f}:{packet.hex()}".encode("ascii") for timestamp, packet in batch]) + b"\n"
+        moment = datetime.fromtimestamp(batch[-1][0], timezone.utc).replace(microsecond=0).astimezone().isoformat()
+        snapshot = None
+        if any(client.subscription == SNAPSHOTS for client in list(self.clients.values())):
+            snapshot = dumps({"datetime": moment, "device": "MAGNUM", "comm_device": reader.getComm_Device(),
+                              "data": devices}) + b"\n"
+        self._broadcast(frames, snapshot)
+
+    def _broadcast(self, frames, snapshot):
+        with self.lock:
+            clients = list(self.clients.values())
+        for client in clients:
+            if client.subscription == FRAMES:
+                line = frames
+            elif client.subscription == SNAPSHOTS:
+                line = snapshot
+            else:
+                continue
+            if line == None:
+                #
+                # subscribed after this read was decoded
+                #
+                continue
+            if len(client.pending) > self.maxbuffer:
+                #
+                # too far behind, the selector loop sees the connection end and removes the client
+                #
+                self._shutdown(client)
+                continue
+            client.pending += line
+            try:
+                sent = client.connection.send(client.pending)
+                client.pending = client.pending[sent:]
+            except BlockingIOError:
+                pass
+            except OSError:
+                self._shutdown(client)
+
+    def _shutdown(self, client):
+        client.subscription = None
+        try:
+            client.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def _accept(self):
+        try:
+            connection, address = self.listener.accept()
+        except BlockingIOError:
+            return
+        connection.setblocking(False)
+        client = _Client(connection)
+        with self.lock:
+            self.clients[connection.fileno()] = client
+        self.selector.register(connection, selectors.EVENT_READ, client)
+
+    def _receive(self, client):
+        try:
+            data = client.connection.recv(1024)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if len(data) == 0 or len(client.request) > 1024:
+            self._remove(client)
+            return
+        if client.subscription == None and b"\n" not in client.request:
+            client.request += data
+            if b"\n" in client.request:
+                subscription = client.request.split(b"\n")[0].strip().lower()
+                if subscription not in (FRAMES, SNAPSHOTS):
+                    self._remove(client)
+                    return
+                client.subscription = subscription
+
+    def _remove(self, client):
+        with self.lock:
+            self.clients.pop(client.connection.fileno(), None)
+        self.selector.unregister(client.connection)
+        client.connection.close()
+
+    def serve_forever(self):
+        '''
+        Start reading the port and serve clients until stop() is called
+        '''
+        self.thread.start()
+        while not self.stopping.is_set():
+            for key, events in self.selector.select(timeout=1):
+                if key.data == None:
+                    self._accept()
+                else:
+                    self._receive(key.data)
+
+    def stop(self):
+        self.stopping.set()
+
+    def close(self):
+        self.stop()
+        for client in list(self.clients.values()):
+            self._remove(client)
+        self.selector.close()
+        self.listener.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+def main():
+    #
+    # imported here as importing magnum.magnum may wait for the system to settle after boot
+    #
+    from magnum.magnum import Magnum
+    from magnum.magparser import MagnumArgumentParser
+
+    parser = MagnumArgumentParser(description="Magnum Reader Daemon", prog="magnumd", fromfile_prefix_chars='@',
+                                  epilog="Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    parser.add_argument("--device", "-d", default="/dev/ttyUSB0",
+                        help="Serial device name (default: %(default)s)")
+    parser.add_argument("--socket", "-s", default="/run/magnum.sock",
+                        help="Unix domain socket for clients (default: %(default)s)")
+    parser.add_argument("--verbose", '-v', action="store_true", default=False,
+                        help="Display options at runtime (default: %(default)s)")
+    seldom = parser.add_argument_group("Seldom used")
+    seldom.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    seldom.add_argument("--mode", default="660",
+                        help="Octal file permissions of the socket (default: %(default)s)")
+    seldom.add_argument("--interval", default=0, type=float,
+                        help="Least seconds between batches of packets, 0 is as fast as the port delivers (default: %(default)s)")
+    seldom.add_argument("--maxbuffer", default=1 << 20, type=int,
+                        help="Most bytes waiting for a slow client before it is disconnected (default: %(default)s)")
+    seldom.add_argument("--packets", default=50, type=int,
+                        help="Number of packets in each batch (default: %(default)s)")
+    seldom.add_argument("--timeout", default=0.005, type=float,
+                        help="Timeout for serial read (default: %(default)s)")
+    seldom.add_argument("--nocleanup", action="store_true", default=False, dest='cleanpackets',
+                        help="Suppress clean up of unknown packets (default: False)")
+    args = parser.magnum_parse_args()
+    if not hasattr(socket, "AF_UNIX"):
+        parser.error("Unix domain sockets are not available on this system")
+    if args.verbose:
+        print('Magnum Reader Daemon Version:{0}'.format(magnum.__version__))
+        print(f"Options:{str(args)[10:-1]}")
+    try:
+        reader = Magnum(device=args.device[0], packets=args.packets, timeout=args.timeout,
+                        cleanpackets=args.cleanpackets)
+        reader.getDevices()  # test read to see if all's good
+    except Exception as e:
+        print("{0} {1}".format(args.device[0], str(e)))
+        exit(2)
+    server = FanoutServer(reader, args.socket, mode=int(args.mode, 8), maxbuffer=args.maxbuffer,
+                          interval=args.interval)
+
+    def shutdown_handler(signum, frame):
+        server.stop()
+    signal.signal(signal.SIGINT, shutdown_handler)
+    signal.signal(signal.SIGTERM, shutdown_handler)
+    print(f"Serving {reader.getComm_Device()} on {args.socket}")
+    try:
+        server.serve_forever()
+    finally:
+        server.stop()
+        server.thread.join(5)
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -36,6 +36,11 @@ class MagnumArgumentParser(argparse.ArgumentParser):
                     else:
                         if (self.isPosix and name in serial_ports) or (self.isPosix == False and name in serial_ports):
                             devices[name] = "serial"
+                        elif name.startswith("unix:"):
+                            if os.path.exists(name[5:]):
+                                devices[name] = "socket"
+                            else:
+                                self.error(f"option --device {name} is not available, is magnumd running?")
                         else:
                             if name.startswith("!") and len(name)>1:
                                 name = name[1:]
@@ -0,0 +1,185 @@
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# Profiling hooks for the stages of a Magnum reader.
+#
+#  reader.addHook(LatencyHook())
+#
+# The stages are
+#   read      readPackets(), reading the packets from the network
+#   classify  _parsePacket(), identifying and unpacking one packet
+#   cleanup   cleanup(), merging pairs of UNKNOWN packets. Its classify stages are nested in it
+#   parse     the parse() method of a device, for one packet
+#   device    the getDevice() method of a device
+#
+# A hook is any object with begin(stage) and end(stage, elapsed) methods, elapsed is in seconds.
+# The stages are only wrapped while a hook is registered, so without hooks there is no cost at all.
+#
+# To profile a device from the command line
+#  python3 -m magnum.magprofile --device /dev/ttyUSB0 --samples 100 --output magnum.prof
+#
+import cProfile
+import pstats
+import sys
+
+from time import perf_counter
+
+READ = "read"
+CLASSIFY = "classify"
+CLEANUP = "cleanup"
+PARSE = "parse"
+DEVICE = "device"
+STAGES = (READ, CLASSIFY, CLEANUP, PARSE, DEVICE)
+
+
+def wrap(stage, function, hooks):
+    '''
+    Wrap a function so each call is reported to every hook
+
+    :param stage: One of STAGES
+    :type stage: str
+    :param function: The bound method to wrap
+    :param hooks: The list of hooks, it is read on each call so hooks can be added later
+    :type hooks: list
+    '''
+    def wrapper(*args, **kwargs):
+        for hook in hooks:
+            hook.begin(stage)
+        start = perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = perf_counter() - start
+            for hook in hooks:
+                hook.end(stage, elapsed)
+    wrapper.__wrapped__ = function
+    return wrapper
+
+
+class LatencyHook:
+    '''
+    Keeps the time taken by every stage and summarizes it
+
+    :param samples: Most recent times kept per stage for percentiles, defaults to 10000
+    :type samples: int, optional
+    '''
+
+    def __init__(self, samples=10000):
+        self.samples = samples
+        self.stages = {}
+
+    def begin(self, stage):
+        pass
+
+    def end(self, stage, elapsed):
+        latency = self.stages.get(stage)
+        if latency == None:
+            latency = {"count": 0, "total": 0.0, "max": 0.0, "times": []}
+            self.stages[stage] = latency
+        latency["count"] += 1
+        latency["total"] += elapsed
+        if elapsed > latency["max"]:
+            latency["max"] = elapsed
+        times = latency["times"]
+        if len(times) >= self.samples:
+            times[latency["count"] % self.samples] = elapsed
+        else:
+            times.append(elapsed)
+
+    def summary(self):
+        '''
+        The latency of each stage
+
+        :return: Dictionary of stage to a dictionary of count, total, mean, p50, p95, p99 and max, in seconds
+        :rtype: dict
+        '''
+        summary = {}
+        for stage, latency in self.stages.items():
+            times = sorted(latency["times"])
+            summary[stage] = {"count": latency["count"], "total": latency["total"],
+                              "mean": latency["total"] / latency["count"],
+                              "p50": times[int(len(times) * 0.50)], "p95": times[int(len(times) * 0.95)],
+                              "p99": times[int(len(times) * 0.99)], "max": latency["max"]}
+        return summary
+
+    def report(self, file=sys.stdout):
+        '''
+        Print the summary as a table, times in microseconds
+        '''
+        print(f"{'Stage':10}{'Count':>10}{'Total s':>10}{'Mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'Max':>10}", file=file)
+        for stage, latency in self.summary().items():
+            print(f"{stage:10}{latency['count']:10}{latency['total']:10.3f}" +
+                  "".join([f"{latency[name] * 1e6:10.1f}" for name in ("mean", "p50", "p95", "p99", "max")]), file=file)
+
+
+class CProfileHook:
+    '''
+    Runs cProfile only while a stage is running, so time waiting between samples is left out
+
+    :param stages: The stages to profile, defaults to all of them
+    :type stages: tuple, optional
+    '''
+
+    def __init__(self, stages=STAGES):
+        self.stages = stages
+        self.profile = cProfile.Profile()
+        self.depth = 0
+
+    def begin(self, stage):
+        if stage in self.stages:
+            if self.depth == 0:
+                self.profile.enable()
+            self.depth += 1
+
+    def end(self, stage, elapsed):
+        if stage in self.stages:
+            self.depth -= 1
+            if self.depth == 0:
+                self.profile.disable()
+
+    def stats(self):
+        '''
+        :rtype: pstats.Stats
+        '''
+        return pstats.Stats(self.profile)
+
+    def dump(self, filename):
+        '''
+        Write the profile to a file that can be read by pstats or tools such as snakeviz
+        '''
+        self.profile.dump_stats(filename)
+
+
+def main():
+    import argparse
+
+    from magnum.magnum import Magnum
+    parser = argparse.ArgumentParser(description="Magnum Reader Profile", prog="magprofile")
+    parser.add_argument("--device", "-d", default="/dev/ttyUSB0",
+                        help="Serial device name, or ! and a capture file name (default: %(default)s)")
+    parser.add_argument("--samples", "-n", default=100, type=int,
+                        help="Samples to read (default: %(default)s)")
+    parser.add_argument("--packets", default=50, type=int,
+                        help="Number of packets to generate in reader (default: %(default)s)")
+    parser.add_argument("--output", "-o", default=None,
+                        help="File for the cProfile data (default: %(default)s)")
+    args = parser.parse_args()
+    reader = Magnum(device=args.device, packets=args.packets)
+    latency = LatencyHook()
+    profile = CProfileHook()
+    reader.addHook(latency)
+    reader.addHook(profile)
+    for sample in range(args.samples):
+        reader.getDevices()
+    latency.report()
+    if args.output != None:
+        profile.dump(args.output)
+        print(f"Profile written to {args.output}")
+    else:
+        profile.stats().sort_stats("cumulative").print_stats(20)
+
+
+if __name__ == '__main__':
+    main()
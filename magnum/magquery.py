@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# Queries of recorded samples, from a maghistory ring file or a SQLite store made by magsql --store.
+# run the program with --help for details of options.
+#
+#  magquery history.ring --list
+#  magquery history.ring --fields INV_vdc BMK_soc --start -1d --step 1m --aggregate min max mean
+#  magquery magnum.db --fields INV_vdc --start 2026-01-01T00:00 --end 2026-02-01T00:00 --step 1h --format json
+#
+# Fields are named as in the allinone layout, the device prefix and the field name, such as INV_vdc.
+# Without --step every sample is returned. With --step the samples are grouped into periods of that many
+# seconds, aligned to the Unix epoch, and each field is reduced to its min, max, mean and or last value.
+# A SQLite store keeps rollups of 1 minute and 1 hour. When the step is a whole number of rollup periods the
+# rollups are used instead of the samples, so a month of data at 1 hour is read from about 720 rows per device.
+#
+# Times can be ISO 8601, Unix epoch seconds or relative to now such as -30m, -12h or -7d.
+#
+import csv
+import json
+import re
+import sqlite3
+import sys
+import time
+
+from datetime import datetime, timezone
+
+import magnum
+from magnum.maghistory import MAGIC, HistoryRing
+from magnum.magschema import DEVICE_PREFIXES
+from magnum.magstore import ROLLUPS
+
+AGGREGATES = ("min", "max", "mean", "last")
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+#
+# device name for each allinone prefix
+#
+PREFIX_DEVICES = {prefix: device for device, prefix in DEVICE_PREFIXES.items()}
+
+
+def parseTime(text, now=None):
+    '''
+    Convert a time to Unix epoch seconds
+
+    :param text: ISO 8601, epoch seconds, or a negative duration relative to now such as -30m, -12h or -7d
+    :type text: str
+    :rtype: float
+    '''
+    if text == None:
+        return None
+    match = re.fullmatch(r"-(\d+(?:\.\d*)?)([smhd])", text)
+    if match:
+        return (time.time() if now == None else now) - float(match.group(1)) * UNITS[match.group(2)]
+    try:
+        return float(text)
+    except ValueError:
+        pass
+    return datetime.fromisoformat(text).timestamp()
+
+
+def parseStep(text):
+    '''
+    Convert a duration such as 30s, 1m, 1h, 1d or 300 to seconds
+
+    :rtype: int
+    '''
+    if text == None:
+        return None
+    match = re.fullmatch(r"(\d+)([smhd]?)", text)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid step {text}")
+    return int(match.group(1)) * UNITS.get(match.group(2) or "s")
+
+
+def splitField(field):
+    '''
+    The device and device field name of an allinone column, INV_vdc is (INVERTER, vdc)
+    '''
+    prefix, separator, name = field.partition("_")
+    if separator == "" or name == "":
+        raise ValueError(f"Invalid field {field}, it must be the device prefix and the field name such as INV_vdc")
+    return PREFIX_DEVICES.get(prefix, prefix), name
+
+
+class Downsampler:
+    '''
+    Reduces values to periods of step seconds. Values are added as partial results, (min, max, sum, count, last)
+    for each field, so raw samples and rollups can be combined the same way.
+    '''
+
+    def __init__(self, step, fields, aggregates):
+        self.step = step
+        self.fields = fields
+        self.aggregates = aggregates
+        self.periods = {}
+
+    def add(self, timestamp, comm_device, partials):
+        bucket = timestamp // self.step * self.step
+        key = (bucket, comm_device)
+        current = self.periods.get(key)
+        if current == None:
+            self.periods[key] = [list(partial) if partial != None else None for partial in partials]
+            return
+        for index, partial in enumerate(partials):
+            if partial == None:
+                continue
+            total = current[index]
+            if total == None:
+                current[index] = list(partial)
+                continue
+            if partial[0] < total[0]:
+                total[0] = partial[0]
+            if partial[1] > total[1]:
+                total[1] = partial[1]
+            total[2] += partial[2]
+            total[3] += partial[3]
+            total[4] = partial[4]
+
+    def addValues(self, timestamp, comm_device, values):
+        self.add(timestamp, comm_device, [None if value == None else (value, value, value, 1, value) for value in values])
+
+    def columns(self):
+        return ["timestamp", "comm_device"] + [f"{field}_{aggregate}" for field in self.fields for aggregate in self.aggregates]
+
+    def rows(self):
+        rows = []
+        for (bucket, comm_device), totals in sorted(self.periods.items()):
+            row = [bucket, comm_device]
+            for total in totals:
+                for aggregate in self.aggregates:
+                    if total == None:
+                        row.append(None)
+                    elif aggregate == "min":
+                        row.append(total[0])
+                    elif aggregate == "max":
+                        row.append(total[1])
+                    elif aggregate == "mean":
+                        row.append(total[2] / total[3] if total[3] > 0 else None)
+                    else:
+                        row.append(total[4])
+            rows.append(row)
+        return rows
+
+
+class HistoryQuery:
+    '''
+    Queries of a maghistory ring file. It can be read while maghistory is writing to it.
+
+    :param filename: The ring file
+    :type filename: str
+    '''
+
+    def __init__(self, filename):
+        self.history = HistoryRing(filename, readonly=True)
+
+    def fields(self):
+        '''
+        Names of the fields that can be queried
+        '''
+        return list(self.history.columns)
+
+    def span(self):
+        '''
+        (oldest, newest) Unix epoch seconds of the samples, None if there are none
+        '''
+        if len(self.history) == 0:
+            return None
+        return (self.history.timestamp(0), self.history.newest)
+
+    def query(self, fields=None, start=None, end=None, step=None, aggregates=("mean",), comm_device=None):
+        '''
+        Select samples by time and, optionally, downsample them
+
+        :param fields: allinone names of the fields, defaults to all of them
+        :type fields: list, optional
+        :param start: Unix epoch seconds of the first sample, defaults to the oldest
+        :type start: float, optional
+        :param end: Unix epoch seconds after the last sample, defaults to after the newest
+        :type end: float, optional
+        :param step: Seconds in each period, defaults to None, every sample
+        :type step: int, optional
+        :param aggregates: Any of min, max, mean and last, defaults to mean
+        :type aggregates: tuple, optional
+        :param comm_device: Only samples from this device, defaults to all devices
+        :type comm_device: str, optional
+        :return: Dictionary of columns, a list of names, and rows, a list of lists
+        :rtype: dict
+        '''
+        fields = self.history.columns if fields == None else fields
+        for field in fields:
+            if field not in self.history.positions:
+                raise ValueError(f"Unknown field {field}")
+        records = self.history.select(fields, start, end, comm_device)
+        if step == None:
+            return {"columns": ["timestamp", "comm_device"] + list(fields),
+                    "rows": [[timestamp, name, *values] for timestamp, name, values in records]}
+        downsampler = Downsampler(step, fields, aggregates)
+        for timestamp, name, values in records:
+            downsampler.addValues(timestamp, name, values)
+        return {"columns": downsampler.columns(), "rows": downsampler.rows()}
+
+    def close(self):
+        self.history.close()
+
+
+class StoreQuery:
+    '''
+    Queries of a SQLite store made by SQLiteStore or magsql --store.
+    Downsampling uses the rollup tables when the step is a whole number of rollup periods.
+
+    :param path: The database file name
+    :type path: str
+    :param rollups: Dictionary of period in seconds to table suffix, defaults to ROLLUPS, 1 minute and 1 hour
+    :type rollups: dict, optional
+    '''
+
+    def __init__(self, path, rollups=ROLLUPS):
+        self.connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self.rollups = rollups
+        self.tables = {}
+        for (table,) in self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'"):
+            self.tables[table] = [row[1] for row in self.connection.execute(f"PRAGMA table_info({table})")]
+
+    def _devices(self):
+        suffixes = tuple([f"_{suffix}" for suffix in self.rollups.values()])
+        return [table for table, columns in self.tables.items()
+                if "timestamp" in columns and not table.endswith(suffixes)]
+
+    def fields(self):
+        '''
+        Names of the fields that can be queried
+        '''
+        fields = []
+        for device in self._devices():
+            prefix = DEVICE_PREFIXES.get(device, device)
+            fields.extend([f"{prefix}_{column}" for column in self.tables[device]
+                           if column not in ("timestamp", "comm_device")])
+        return sorted(fields)
+
+    def span(self):
+        '''
+        (oldest, newest) Unix epoch seconds of the samples, None if there are none
+        '''
+        oldest = None
+        newest = None
+        for device in self._devices():
+            low, high = self.connection.execute(f"SELECT min(timestamp), max(timestamp) FROM {device}").fetchone()
+            if low != None:
+                oldest = low if oldest == None else min(oldest, low)
+                newest = high if newest == None else max(newest, high)
+        return None if oldest == None else (oldest, newest)
+
+    def _rollup(self, step):
+        '''
+        The longest rollup period that divides step, or None
+        '''
+        for period in sorted(self.rollups, reverse=True):
+            if period <= step and step % period == 0:
+                return period
+        return None
+
+    def _where(self, column, start, end, comm_device):
+        conditions = []
+        values = []
+        if start != None:
+            conditions.append(f"{column} >= ?")
+            values.append(start)
+        if end != None:
+            conditions.append(f"{column} < ?")
+            values.append(end)
+        if comm_device != None:
+            conditions.append("comm_device = ?")
+            values.append(comm_device)
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), values
+
+    def query(self, fields=None, start=None, end=None, step=None, aggregates=("mean",), comm_device=None):
+        '''
+        Select samples by time and, optionally, downsample them. The parameters and result are the same
+        as HistoryQuery.query(), fields are required.
+        '''
+        if fields == None:
+            raise ValueError("Fields are required to query a store")
+        bydevice = {}
+        for position, field in enumerate(fields):
+            device, name = splitField(field)
+            if device not in self.tables or name not in self.tables[device]:
+                raise ValueError(f"Unknown field {field}")
+            bydevice.setdefault(device, []).append((position, name))
+        period = None if step == None else self._rollup(step)
+        if step == None:
+            samples = {}
+            for device, columns in bydevice.items():
+                where, values = self._where("timestamp", start, end, comm_device)
+                select = ", ".join([name for position, name in columns])
+                for row in self.connection.execute(f"SELECT timestamp, comm_device, {select} FROM {device}{where}", values):
+                    sample = samples.get((row[0], row[1]))
+                    if sample == None:
+                        sample = [row[0], row[1]] + [None] * len(fields)
+                        samples[(row[0], row[1])] = sample
+                    for (position, name), value in zip(columns, row[2:]):
+                        sample[position + 2] = value
+            return {"columns": ["timestamp", "comm_device"] + list(fields),
+                    "rows": [samples[key] for key in sorted(samples)]}
+        #
+        # only numeric fields have rollup columns, and only they can be downsampled
+        #
+        for device, columns in bydevice.items():
+            for suffix in self.rollups.values():
+                rollup = self.tables.get(f"{device}_{suffix}")
+                if rollup != None:
+                    for position, name in columns:
+                        if f"{name}_min" not in rollup:
+                            raise ValueError(f"{fields[position]} is not numeric, it can only be queried without --step")
+                    break
+        downsampler = Downsampler(step, fields, aggregates)
+        for device, columns in bydevice.items():
+            if period == None:
+                where, values = self._where("timestamp", start, end, comm_device)
+                select = ", ".join([name for position, name in columns])
+                statement = f"SELECT timestamp, comm_device, {select} FROM {device}{where} ORDER BY timestamp"
+            else:
+                table = f"{device}_{self.rollups[period]}"
+                if table not in self.tables:
+                    raise ValueError(f"The store has no {table} rollups")
+                where, values = self._where("bucket", start, end, comm_device)
+                rollup = self.tables[table]
+                #
+                # stores written before fields had their own count use the count of samples
+                #
+                select = ", ".join([f"{name}_min, {name}_max, {name}_sum, "
+                                    f"{name + '_count' if name + '_count' in rollup else 'samples'}, {name}_last"
+                                    for position, name in columns])
+                statement = f"SELECT bucket, comm_device, {select} FROM {table}{where} ORDER BY bucket"
+            for row in self.connection.execute(statement, values):
+                partials = [None] * len(fields)
+                for index, (position, name) in enumerate(columns):
+                    if period == None:
+                        value = row[index + 2]
+                        partials[position] = None if type(value) not in (int, float) else (value, value, value, 1, value)
+                    else:
+                        partial = row[index * 5 + 2:index * 5 + 7]
+                        partials[position] = None if partial[0] == None else partial
+                downsampler.add(row[0], row[1], partials)
+        return {"columns": downsampler.columns(), "rows": downsampler.rows()}
+
+    def close(self):
+        self.connection.close()
+
+
+def openQuery(filename):
+    '''
+    Open a ring file with HistoryQuery or a SQLite store with StoreQuery, depending on the contents of the file
+    '''
+    with open(filename, "rb") as file:
+        magic = file.read(len(MAGIC))
+    if magic == MAGIC:
+        return HistoryQuery(filename)
+    return StoreQuery(filename)
+
+
+def formatTime(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).astimezone().isoformat()
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Magnum History Query", prog="magquery", fromfile_prefix_chars='@',
+                                     epilog="Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    parser.add_argument("source",
+                        help="A maghistory ring file or a SQLite store made by magsql --store")
+    parser.add_argument("--fields", nargs='+', default=None,
+                        help="Fields, such as INV_vdc, all of them for a ring file if not set (default: %(default)s)")
+    parser.add_argument("--start", default=None,
+                        help="Time of the first sample, ISO 8601, epoch seconds or relative such as -1d (default: %(default)s)")
+    parser.add_argument("--end", default=None,
+                        help="Time after the last sample (default: %(default)s)")
+    parser.add_argument("--step", default=None,
+                        help="Downsample to periods such as 30s, 1m or 1h (default: %(default)s)")
+    parser.add_argument("--aggregate", nargs='+', default=["mean"], choices=list(AGGREGATES),
+                        help="Reduction of each field in a period (default: %(default)s)")
+    parser.add_argument("--comm_device", default=None,
+                        help="Only samples from this device (default: %(default)s)")
+    parser.add_argument("--format", default="csv", choices=["csv", "json"],
+                        help="Output format (default: %(default)s)")
+    parser.add_argument("--list", action="store_true", default=False,
+                        help="List the fields and the time span instead (default: %(default)s)")
+    seldom = parser.add_argument_group("Seldom used")
+    seldom.add_argument("--epoch", action="store_true", default=False,
+                        help="Show times as epoch seconds instead of ISO 8601 (default: %(default)s)")
+    seldom.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    args = parser.parse_args()
+    try:
+        source = openQuery(args.source)
+    except Exception as e:
+        print(f"{args.source} {e}", file=sys.stderr)
+        exit(2)
+    try:
+        if args.list:
+            span = source.span()
+            if span != None:
+                print(f"# {formatTime(span[0])} to {formatTime(span[1])}")
+            for field in source.fields():
+                print(field)
+            return
+        start = time.perf_counter()
+        try:
+            result = source.query(fields=args.fields, start=parseTime(args.start), end=parseTime(args.end),
+                                  step=parseStep(args.step), aggregates=args.aggregate, comm_device=args.comm_device)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            exit(2)
+        elapsed = time.perf_counter() - start
+        if not args.epoch:
+            for row in result["rows"]:
+                row[0] = formatTime(row[0])
+        if args.format == "json":
+            json.dump(result, sys.stdout)
+            print()
+        else:
+            writer = csv.writer(sys.stdout)
+            writer.writerow(result["columns"])
+            writer.writerows(result["rows"])
+        print(f"{len(result['rows'])} rows in {elapsed * 1000:.1f} ms", file=sys.stderr)
+    finally:
+        source.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# The flat, single row, layout used by Magnum.allinone()
+# Each variable is prefixed with the device name consistent with the values
+# used in the old Java based magnum software (v1)
+#
+from magnum import *
+
+DEVICE_PREFIXES = {INVERTER: "INV",
+                   AGS: "AGS",
+                   BMK: "BMK",
+                   RTR: "RTR",
+                   PT100: "PT",
+                   REMOTE: "ARC"
+                   }
+
+#
+# every row starts with these columns
+#
+ROW_KEYS = ("datetime", "comm_device")
+
+
+class FlatSchema:
+    '''
+    A fixed column order for flat rows. The layout is built once and is only rebuilt,
+    with a new version number, when the set of devices or the fields of a device change.
+
+    **attributes**:
+
+    - **version** Incremented every time the layout changes. 0 means no layout yet
+    - **keys** Tuple of the prefixed data column names, sorted
+    - **columns** Tuple of all column names, ``datetime`` and ``comm_device`` followed by keys
+    - **types** List of the type of each key, bool, float or str, from the first value that isn't None.
+      None until such a value has been seen. int is float as fields switch between the two
+    '''
+
+    def __init__(self):
+        self.version = 0
+        self.keys = ()
+        self.columns = ROW_KEYS
+        self.types = []
+        self.untyped = set()
+        self.fieldsets = []
+        self.plan = {}
+
+    def update(self, devices):
+        '''
+        Check the layout against a list of device dictionaries and rebuild it if it has changed
+
+        :param devices: List of device dictionaries, the ``data`` item of a magdump document
+        :type devices: list
+        :return: True if the layout changed
+        :rtype: boolean
+        '''
+        if len(devices) == len(self.fieldsets):
+            for item, (name, fields) in zip(devices, self.fieldsets):
+                if item['device'] != name or item['data'].keys() != fields:
+                    break
+            else:
+                return False
+        self.fieldsets = [(item['device'], frozenset(item['data'])) for item in devices]
+        columns = {}
+        for item in devices:
+            deviceprefix = DEVICE_PREFIXES.get(item['device'], item['device'])
+            for itemkey in item['data']:
+                columns[f"{deviceprefix}_{itemkey}"] = (item['device'], itemkey)
+        known = dict(zip(self.keys, self.types))
+        self.keys = tuple(sorted(columns))
+        self.columns = ROW_KEYS + self.keys
+        self.types = [known.get(key) for key in self.keys]
+        self.untyped = set([index for index, columntype in enumerate(self.types) if columntype == None])
+        #
+        # plan is, for each device, a list of (position in row, field name)
+        #
+        self.plan = {}
+        for index, key in enumerate(self.keys):
+            name, itemkey = columns[key]
+            self.plan.setdefault(name, []).append((index, itemkey))
+        self.version += 1
+        return True
+
+    def values(self, devices):
+        '''
+        The data values of a list of device dictionaries in key order.
+        Fields that are not present are None.
+
+        :rtype: list
+        '''
+        self.update(devices)
+        values = [None] * len(self.keys)
+        for item in devices:
+            data = item['data']
+            for index, itemkey in self.plan[item['device']]:
+                values[index] = data[itemkey]
+        if len(self.untyped) > 0:
+            self._learn(values)
+        return values
+
+    def _learn(self, values):
+        for index in list(self.untyped):
+            value = values[index]
+            if value == None:
+                continue
+            if type(value) == bool:
+                self.types[index] = bool
+            elif type(value) in (int, float):
+                self.types[index] = float
+            else:
+                self.types[index] = str
+            self.untyped.discard(index)
+
+    def columnTypes(self):
+        '''
+        The type of every column, in column order. datetime and comm_device are str
+
+        :rtype: tuple
+        '''
+        return (str, str) + tuple(self.types)
+
+    def row(self, alldata):
+        '''
+        Convert a magdump document to a row in column order
+
+        :param alldata: A dictionary with datetime, comm_device and data items
+        :type alldata: dict
+        :rtype: tuple
+        '''
+        return (alldata['datetime'], alldata['comm_device'], *self.values(alldata['data']))
+
+    def rowdata(self, devices):
+        '''
+        The data values of a list of device dictionaries as a dictionary in key order
+        '''
+        values = self.values(devices)
+        return dict(zip(self.keys, values))
@@ -0,0 +1,538 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# A REST API server for Magnum data.
+# run the program with --help for details of options.
+#
+#  magserver --device /dev/ttyUSB0 --port 17223 --interval 5
+#
+# One background thread reads the devices every --interval seconds and keeps the encoded result.
+# Every request is answered from that cached snapshot, so any number of clients can be served
+# without waiting for, or adding to, reads of the serial port.
+#
+# Paths
+#   /            every device of every reader
+#   /inverter    only that device, also /remote, /bmk, /ags, /rtr, /pt100 and /acld
+#   ?fields=vdc,adc  only those fields of each device
+#   /events      a Server-Sent Events stream of every new snapshot
+#   /events?changes  only the fields that changed since the last event
+#   /events?interval=10  at most one event every 10 seconds
+#   /metrics     Prometheus metrics for numeric device fields and the readers themselves
+#
+# Each response has an ETag. A request with a matching If-None-Match header gets 304 Not Modified.
+# A device response doesn't include the time of the reading, so its ETag only changes when the device data changes.
+# Responses are gzip compressed if the client accepts it. Encoded and compressed responses are kept until they change.
+#
+import gzip
+import hashlib
+import math
+import re
+import signal
+import sys
+import threading
+import time
+
+from datetime import datetime, timezone
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import magnum
+from magnum.magjson import DeviceEncoder, dumps
+
+#
+# longest ?interval= of an event stream, in seconds
+#
+MAX_EVENT_INTERVAL = 86400
+
+
+class Snapshot:
+    '''
+    The devices of every reader at one point in time, ready to send
+
+    :param version: Increases by one for every new snapshot
+    :type version: int
+    :param timestamp: Local time of the snapshot as an ISO 8601 string
+    :type timestamp: str
+    :param readers: List of (comm_device, devices, encoded) tuples, encoded is the JSON of each device
+    :type readers: list
+    :param statistics: Dictionary of comm_device to a copy of the reader's ReaderStats, defaults to None
+    :type statistics: dict, optional
+    :param errors: Dictionary of comm_device to the number of failed reads, defaults to None
+    :type errors: dict, optional
+    '''
+
+    def __init__(self, version, timestamp, readers, statistics=None, errors=None):
+        self.version = version
+        self.timestamp = timestamp
+        self.readers = readers
+        self.statistics = statistics or {}
+        self.errors = errors or {}
+        self.created = time.monotonic()
+        self.wallclock = time.time()
+        self.representations = {}
+
+
+class Representation:
+    '''
+    One encoded response with its ETag. The gzip version is made the first time it is asked for.
+
+    :param body: The JSON encoded response
+    :type body: bytes
+    '''
+
+    def __init__(self, body):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.compressed = None
+
+    def gzip(self):
+        if self.compressed == None:
+            self.compressed = gzip.compress(self.body, compresslevel=6, mtime=0)
+        return self.compressed
+
+
+class SnapshotPoller(threading.Thread):
+    '''
+    A daemon thread that reads every reader on a schedule and publishes the result as a Snapshot
+
+    :param readers: The readers to poll
+    :type readers: list of Magnum
+    :param interval: Seconds between the start of each poll, defaults to 5
+    :type interval: float, optional
+    '''
+
+    def __init__(self, readers, interval=5.0):
+        super().__init__(name="magnum-poller", daemon=True)
+        self.readers = readers
+        self.interval = interval
+        self.encoders = {reader.getComm_Device(): DeviceEncoder(reader) for reader in readers}
+        self.snapshot = None
+        self.version = 0
+        self.latest = {}
+        self.errors = {reader.getComm_Device(): 0 for reader in readers}
+        self.changed = threading.Condition()
+        self.stopping = threading.Event()
+
+    def poll(self):
+        '''
+        Read every reader once and publish a new snapshot.
+        A reader that fails keeps the devices from its last good read.
+        '''
+        timestamp = datetime.now(timezone.utc).replace(microsecond=0).astimezone().isoformat()
+        previous = {}
+        if self.snapshot != None:
+            previous = {comm_device: (devices, encoded) for comm_device, devices, encoded in self.snapshot.readers}
+        readers = []
+        for reader in self.readers:
+            comm_device = reader.getComm_Device()
+            try:
+                devices = reader.getDevices()
+                encoder = self.encoders[comm_device]
+                encoded = [encoder.encodeDevice(device) for device in devices]
+            except Exception as e:
+                print("{0} {1}".format(comm_device, str(e)))
+                self.errors[comm_device] += 1
+                devices, encoded = previous.get(comm_device, ([], []))
+            readers.append((comm_device, devices, encoded))
+        statistics = {reader.getComm_Device(): reader.statistics.copy() for reader in self.readers}
+        with self.changed:
+            self.version += 1
+            self.snapshot = Snapshot(self.version, timestamp, readers, statistics, dict(self.errors))
+            self.changed.notify_all()
+
+    def representation(self, snapshot, device=None, fields=None):
+        '''
+        The response for a snapshot, optionally for only one device and some fields.
+        An unchanged response is the same object from one snapshot to the next, so it is only compressed once.
+
+        :param device: Device name, such as INVERTER, defaults to None for all devices
+        :type device: str, optional
+        :param fields: Names of the fields to include, defaults to None for all fields
+        :type fields: tuple, optional
+        :return: None if the device is not present
+        :rtype: Representation
+        '''
+        key = (device, fields)
+        representation = snapshot.representations.get(key)
+        if representation != None:
+            return representation
+        body = self._encode(snapshot, device, fields)
+        if body == None:
+            return None
+        representation = self.latest.get(key)
+        if representation == None or representation.body != body:
+            representation = Representation(body)
+            #
+            # fields come from the client so only keep a reasonable number of combinations
+            #
+            if key in self.latest or len(self.latest) < 100:
+                self.latest[key] = representation
+        snapshot.representations[key] = representation
+        return representation
+
+    def _encode(self, snapshot, device, fields):
+        if device == "/METRICS":
+            return metrics(snapshot)
+        parts = []
+        for comm_device, devices, encoded in snapshot.readers:
+            selected = []
+            for devicedata, deviceencoded in zip(devices, encoded):
+                if device != None and devicedata["device"] != device:
+                    continue
+                if fields != None:
+                    data = {field: devicedata["data"][field] for field in fields if field in devicedata["data"]}
+                    deviceencoded = dumps({"device": devicedata["device"], "data": data})
+                selected.append(deviceencoded)
+            if device == None:
+                parts.append(b''.join([b'{"comm_device":', dumps(comm_device), b',"data":{"datetime":', dumps(snapshot.timestamp),
+                                       b',"devices":[', b','.join(selected), b']}}']))
+            else:
+                #
+                # {"comm_device":...,"device":...,"data":{...}} without the time, so it is unchanged if the device is
+                #
+                for deviceencoded in selected:
+                    parts.append(b'{"comm_device":' + dumps(comm_device) + b',' + deviceencoded[1:])
+        if device != None and len(parts) == 0:
+            return None
+        return b'[' + b','.join(parts) + b']'
+
+    def run(self):
+        while True:
+            if self.snapshot != None and self.stopping.wait(max(0, self.snapshot.created + self.interval - time.monotonic())):
+                break
+            self.poll()
+
+    def stop(self):
+        self.stopping.set()
+        with self.changed:
+            self.changed.notify_all()
+
+    def maxage(self, snapshot):
+        '''
+        Whole seconds until the snapshot is replaced
+        '''
+        return max(0, int(snapshot.created + self.interval - time.monotonic()))
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value):
+    if type(value) in (int, bool):
+        return str(int(value))
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+
+def metrics(snapshot):
+    '''
+    Render a snapshot in the Prometheus text exposition format.
+    Every numeric device field is a gauge named magnum_<device>_<field> with device and comm_device labels.
+
+    :rtype: bytes
+    '''
+    families = {}
+
+    def sample(name, kind, help, labels, value, suffix=""):
+        family = families.setdefault(name, (kind, help, []))
+        text = ",".join([f'{label}="{_label(labelvalue)}"' for label, labelvalue in labels])
+        if text != "":
+            text = "{" + text + "}"
+        family[2].append(f"{name}{suffix}{text} {_number(value)}")
+
+    for comm_device, devices, encoded in snapshot.readers:
+        for device in devices:
+            labels = (("device", device["device"]), ("comm_device", comm_device))
+            for field, value in device["data"].items():
+                if type(value) in (int, float, bool):
+                    name = re.sub("[^a-zA-Z0-9_]", "_", f"magnum_{device['device'].lower()}_{field}")
+                    sample(name, "gauge", f"{device['device']} {field}", labels, value)
+    for comm_device, statistics in snapshot.statistics.items():
+        labels = (("comm_device", comm_device),)
+        sample("magnum_reader_packets_total", "counter", "Packets read", labels, statistics.packets)
+        sample("magnum_reader_bytes_total", "counter", "Bytes read", labels, statistics.bytes)
+        sample("magnum_reader_unknown_packets_total", "counter", "Packets that could not be identified", labels, statistics.unknown)
+        sample("magnum_reader_merges_total", "counter", "Pairs of unknown packets joined by clean up", labels, statistics.merges)
+        sample("magnum_reader_unpack_failures_total", "counter", "Packets that could not be unpacked", labels, statistics.failures)
+        sample("magnum_reader_errors_total", "counter", "Failed reads", labels, snapshot.errors.get(comm_device, 0))
+        for packetType, count in statistics.types.items():
+            sample("magnum_reader_packet_types_total", "counter", "Packets parsed by type", labels + (("type", packetType),), count)
+        name = "magnum_reader_capture_seconds"
+        for bound, count in statistics.captures.cumulative():
+            sample(name, "histogram", "Seconds taken to read the packets of one sample",
+                   labels + (("le", "+Inf" if bound == float("inf") else repr(float(bound))),), count, "_bucket")
+        sample(name, "histogram", "", labels, statistics.captures.sum, "_sum")
+        sample(name, "histogram", "", labels, statistics.captures.count, "_count")
+    sample("magnum_snapshot_timestamp_seconds", "gauge", "Time of the latest reading", (), snapshot.wallclock)
+    lines = []
+    for name, (kind, help, samples) in families.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return ("\n".join(lines) + "\n").encode()
+
+
+class MagnumHandler(BaseHTTPRequestHandler):
+    '''
+    Answers GET requests from the poller's current snapshot
+    '''
+
+    def log_request(self, code='-', size='-'):
+        #
+        # suppress OK and Not Modified type messages
+        #
+        if isinstance(code, HTTPStatus):
+            code = code.value
+        if type(code) is int:
+            if (code < 200 or code >= 300) and code != HTTPStatus.NOT_MODIFIED:
+                super().log_request(code=code, size=size)
+
+    def do_GET(self):
+        poller = self.server.poller
+        url = urlsplit(self.path)
+        if url.path.rstrip("/") == "/events":
+            self._events(parse_qs(url.query, keep_blank_values=True))
+            return
+        snapshot = poller.snapshot
+        if snapshot == None:
+            self.send_response(HTTPStatus.SERVICE_UNAVAILABLE)
+            self.send_header("Retry-After", str(max(1, int(poller.interval))))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        device = url.path.strip("/").upper()
+        contenttype = "application/json"
+        if device == "METRICS":
+            device = "/METRICS"
+            contenttype = "text/plain; version=0.0.4; charset=utf-8"
+        elif device == "":
+            device = None
+            if all(len(devices) == 0 for comm_device, devices, encoded in snapshot.readers):
+                self.send_error(HTTPStatus.NO_CONTENT, message="No data available")
+                return
+        fields = None
+        query = parse_qs(url.query)
+        if "fields" in query and device != "/METRICS":
+            fields = tuple([field.strip() for value in query["fields"] for field in value.split(",") if field.strip() != ""])
+        representation = poller.representation(snapshot, device, fields)
+        if representation == None:
+            self.send_error(HTTPStatus.NOT_FOUND, message=f"{device} is not available")
+            return
+        match = self.headers.get("If-None-Match")
+        if match != None:
+            etags = [etag.strip()[2:] if etag.strip().startswith("W/") else etag.strip() for etag in match.split(",")]
+            if representation.etag in etags or "*" in etags:
+                self.send_response(HTTPStatus.NOT_MODIFIED)
+                self._cache_headers(poller, snapshot, representation)
+                self.end_headers()
+                return
+        body = representation.body
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", contenttype)
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = representation.gzip()
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self._cache_headers(poller, snapshot, representation)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _cache_headers(self, poller, snapshot, representation):
+        self.send_header("ETag", representation.etag)
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Cache-Control", f"max-age={poller.maxage(snapshot)}")
+
+    def _events(self, query):
+        '''
+        Stream snapshots as Server-Sent Events until the client goes away.
+        Each client only ever waits for the latest snapshot. A slow client, or one with a long interval,
+        skips the snapshots it missed rather than queuing them, so it can't hold memory or delay other clients.
+        '''
+        server = self.server
+        poller = server.poller
+        changes = "changes" in query
+        try:
+            interval = float(query.get("interval", ["0"])[0])
+        except ValueError:
+            interval = None
+        #
+        # inf and nan would defeat the rate limit, and very large values overflow socket and wait timeouts
+        #
+        if interval == None or not math.isfinite(interval) or interval > MAX_EVENT_INTERVAL:
+            self.send_error(HTTPStatus.BAD_REQUEST, message=f"interval must be a number up to {MAX_EVENT_INTERVAL}")
+            return
+        interval = max(interval, server.eventinterval)
+        with server.lock:
+            if server.clients >= server.maxclients:
+                self.send_error(HTTPStatus.SERVICE_UNAVAILABLE, message="Too many event clients")
+                return
+            server.clients += 1
+        try:
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            #
+            # a client that stops reading is dropped once a write has waited this long
+            #
+            self.connection.settimeout(max(30, 2 * interval))
+            self.wfile.write(f"retry: {int(max(poller.interval, interval) * 1000)}\n\n".encode())
+            version = 0
+            sent = {}
+            while not poller.stopping.is_set():
+                with poller.changed:
+                    poller.changed.wait_for(lambda: (poller.snapshot != None and poller.snapshot.version != version)
+                                            or poller.stopping.is_set(), timeout=15)
+                snapshot = poller.snapshot
+                if snapshot == None or snapshot.version == version:
+                    self.wfile.write(b": keepalive\n\n")
+                    self.wfile.flush()
+                    continue
+                version = snapshot.version
+                start = time.monotonic()
+                if changes:
+                    event = self._changes(snapshot, sent)
+                    if event != None:
+                        self.wfile.write(b"id: %d\nevent: changes\ndata: %s\n\n" % (version, event))
+                else:
+                    body = poller.representation(snapshot).body
+                    self.wfile.write(b"id: %d\nevent: snapshot\ndata: %s\n\n" % (version, body))
+                self.wfile.flush()
+                if poller.stopping.wait(max(0, start + interval - time.monotonic())):
+                    break
+        except (ConnectionError, TimeoutError, OSError):
+            pass
+        finally:
+            with server.lock:
+                server.clients -= 1
+            self.close_connection = True
+
+    def _changes(self, snapshot, sent):
+        '''
+        The fields of each device that differ from what the client was last sent
+
+        :param sent: Dictionary of (comm_device, device) to the data last sent, updated
+        :type sent: dict
+        :return: None if nothing changed
+        :rtype: bytes
+        '''
+        devices = []
+        for comm_device, readerdevices, encoded in snapshot.readers:
+            for device in readerdevices:
+                key = (comm_device, device["device"])
+                previous = sent.get(key, {})
+                data = {field: value for field, value in device["data"].items()
+                        if field not in previous or previous[field] != value}
+                if len(data) > 0:
+                    devices.append({"comm_device": comm_device, "device": device["device"], "data": data})
+                sent[key] = device["data"]
+        if len(devices) == 0:
+            return None
+        return dumps({"datetime": snapshot.timestamp, "devices": devices})
+
+
+class MagnumServer(ThreadingHTTPServer):
+    '''
+    A threaded HTTP server that serves the snapshots of a SnapshotPoller
+
+    :param address: (host, port) to listen on
+    :type address: tuple
+    :param poller: The source of snapshots
+    :type poller: SnapshotPoller
+    :param maxclients: Most event stream clients at one time, defaults to 100
+    :type maxclients: int, optional
+    :param eventinterval: Least seconds between events to one client, defaults to 1
+    :type eventinterval: float, optional
+    '''
+    daemon_threads = True
+
+    def __init__(self, address, poller, handler_class=MagnumHandler, maxclients=100, eventinterval=1.0):
+        self.poller = poller
+        self.maxclients = maxclients
+        self.eventinterval = eventinterval
+        self.clients = 0
+        self.lock = threading.Lock()
+        super().__init__(address, handler_class)
+
+
+def sigint_handler(signal, frame):
+    print('Interrupted. Shutting down.')
+    sys.exit(0)
+
+
+def main():
+    #
+    # imported here as importing magnum.magnum may wait for the system to settle after boot
+    #
+    from magnum.magnum import Magnum
+    from magnum.magparser import MagnumArgumentParser
+
+    signal.signal(signal.SIGINT, sigint_handler)
+    parser = MagnumArgumentParser(description="Magnum Network Reader", prog="magserver", fromfile_prefix_chars='@',
+                                  epilog="Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    parser.add_argument("--port", "-p", type=int, default=17223,
+                        help="Port on which the server listens (default: %(default)s)")
+    parser.add_argument("--device", "-d", nargs='+', default=f"{'/dev/ttyUSB0' if parser.isPosix else 'COM1'}",
+                        help="Serial device name (default: %(default)s). You can specify more than one.")
+    parser.add_argument("--interval", "-i", default=5, type=float,
+                        help="Seconds between reads of the devices (default: %(default)s)")
+    parser.add_argument("--verbose", '-v', action="store_true", default=False,
+                        help="Display options at runtime (default: %(default)s)")
+    seldom = parser.add_argument_group("Seldom used")
+    seldom.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    seldom.add_argument("--listen", "-l", default="ALL",
+                        help="IP address on which the server listens (default: %(default)s)")
+    seldom.add_argument("--packets", default=50, type=int,
+                        help="Number of packets to generate in reader (default: %(default)s)")
+    seldom.add_argument("--timeout", default=0.005, type=float,
+                        help="Timeout for serial read (default: %(default)s)")
+    seldom.add_argument("--trace", action="store_true", default=False,
+                        help="Add most recent raw packet(s) info to data (default: %(default)s)")
+    seldom.add_argument("--nocleanup", action="store_true", default=False, dest='cleanpackets',
+                        help="Suppress clean up of unknown packets (default: False)")
+    seldom.add_argument("--maxclients", default=100, type=int,
+                        help="Most clients of /events at one time (default: %(default)s)")
+    seldom.add_argument("--eventinterval", default=1.0, type=float,
+                        help="Least seconds between events sent to one client (default: %(default)s)")
+    args = parser.magnum_parse_args()
+    if args.interval <= 0:
+        parser.error("option --interval: Must be greater than 0.")
+    if args.listen.upper() == 'ALL':
+        args.listen = ''
+    if args.verbose:
+        print('Magnum Network Reader Version:{0}'.format(magnum.__version__))
+        print(f"Options:{str(args)[10:-1]}")
+    readers = []
+    for device in args.device:
+        try:
+            readers.append(Magnum(device=device, packets=args.packets, trace=args.trace,
+                                  timeout=args.timeout, cleanpackets=args.cleanpackets))
+        except Exception as e:
+            print("{0} {1}".format(device, str(e)))
+    if len(readers) == 0:
+        print("Error: There are no usable devices connected.")
+        exit(2)
+    poller = SnapshotPoller(readers, interval=args.interval)
+    poller.poll()  # test read to see if all's good
+    poller.start()
+    httpd = MagnumServer((args.listen, args.port), poller, maxclients=args.maxclients,
+                         eventinterval=args.eventinterval)
+    print(f"Starting Magnum Reader on {args.listen}:{args.port}")
+    try:
+        httpd.serve_forever()
+    finally:
+        poller.stop()
+        httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# A disk backed, append only, spool of magdump style documents.
+# It sits between getDevices() and a sink, such as SQLSink, so that samples are
+# not lost while the database or broker can't be reached.
+#
+# Every document is appended to the spool first, then written to the sink in batches.
+# A document is only removed from the spool after the sink has accepted it. If the program
+# stops between the two, the last batch is written again when it restarts.
+# Documents keep their original datetime so recovery after an outage is a back fill.
+#
+# The spool is a folder of numbered segment files, one compact JSON document per line.
+# Full segments are compressed with gzip. The replay position is kept in the file `position`.
+#
+import gzip
+import inspect
+import os
+import time
+
+from magnum.magjson import dumps, loads
+
+
+class Spool:
+    '''
+    A folder of segment files holding one JSON document per line
+
+    :param directory: Folder for the spool, created if needed
+    :type directory: str
+    :param maxbytes: Largest size of the spool on disk. The oldest segments are dropped to stay below it, defaults to 100 MB
+    :type maxbytes: int, optional
+    :param segmentbytes: Size at which a segment is compressed and a new one started, defaults to 1 MB
+    :type segmentbytes: int, optional
+    '''
+
+    def __init__(self, directory, maxbytes=100000000, segmentbytes=1000000):
+        self.directory = directory
+        self.maxbytes = maxbytes
+        self.segmentbytes = segmentbytes
+        os.makedirs(directory, exist_ok=True)
+        self.positionfile = os.path.join(directory, "position")
+        self.position = (0, 0)
+        if os.path.exists(self.positionfile):
+            with open(self.positionfile) as file:
+                segment, line = file.read().split()
+                self.position = (int(segment), int(line))
+        segments = self._segments()
+        if len(segments) > 0:
+            self.current = segments[-1][0] + 1
+        else:
+            self.current = self.position[0] + 1
+            self.position = (self.current, 0)
+        self.file = None
+        #
+        # the segment being replayed is kept open between reads, [segment number, file name, file, line]
+        #
+        self.cursor = None
+
+    def _segments(self):
+        '''
+        List of (segment number, file name), oldest first
+        '''
+        segments = []
+        for name in os.listdir(self.directory):
+            number = name.split(".")[0]
+            if number.isdigit():
+                segments.append((int(number), os.path.join(self.directory, name)))
+        segments.sort()
+        return segments
+
+    def put(self, alldata):
+        '''
+        Append a document to the spool
+        '''
+        if self.file == None:
+            self.file = open(os.path.join(self.directory, f"{self.current:08d}.ndjson"), "ab")
+        self.file.write(dumps(alldata) + b'\n')
+        self.file.flush()
+        if self.file.tell() >= self.segmentbytes:
+            self._seal()
+            self._trim()
+
+    def _seal(self):
+        self.file.close()
+        self.file = None
+        name = os.path.join(self.directory, f"{self.current:08d}.ndjson")
+        with open(name, "rb") as source, gzip.open(name + ".gz", "wb") as target:
+            target.write(source.read())
+        os.remove(name)
+        self.current += 1
+
+    def _trim(self):
+        segments = self._segments()
+        size = sum([os.path.getsize(name) for number, name in segments])
+        for number, name in segments:
+            if size <= self.maxbytes or number == self.current:
+                break
+            size -= os.path.getsize(name)
+            os.remove(name)
+            print(f"Spool is full, dropped {name}")
+            if self.position[0] <= number:
+                self._commit((number + 1, 0))
+
+    def read(self, count):
+        '''
+        Read up to count documents from the replay position without removing them
+
+        :return: The documents and the position after them, pass it to commit()
+        :rtype: tuple
+        '''
+        if self.file != None:
+            self.file.flush()
+        documents = []
+        position = self.position
+        for number, name in self._segments():
+            if number < position[0]:
+                continue
+            if number > position[0]:
+                position = (number, 0)
+            file = self._seek(number, name, position[1])
+            while len(documents) < count:
+                offset = file.tell()
+                line = file.readline()
+                if not line.endswith(b'\n'):
+                    file.seek(offset)  # partly written
+                    break
+                documents.append(loads(line))
+                position = (number, position[1] + 1)
+                self.cursor[3] = position[1]
+            if len(documents) >= count:
+                break
+        return documents, position
+
+    def _seek(self, number, name, line):
+        '''
+        The segment file open at a line. The open file is used again if the read carries on from where the last one
+        stopped, otherwise, such as after a failed replay or when the segment has been compressed, it is opened again.
+        '''
+        if self.cursor != None and self.cursor[:2] == [number, name] and self.cursor[3] == line:
+            return self.cursor[2]
+        self._closeCursor()
+        opener = gzip.open if name.endswith(".gz") else open
+        file = opener(name, "rb")
+        for index in range(line):
+            file.readline()
+        self.cursor = [number, name, file, line]
+        return file
+
+    def _closeCursor(self):
+        if self.cursor != None:
+            self.cursor[2].close()
+            self.cursor = None
+
+    def commit(self, position):
+        '''
+        Remove everything before position from the spool
+        '''
+        self._commit(position)
+        for number, name in self._segments():
+            if number < position[0] and number != self.current:
+                os.remove(name)
+
+    def _commit(self, position):
+        self.position = position
+        temporary = self.positionfile + ".tmp"
+        with open(temporary, "w") as file:
+            file.write(f"{position[0]} {position[1]}")
+        os.replace(temporary, self.positionfile)
+
+    def close(self):
+        self._closeCursor()
+        if self.file != None:
+            self.file.close()
+            self.file = None
+
+
+class SpooledSink:
+    '''
+    Write documents to a sink through a Spool.
+    If the sink fails, documents stay in the spool and are replayed in batches, with increasing delays
+    between attempts, once the sink is back.
+
+    :param sink: Any object with write(alldata, flush), flush(), discard() and close() methods, such as SQLSink
+    :param spool: The spool, or the name of a folder for one
+    :type spool: Spool or str
+    :param batch: Documents written to the sink before it is flushed, defaults to 1
+    :type batch: int, optional
+    :param backoff: Seconds to wait after the first failure, doubled after each failure, defaults to 5
+    :type backoff: float, optional
+    :param maxbackoff: Longest wait between attempts, defaults to 300
+    :type maxbackoff: float, optional
+    '''
+
+    def __init__(self, sink, spool, batch=1, backoff=5.0, maxbackoff=300.0):
+        if type(spool) == str:
+            spool = Spool(spool)
+        if "flush" not in inspect.signature(sink.write).parameters:
+            raise ValueError(f"{type(sink).__name__} can't hold documents until they are flushed so it can't be spooled")
+        self.sink = sink
+        self.spool = spool
+        self.batch = batch
+        self.backoff = backoff
+        self.maxbackoff = maxbackoff
+        self.delay = 0.0
+        self.retry = 0.0
+        self.waiting = 0
+
+    def write(self, alldata):
+        '''
+        Spool a document and write waiting documents to the sink if enough are ready
+        '''
+        self.spool.put(alldata)
+        self.waiting += 1
+        if self.waiting >= self.batch:
+            self.flush()
+
+    def flush(self):
+        '''
+        Write all spooled documents to the sink, in batches, unless waiting after a failure
+
+        :return: True if the spool is empty
+        :rtype: boolean
+        '''
+        if time.monotonic() < self.retry:
+            return False
+        try:
+            while True:
+                documents, position = self.spool.read(max(self.batch, 100))
+                if len(documents) == 0:
+                    break
+                #
+                # the sink holds the batch until it is flushed so nothing is written that isn't committed in the spool
+                #
+                self.sink.write(documents, flush=False)
+                self.sink.flush()
+                self.spool.commit(position)
+        except Exception as e:
+            #
+            # the sink must not keep rows that are still in the spool
+            #
+            if hasattr(self.sink, "discard"):
+                self.sink.discard()
+            self.delay = min(max(self.delay * 2, self.backoff), self.maxbackoff)
+            self.retry = time.monotonic() + self.delay
+            print(f"Sink failed, retry in {self.delay:.0f} seconds: {e}")
+            return False
+        if self.delay != 0.0:
+            print("Sink recovered, spool replayed.")
+        self.delay = 0.0
+        self.waiting = 0
+        return True
+
+    def close(self):
+        '''
+        Make a last attempt to empty the spool, then close the sink and spool
+        '''
+        self.retry = 0.0
+        self.flush()
+        try:
+            self.sink.close()
+        finally:
+            self.spool.close()
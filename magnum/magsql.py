@@ -0,0 +1,350 @@
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# Loads samples into SQL tables through any DB-API connection.
+# One connection is kept open, rows are buffered and written with executemany
+# in one transaction per batch.
+#
+# Tested with sqlite3 and the mariadb connector. Tables must already exist; mag2sql will draft them.
+# Only columns that match between the data and the table are loaded.
+#
+#  magsql --sqlite magnum.db --interval 60
+#  magsql --db_username me --db_password secret --db_database magnum --interval 60
+#
+import signal
+import sys
+import time
+
+from datetime import datetime, timezone
+
+import magnum
+from magnum.magschema import FlatSchema
+
+#
+# Table name used for --allinone rows
+#
+ALLINONE_TABLE = "log_data"
+
+#
+# column types by dialect for float, int, bool and everything else
+#
+SQL_TYPES = {
+    "mysql": ("float", "integer", "integer(1)", "varchar(25)"),
+    "sqlite": ("REAL", "INTEGER", "INTEGER", "TEXT"),
+    "postgresql": ("double precision", "integer", "boolean", "varchar(25)")
+}
+
+
+def sqltype(value, dialect="mysql"):
+    '''
+    The column type used to store a value
+
+    :param value: A value from a device data dictionary
+    :param dialect: mysql, sqlite or postgresql, defaults to mysql
+    :type dialect: str, optional
+    :rtype: str
+    '''
+    types = SQL_TYPES[dialect]
+    if type(value) == float:
+        return types[0]
+    elif type(value) == int:
+        return types[1]
+    elif type(value) == bool:
+        return types[2]
+    return types[3]
+
+
+class SQLSink:
+    '''
+    Buffered, parameterized loading of magdump style documents into SQL tables.
+    Each device is loaded to a table of the same name, or every sample to one log_data table if allinone is set.
+
+    :param connect: A function with no arguments that returns a DB-API connection. It is called again after a failure
+    :type connect: callable
+    :param dialect: sqlite or mysql, used to discover table columns, defaults to sqlite
+    :type dialect: str, optional
+    :param paramstyle: qmark (?) or format (%s) placeholders, defaults to qmark
+    :type paramstyle: str, optional
+    :param database: Schema name for mysql, defaults to None
+    :type database: str, optional
+    :param allinone: Load each sample as a single flat row, defaults to False
+    :type allinone: boolean, optional
+    :param batchrows: Rows to buffer before writing, defaults to 100
+    :type batchrows: int, optional
+    :param batchseconds: Seconds before buffered rows are written regardless, defaults to 60
+    :type batchseconds: float, optional
+    '''
+
+    def __init__(self, connect, dialect="sqlite", paramstyle="qmark", database=None, allinone=False,
+                 batchrows=100, batchseconds=60):
+        if paramstyle not in ("qmark", "format"):
+            raise ValueError(f"Unsupported paramstyle {paramstyle}")
+        self.connect = connect
+        self.dialect = dialect.lower()
+        self.placeholder = "?" if paramstyle == "qmark" else "%s"
+        self.database = database
+        self.allinone = allinone
+        self.batchrows = batchrows
+        self.batchseconds = batchseconds
+        self.connection = None
+        self.db_columns = {}
+        self.statements = {}
+        self.pending = {}
+        self.pendingrows = 0
+        self.flushed = time.monotonic()
+        self.schema = FlatSchema()
+
+    def _connection(self):
+        if self.connection == None:
+            self.connection = self.connect()
+        return self.connection
+
+    def _columns(self, table):
+        '''
+        The column names of a table or None if the table doesn't exist
+        '''
+        if table in self.db_columns:
+            return self.db_columns[table]
+        cursor = self._connection().cursor()
+        try:
+            if self.dialect == "sqlite":
+                cursor.execute(f"PRAGMA table_info({table})")
+                columns = [row[1] for row in cursor.fetchall()]
+            else:
+                cursor.execute("SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_SCHEMA = "
+                               f"{self.placeholder} AND TABLE_NAME = {self.placeholder}", (self.database, table))
+                columns = [row[0] for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+        if len(columns) == 0:
+            print(f"Unable to find table {table}: logging of this data will be ignored.")
+            columns = None
+        self.db_columns[table] = columns
+        return columns
+
+    def _statement(self, table, fields):
+        key = (table, fields)
+        statement = self.statements.get(key)
+        if statement == None:
+            columns = ', '.join(fields)
+            values = ', '.join([self.placeholder] * len(fields))
+            statement = f"INSERT INTO {table} ({columns}) VALUES ({values})"
+            self.statements[key] = statement
+        return statement
+
+    def write(self, alldata, flush=True):
+        '''
+        Buffer a magdump style document, or list of documents
+
+        :param alldata: A dictionary with datetime, comm_device and data items
+        :type alldata: dict
+        :param flush: Write the buffered rows when batchrows or batchseconds is reached, False holds them until flush(), defaults to True
+        :type flush: boolean, optional
+        '''
+        if type(alldata) != list:
+            alldata = [alldata]
+        for item in alldata:
+            timestamp = self._timestamp(item)
+            if self.allinone:
+                if item['data'][0]['device'] == ALLINONE_TABLE:
+                    tables = [(ALLINONE_TABLE, item['data'][0]['data'])]
+                else:
+                    tables = [(ALLINONE_TABLE, self.schema.rowdata(item['data']))]
+            else:
+                tables = [(device['device'], device['data']) for device in item['data']]
+            for table, rowdata in tables:
+                self._add(table, timestamp, item['comm_device'], rowdata)
+        if flush and (self.pendingrows >= self.batchrows or time.monotonic() - self.flushed >= self.batchseconds):
+            self.flush()
+
+    def _timestamp(self, item):
+        return datetime.fromisoformat(item['datetime']).strftime('%Y-%m-%d %H:%M:%S')
+
+    def _add(self, table, timestamp, comm_device, rowdata):
+        columns = self._columns(table)
+        if columns == None:
+            return
+        fields = []
+        values = []
+        if 'timestamp' in columns:
+            fields.append('timestamp')
+            values.append(timestamp)
+        elif 'datetime' in columns:
+            fields.append('datetime')
+            values.append(timestamp)
+        if 'comm_device' in columns:
+            fields.append('comm_device')
+            values.append(comm_device)
+        for field in columns:
+            if field in rowdata and field not in ('timestamp', 'datetime', 'comm_device'):
+                value = rowdata[field]
+                if value == None or type(value) in (list, dict):
+                    continue
+                if type(value) == bool:
+                    value = int(value)
+                fields.append(field)
+                values.append(value)
+        self._pend(self._statement(table, tuple(fields)), tuple(values))
+
+    def _pend(self, statement, values):
+        self.pending.setdefault(statement, []).append(values)
+        self.pendingrows += 1
+
+    def flush(self):
+        '''
+        Write all buffered rows in one transaction.
+        If the write fails the rows are kept, the connection is dropped and the exception is raised.
+        '''
+        self.flushed = time.monotonic()
+        if self.pendingrows == 0:
+            return
+        connection = self._connection()
+        try:
+            cursor = connection.cursor()
+            for statement, rows in self.pending.items():
+                cursor.executemany(statement, rows)
+            connection.commit()
+            cursor.close()
+        except Exception:
+            try:
+                connection.rollback()
+                connection.close()
+            except Exception:
+                pass
+            self.connection = None
+            raise
+        self.pending = {}
+        self.pendingrows = 0
+
+    def discard(self):
+        '''
+        Drop all buffered rows
+        '''
+        self.pending = {}
+        self.pendingrows = 0
+
+    def close(self):
+        '''
+        Write all buffered rows and close the connection
+        '''
+        try:
+            self.flush()
+        finally:
+            if self.connection != None:
+                self.connection.close()
+                self.connection = None
+
+
+def sigint_handler(signal, frame):
+    print('Interrupted. Shutting down.')
+    sys.exit(0)
+
+
+def main():
+    #
+    # imported here as importing magnum.magnum may wait for the system to settle after boot
+    #
+    from magnum.magnum import Magnum
+    from magnum.magparser import MagnumArgumentParser
+
+    signal.signal(signal.SIGINT, sigint_handler)
+    parser = MagnumArgumentParser(description="Magnum SQL Load", prog="magsql", fromfile_prefix_chars='@',
+                                  epilog="Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    parser.add_argument("--device", "-d", default=f"{'/dev/ttyUSB0' if parser.isPosix else 'COM1'}",
+                        help="Serial device name (default: %(default)s). You can specify ONLY one.")
+    parser.add_argument("--interval", "-i", default=60, type=int, dest='interval',
+                        help="Interval, in seconds, between samples. 0 means once and exit. (default: %(default)s)")
+    parser.add_argument("--verbose", '-v', action="store_true", default=False,
+                        help="Display options at runtime (default: %(default)s)")
+    parser.add_argument("--sqlite", default=None,
+                        help="SQLite database file. If not set MySQL/MariaDB is used (default: %(default)s)")
+    parser.add_argument("--store", default=None,
+                        help="SQLite time series store file. Tables, with 1 minute and 1 hour rollups, are created as needed (default: %(default)s)")
+    parser.add_argument("--db_username", default=None,
+                        help="MySQL User name(default: %(default)s)")
+    parser.add_argument("--db_password", default=None,
+                        help="MySQL User password(default: %(default)s)")
+    parser.add_argument("--db_database", default='magnum',
+                        help="MySQL database name(default: %(default)s)")
+    parser.add_argument("--db_host", default='localhost',
+                        help="MySQL Server host name(default: %(default)s)")
+    seldom = parser.add_argument_group("Seldom used")
+    seldom.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    seldom.add_argument("--packets", default=50, type=int,
+                        help="Number of packets to generate in reader (default: %(default)s)")
+    seldom.add_argument("--timeout", default=0.005, type=float,
+                        help="Timeout for serial read (default: %(default)s)")
+    seldom.add_argument("--nocleanup", action="store_true", default=False, dest='cleanpackets',
+                        help="Suppress clean up of unknown packets (default: False)")
+    seldom.add_argument("--db_port", default=3306, type=int,
+                        help="MySQL port(default: %(default)s)")
+    seldom.add_argument("--allinone", action="store_true", default=False,
+                        help="Process data as a flat single row (default: %(default)s)")
+    seldom.add_argument("--batch", default=1, type=int,
+                        help="Samples to buffer before writing to the database (default: %(default)s)")
+    seldom.add_argument("--spool", default=None,
+                        help="Folder to hold samples while the database can't be reached (default: %(default)s)")
+    args = parser.magnum_parse_args()
+    if len(args.device) > 1:
+        parser.error("magsql only supports 1 device at a time.")
+    if args.sqlite == None and args.store == None and (args.db_username == None or args.db_password == None):
+        parser.error("--db_username and --db_password are required unless --sqlite or --store is used.")
+    if args.verbose:
+        savepw = args.db_password
+        args.db_password = "******"
+        print('Magnum SQL Load Version:{0}'.format(magnum.__version__))
+        print(f"Options:{str(args)[10:-1]}")
+        args.db_password = savepw
+    if args.store != None:
+        from magnum.magstore import SQLiteStore
+        sink = SQLiteStore(args.store, batchrows=args.batch)
+    elif args.sqlite != None:
+        import sqlite3
+
+        def connect():
+            return sqlite3.connect(args.sqlite)
+        sink = SQLSink(connect, dialect="sqlite", allinone=args.allinone, batchrows=args.batch)
+    else:
+        import mariadb
+
+        def connect():
+            return mariadb.connect(user=args.db_username, password=args.db_password, host=args.db_host,
+                                   port=args.db_port, database=args.db_database)
+        sink = SQLSink(connect, dialect="mysql", database=args.db_database, allinone=args.allinone,
+                       batchrows=args.batch)
+    if args.spool != None:
+        from magnum.magspool import SpooledSink
+        sink = SpooledSink(sink, args.spool, batch=args.batch)
+    try:
+        magnumReader = Magnum(device=args.device[0], packets=args.packets,
+                              timeout=args.timeout, cleanpackets=args.cleanpackets)
+    except Exception as e:
+        print("{0} {1}".format(args.device, str(e)))
+        exit(2)
+    if args.interval != 0 and args.verbose == True:
+        print(f"Logging every:{args.interval} seconds.")
+    try:
+        while True:
+            start = time.time()
+            timestamp = datetime.now(timezone.utc).replace(microsecond=0).astimezone().isoformat()
+            try:
+                devices = magnumReader.getDevices()
+                if len(devices) != 0:
+                    sink.write({"datetime": timestamp, "device": "MAGNUM",
+                                "comm_device": magnumReader.getComm_Device(), "data": devices})
+            except Exception as e:
+                print(str(e))
+            if args.interval == 0:
+                break
+            sleep = args.interval - (time.time() - start)
+            if sleep > 0:
+                time.sleep(sleep)
+    finally:
+        sink.close()
+
+
+if __name__ == '__main__':
+    main()
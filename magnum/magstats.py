@@ -0,0 +1,142 @@
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# Counters kept by a Magnum reader about its own work.
+# They are cheap to update and are read with copy(), which is safe to call from another thread.
+#
+
+#
+# upper bounds, in seconds, of the histograms
+#
+CAPTURE_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+PARSE_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05)
+PORT_BUCKETS = (0.001, 0.01, 0.1, 0.25, 0.5, 1.0)
+
+
+class Histogram:
+    '''
+    Counts of observed values by upper bound, in the same form as a Prometheus histogram
+
+    :param buckets: Upper bounds in increasing order, a last bucket of infinity is added
+    :type buckets: tuple
+    '''
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def copy(self):
+        histogram = Histogram(())
+        histogram.buckets = self.buckets
+        histogram.counts = list(self.counts)
+        histogram.count = self.count
+        histogram.sum = self.sum
+        return histogram
+
+    def subtract(self, other):
+        '''
+        The values observed since other was copied from this histogram
+        '''
+        histogram = self.copy()
+        histogram.counts = [count - before for count, before in zip(self.counts, other.counts)]
+        histogram.count -= other.count
+        histogram.sum -= other.sum
+        return histogram
+
+    def cumulative(self):
+        '''
+        List of (upper bound, count of values at or below it)
+        '''
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def asdict(self):
+        return {"count": self.count, "sum": self.sum,
+                "buckets": {("+Inf" if bound == float("inf") else bound): count for bound, count in self.cumulative()}}
+
+
+class ReaderStats:
+    '''
+    Totals since the reader was created
+
+    - **packets** Packets read
+    - **bytes** Bytes read
+    - **types** Dictionary of packet type to the number parsed, after clean up
+    - **unknown** Packets that could not be identified, before clean up
+    - **merges** Pairs of UNKNOWN packets joined by clean up
+    - **failures** Packets of a known type that could not be unpacked
+    - **captures** Histogram of the seconds taken by each read of packets, packets from streamPackets() are not in it
+    - **parses** Histogram of the seconds taken to parse each read of packets
+    - **updates** Histogram of the seconds taken to update the devices from each read of packets
+    - **opens** Histogram of the seconds taken to open the serial port
+    - **probes** Histogram of the seconds taken to probe the serial port for traffic
+    '''
+
+    def __init__(self):
+        self.packets = 0
+        self.bytes = 0
+        self.types = {}
+        self.unknown = 0
+        self.merges = 0
+        self.failures = 0
+        self.captures = Histogram(CAPTURE_BUCKETS)
+        self.parses = Histogram(PARSE_BUCKETS)
+        self.updates = Histogram(PARSE_BUCKETS)
+        self.opens = Histogram(PORT_BUCKETS)
+        self.probes = Histogram(PORT_BUCKETS)
+
+    def copy(self):
+        stats = ReaderStats()
+        stats.packets = self.packets
+        stats.bytes = self.bytes
+        stats.types = dict(self.types)
+        stats.unknown = self.unknown
+        stats.merges = self.merges
+        stats.failures = self.failures
+        stats.captures = self.captures.copy()
+        stats.parses = self.parses.copy()
+        stats.updates = self.updates.copy()
+        stats.opens = self.opens.copy()
+        stats.probes = self.probes.copy()
+        return stats
+
+    def subtract(self, other):
+        '''
+        The counts since other was copied from these totals
+        '''
+        stats = ReaderStats()
+        stats.packets = self.packets - other.packets
+        stats.bytes = self.bytes - other.bytes
+        stats.types = {packetType: count - other.types.get(packetType, 0) for packetType, count in self.types.items()
+                       if count != other.types.get(packetType, 0)}
+        stats.unknown = self.unknown - other.unknown
+        stats.merges = self.merges - other.merges
+        stats.failures = self.failures - other.failures
+        stats.captures = self.captures.subtract(other.captures)
+        stats.parses = self.parses.subtract(other.parses)
+        stats.updates = self.updates.subtract(other.updates)
+        stats.opens = self.opens.subtract(other.opens)
+        stats.probes = self.probes.subtract(other.probes)
+        return stats
+
+    def asdict(self):
+        return {"packets": self.packets, "bytes": self.bytes, "types": dict(self.types), "unknown": self.unknown,
+                "merges": self.merges, "failures": self.failures, "captures": self.captures.asdict(),
+                "parses": self.parses.asdict(), "updates": self.updates.asdict(), "opens": self.opens.asdict(),
+                "probes": self.probes.asdict()}
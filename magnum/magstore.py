@@ -0,0 +1,206 @@
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# A local SQLite time series store. No database server is needed.
+#
+# Each device has a table of raw samples, named after the device, with
+#   timestamp   Unix epoch seconds (indexed)
+#   comm_device
+#   one column per field, typed the same way as mag2sql
+#
+# and rollup tables, such as INVERTER_1m and INVERTER_1h, updated as samples arrive with
+#   bucket      Unix epoch seconds of the start of the period
+#   comm_device
+#   samples     number of samples in the period
+#   <field>_min, <field>_max, <field>_sum, <field>_count and <field>_last for every numeric field
+#
+# The mean of a field for a period is <field>_sum / <field>_count, as a field may be missing from some samples
+# Tables and columns are created, or added, as devices and fields appear.
+#
+import sqlite3
+import time
+
+from datetime import datetime
+
+from magnum.magsql import SQLSink, sqltype
+
+#
+# rollup periods in seconds and the table suffix for each
+#
+ROLLUPS = {60: "1m", 3600: "1h"}
+
+
+class SQLiteStore(SQLSink):
+    '''
+    Record samples to a SQLite database in WAL mode with incrementally updated rollup tables.
+
+    :param path: The database file name
+    :type path: str
+    :param rollups: Dictionary of period in seconds to table suffix, defaults to ROLLUPS, 1 minute and 1 hour
+    :type rollups: dict, optional
+    :param batchrows: Rows to buffer before writing, defaults to 100
+    :type batchrows: int, optional
+    :param batchseconds: Seconds before buffered rows are written regardless, defaults to 60
+    :type batchseconds: float, optional
+    '''
+
+    def __init__(self, path, rollups=ROLLUPS, batchrows=100, batchseconds=60):
+        self.path = path
+        self.rollups = rollups
+        self.rollup_fields = {}
+        super().__init__(self._connect, dialect="sqlite", batchrows=batchrows, batchseconds=batchseconds)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _timestamp(self, item):
+        return datetime.fromisoformat(item['datetime']).timestamp()
+
+    def write(self, alldata, flush=True):
+        '''
+        Buffer a magdump style document, or list of documents
+
+        :param alldata: A dictionary with datetime, comm_device and data items
+        :type alldata: dict
+        :param flush: Write the buffered rows when batchrows or batchseconds is reached, False holds them until flush(), defaults to True
+        :type flush: boolean, optional
+        '''
+        if type(alldata) != list:
+            alldata = [alldata]
+        for item in alldata:
+            timestamp = self._timestamp(item)
+            comm_device = item['comm_device']
+            for device in item['data']:
+                table = device['device']
+                rowdata = {}
+                for field, value in device['data'].items():
+                    if value != None and type(value) not in (list, dict):
+                        rowdata[field] = value
+                self._prepare(table, rowdata)
+                fields = tuple(rowdata)
+                self._pend(self._statement(table, ('timestamp', 'comm_device') + fields),
+                           (timestamp, comm_device) + tuple(rowdata.values()))
+                numeric = tuple([field for field, value in rowdata.items() if type(value) in (int, float, bool)])
+                values = []
+                for field in numeric:
+                    value = rowdata[field]
+                    values.extend((value, value, value, 1, value))
+                for period, suffix in self.rollups.items():
+                    bucket = int(timestamp // period * period)
+                    self._pend(self._rollup(f"{table}_{suffix}", numeric), (bucket, comm_device) + tuple(values))
+        if flush and (self.pendingrows >= self.batchrows or time.monotonic() - self.flushed >= self.batchseconds):
+            self.flush()
+
+    def deleteRange(self, start, end, comm_device):
+        '''
+        Remove the samples of a comm_device in a time span, and their part of the rollups.
+        Rollup periods that are partly outside the span are rebuilt from the samples that are left in them.
+
+        :param start: Unix epoch seconds of the first sample to remove
+        :type start: float
+        :param end: Unix epoch seconds after the last sample to remove
+        :type end: float
+        :param comm_device: The comm_device of the samples
+        :type comm_device: str
+        :return: Number of samples removed
+        :rtype: int
+        '''
+        self.flush()
+        connection = self._connection()
+        tables = [row[0] for row in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        removed = 0
+        try:
+            for table in tables:
+                if any(f"{table}_{suffix}" not in tables for suffix in self.rollups.values()):
+                    continue
+                removed += connection.execute(f"DELETE FROM {table} WHERE comm_device = ? AND timestamp >= ? "
+                                              "AND timestamp < ?", (comm_device, start, end)).rowcount
+                for period, suffix in self.rollups.items():
+                    first = int(start // period * period)
+                    last = int(-(-end // period) * period)
+                    connection.execute(f"DELETE FROM {table}_{suffix} WHERE comm_device = ? AND bucket >= ? AND bucket < ?",
+                                       (comm_device, first, end))
+                    cursor = connection.execute(f"SELECT * FROM {table} WHERE comm_device = ? AND timestamp >= ? "
+                                                "AND timestamp < ? ORDER BY timestamp", (comm_device, first, last))
+                    names = [column[0] for column in cursor.description]
+                    for row in cursor.fetchall():
+                        rowdata = dict(zip(names, row))
+                        numeric = tuple([field for field, value in rowdata.items()
+                                         if field not in ('timestamp', 'comm_device') and type(value) in (int, float)])
+                        values = []
+                        for field in numeric:
+                            value = rowdata[field]
+                            values.extend((value, value, value, 1, value))
+                        bucket = int(rowdata['timestamp'] // period * period)
+                        connection.execute(self._rollup(f"{table}_{suffix}", numeric),
+                                           (bucket, comm_device) + tuple(values))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        return removed
+
+    def _rollup(self, table, fields):
+        key = (table, fields)
+        statement = self.statements.get(key)
+        if statement == None:
+            columns = ['bucket', 'comm_device', 'samples']
+            values = ['?', '?', '1']
+            updates = ['samples = samples + 1']
+            for field in fields:
+                columns.extend([f"{field}_min", f"{field}_max", f"{field}_sum", f"{field}_count", f"{field}_last"])
+                values.extend(['?', '?', '?', '?', '?'])
+                updates.extend([f"{field}_min = min(coalesce({field}_min, excluded.{field}_min), excluded.{field}_min)",
+                                f"{field}_max = max(coalesce({field}_max, excluded.{field}_max), excluded.{field}_max)",
+                                f"{field}_sum = coalesce({field}_sum, 0) + excluded.{field}_sum",
+                                f"{field}_count = coalesce({field}_count, 0) + excluded.{field}_count",
+                                f"{field}_last = excluded.{field}_last"])
+            statement = (f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(values)}) "
+                         f"ON CONFLICT(comm_device, bucket) DO UPDATE SET {', '.join(updates)}")
+            self.statements[key] = statement
+        return statement
+
+    def _prepare(self, table, rowdata):
+        '''
+        Create the raw and rollup tables for a device, or add columns for new fields.
+        Rollup columns are added for every field that has a numeric value, even if its raw column is TEXT.
+        '''
+        columns = self.db_columns.get(table)
+        rolled = self.rollup_fields.get(table)
+        if (columns != None and all(field in columns for field in rowdata)
+                and all(field in rolled for field, value in rowdata.items() if type(value) in (int, float, bool))):
+            return
+        #
+        # buffered rows name their columns so they are still good after columns are added. They are not
+        # flushed here as SpooledSink relies on rows only being written by flush()
+        #
+        connection = self._connection()
+        if columns == None:
+            connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (timestamp REAL NOT NULL, comm_device TEXT)")
+            connection.execute(f"CREATE INDEX IF NOT EXISTS {table}_timestamp ON {table} (timestamp)")
+            for suffix in self.rollups.values():
+                connection.execute(f"CREATE TABLE IF NOT EXISTS {table}_{suffix} (bucket INTEGER NOT NULL, "
+                                   "comm_device TEXT NOT NULL, samples INTEGER, PRIMARY KEY (comm_device, bucket))")
+            columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+            rolled = set()
+        for field, value in rowdata.items():
+            if field not in columns:
+                connection.execute(f"ALTER TABLE {table} ADD COLUMN {field} {sqltype(value, 'sqlite')}")
+                columns.append(field)
+            if type(value) in (int, float, bool) and field not in rolled:
+                for suffix in self.rollups.values():
+                    rollup = f"{table}_{suffix}"
+                    existing = [row[1] for row in connection.execute(f"PRAGMA table_info({rollup})")]
+                    for column, columntype in ((f"{field}_min", "REAL"), (f"{field}_max", "REAL"), (f"{field}_sum", "REAL"),
+                                               (f"{field}_count", "INTEGER"), (f"{field}_last", "REAL")):
+                        if column not in existing:
+                            connection.execute(f"ALTER TABLE {rollup} ADD COLUMN {column} {columntype}")
+                rolled.add(field)
+        connection.commit()
+        self.db_columns[table] = columns
+        self.rollup_fields[table] = rolled
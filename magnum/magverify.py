@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# Checks that a candidate decoder gives exactly the same results as the reference, Magnum, and compares their speed.
+# run the program with --help for details of options.
+#
+#  magverify --capture testdata/allpackets.txt
+#  magverify --frames 1000000 --split 0.1 --merge 0.01 --errors 0.001
+#  magverify --capture big.txt --candidate mypackage.mymodule:MyDecoder
+#
+# A decoder is a class that takes the same parameters as Magnum, usually a subclass of it that replaces
+# _parsePacket(), cleanup() or the devices. The default candidate is magnum.magdecode:TableDecoder.
+#
+# The capture is replayed through both, one sample of packets at a time. For every sample the messages from
+# _parsePackets() are compared, type, bytes and unpacked fields, then every field of every device from
+# _updateDevices(). Each mismatch is reported with the raw packet in hex.
+# If there are any mismatches the program exits with status 1.
+#
+import importlib
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from time import perf_counter
+
+import magnum
+
+
+def loadDecoder(name):
+    '''
+    Import a decoder class
+
+    :param name: module:class, for example magnum.magdecode:TableDecoder
+    :type name: str
+    '''
+    module, separator, classname = name.partition(":")
+    if separator == "" or classname == "":
+        raise ValueError(f"Decoder must be module:class, not {name}")
+    return getattr(importlib.import_module(module), classname)
+
+
+def _mismatch(sample, kind, raw, reference, candidate, detail=""):
+    return {"sample": sample, "kind": kind, "detail": detail, "hex": raw,
+            "reference": repr(reference), "candidate": repr(candidate)}
+
+
+def compareMessages(sample, reference, candidate):
+    '''
+    Compare the messages from _parsePackets() of one sample
+
+    :return: List of mismatches
+    :rtype: list
+    '''
+    mismatches = []
+    if len(reference) != len(candidate):
+        mismatches.append(_mismatch(sample, "count", "", len(reference), len(candidate)))
+    for index, (expected, actual) in enumerate(zip(reference, candidate)):
+        raw = bytes(expected[1]).hex().upper()
+        if expected[0] != actual[0]:
+            mismatches.append(_mismatch(sample, "type", raw, expected[0], actual[0], f"message {index}"))
+        elif bytes(expected[1]) != bytes(actual[1]):
+            mismatches.append(_mismatch(sample, "bytes", raw, raw, bytes(actual[1]).hex().upper(), f"message {index}"))
+        elif tuple(expected[2]) != tuple(actual[2]):
+            mismatches.append(_mismatch(sample, "fields", raw, expected[2], actual[2],
+                                        f"message {index} {expected[0]}"))
+    return mismatches
+
+
+def compareDevices(sample, reference, candidate, messages):
+    '''
+    Compare every field of the devices from _updateDevices() of one sample
+
+    :param messages: The reference messages of the sample, for the hex of the packets
+    :return: List of mismatches
+    :rtype: list
+    '''
+    mismatches = []
+    expected = {device["device"]: device for device in reference}
+    actual = {device["device"]: device for device in candidate}
+    raw = " ".join([bytes(message[1]).hex().upper() for message in messages])
+    for name in expected.keys() | actual.keys():
+        if name not in actual or name not in expected:
+            mismatches.append(_mismatch(sample, "device", raw, name in expected, name in actual, name))
+            continue
+        expecteddata = expected[name]["data"]
+        actualdata = actual[name]["data"]
+        for field in sorted(expecteddata.keys() | actualdata.keys()):
+            if field not in expecteddata or field not in actualdata or expecteddata[field] != actualdata[field]:
+                mismatches.append(_mismatch(sample, "field", raw, expecteddata.get(field, "<missing>"),
+                                            actualdata.get(field, "<missing>"), f"{name}.{field}"))
+    return mismatches
+
+
+def verify(capture, candidate, reference=None, packets=50, limit=100):
+    '''
+    Replay a capture through the reference and candidate decoders
+
+    :param capture: Capture file in the format read by Magnum(device="!filename")
+    :type capture: str
+    :param candidate: The decoder class to check
+    :param reference: The decoder class to check against, defaults to Magnum
+    :param packets: Packets per sample, defaults to 50
+    :type packets: int, optional
+    :param limit: Most mismatches kept, they are all counted, defaults to 100
+    :type limit: int, optional
+    :return: Dictionary of frames, samples, mismatches (the count), details (list of mismatches) and
+        the seconds taken by each decoder to parse and to update the devices
+    :rtype: dict
+    '''
+    from magnum.inverterdevice import InverterDevice
+    if reference == None:
+        from magnum.magnum import Magnum
+        reference = Magnum
+    device = "!" + capture
+    expected = reference(device=device, packets=packets)
+    actual = candidate(device=device, packets=packets)
+    frames = expected.stored_packets
+    result = {"frames": len(frames), "samples": 0, "mismatches": 0, "details": [],
+              "reference": {"parse": 0.0, "update": 0.0}, "candidate": {"parse": 0.0, "update": 0.0}}
+    timing = (result["reference"], result["candidate"])
+    #
+    # the voltage multiplier is shared by every reader in a process, keep one for each decoder
+    #
+    multipliers = [InverterDevice.multiplier, InverterDevice.multiplier]
+    for start in range(0, len(frames), packets):
+        sample = frames[start:start + packets]
+        messages = []
+        devices = []
+        for index, (decoder, seconds) in enumerate(zip((expected, actual), timing)):
+            InverterDevice.multiplier = multipliers[index]
+            begin = perf_counter()
+            parsed = decoder._parsePackets(list(sample))
+            middle = perf_counter()
+            devices.append(decoder._updateDevices(parsed))
+            seconds["parse"] += middle - begin
+            seconds["update"] += perf_counter() - middle
+            multipliers[index] = InverterDevice.multiplier
+            messages.append(parsed)
+        mismatches = compareMessages(result["samples"], *messages)
+        mismatches += compareDevices(result["samples"], devices[0], devices[1], messages[0])
+        result["mismatches"] += len(mismatches)
+        result["details"] += mismatches[:max(0, limit - len(result["details"]))]
+        result["samples"] += 1
+    for seconds in timing:
+        total = seconds["parse"] + seconds["update"]
+        seconds["rate"] = result["frames"] / total if total > 0 else float("inf")
+    return result
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Magnum Decoder Verification", prog="magverify",
+                                     epilog="Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    parser.add_argument("--capture", "-c", default=None,
+                        help="Capture file to replay, None implies synthetic traffic from maggen (default: %(default)s)")
+    parser.add_argument("--candidate", default="magnum.magdecode:TableDecoder",
+                        help="Decoder to check, as module:class (default: %(default)s)")
+    parser.add_argument("--reference", default="magnum.magnum:Magnum",
+                        help="Decoder to check against, as module:class (default: %(default)s)")
+    parser.add_argument("--packets", default=50, type=int,
+                        help="Packets per sample (default: %(default)s)")
+    parser.add_argument("--limit", default=20, type=int,
+                        help="Most mismatches to show (default: %(default)s)")
+    parser.add_argument("--output", "-o", default=None,
+                        help="Write the results as JSON to this file, - for stdout (default: %(default)s)")
+    synthetic = parser.add_argument_group("Synthetic traffic")
+    synthetic.add_argument("--frames", "-f", default=100000, type=int,
+                        help="Packets to generate (default: %(default)s)")
+    synthetic.add_argument("--seed", default=1, type=int,
+                        help="Random number seed (default: %(default)s)")
+    synthetic.add_argument("--split", default=0.05, type=float,
+                        help="Chance, 0 to 1, of a packet being split in two (default: %(default)s)")
+    synthetic.add_argument("--merge", default=0.01, type=float,
+                        help="Chance, 0 to 1, of a packet running into the next (default: %(default)s)")
+    synthetic.add_argument("--errors", default=0.001, type=float,
+                        help="Chance, 0 to 1, of a bit being flipped in a packet (default: %(default)s)")
+    parser.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    args = parser.parse_args()
+    #
+    # no serial port is used so don't wait for the system to settle
+    #
+    os.environ.setdefault("MAGNUM_DELAY", "0")
+    #
+    # damaged packets are logged by both decoders, the mismatches are what matter
+    #
+    logging.getLogger("magnum").setLevel(logging.ERROR)
+    candidate = loadDecoder(args.candidate)
+    reference = loadDecoder(args.reference)
+    with tempfile.TemporaryDirectory() as directory:
+        capture = args.capture
+        if capture == None:
+            from magnum.maggen import TrafficGenerator, writeCapture
+            generator = TrafficGenerator(seed=args.seed, stacked=True, start=1767268800,
+                                         split=args.split, merge=args.merge, errors=args.errors)
+            capture = os.path.join(directory, "traffic.txt")
+            with open(capture, "w") as file:
+                writeCapture(generator.frames(count=args.frames), file)
+        result = verify(capture, candidate, reference=reference, packets=args.packets, limit=args.limit)
+    result.update(capture=args.capture, candidate=dict(result["candidate"], name=args.candidate),
+                  reference=dict(result["reference"], name=args.reference))
+    for mismatch in result["details"]:
+        print(f"sample {mismatch['sample']} {mismatch['kind']} {mismatch['detail']}: "
+              f"reference {mismatch['reference']} candidate {mismatch['candidate']}\n  {mismatch['hex']}",
+              file=sys.stderr)
+    print(f"{result['frames']} packets in {result['samples']} samples, {result['mismatches']} mismatches", file=sys.stderr)
+    print(f"{'Decoder':40}{'Parse s':>10}{'Update s':>10}{'Packets/s':>12}", file=sys.stderr)
+    for name in ("reference", "candidate"):
+        timing = result[name]
+        print(f"{timing['name']:40}{timing['parse']:10.3f}{timing['update']:10.3f}{timing['rate']:12.0f}", file=sys.stderr)
+    if args.output == "-":
+        print(json.dumps(result, indent=2))
+    elif args.output != None:
+        with open(args.output, "w") as file:
+            json.dump(result, file, indent=2)
+    if result["mismatches"] > 0:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,313 @@
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# Writes allinone rows to rotating CSV files or, if pyarrow is installed, Parquet files.
+# Rows are buffered in memory and written as a block when enough rows have been collected
+# or enough time has passed.
+#
+#  maglog --directory /var/log/magnum --interval 10
+#
+import csv
+import os
+import signal
+import sys
+import time
+
+from datetime import datetime, timezone
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+import magnum
+from magnum.magschema import FlatSchema
+
+
+class RollingWriter:
+    '''
+    Append flat rows to files that are rotated on a schedule.
+    Each comm_device has its own column layout and files, named prefix_device_time.
+    A new file is also started whenever the column layout of a comm_device changes.
+
+    :param directory: Folder for the files, defaults to the current folder
+    :type directory: str, optional
+    :param prefix: Start of each file name, the rest is the comm_device and the time the file was started, defaults to magnum
+    :type prefix: str, optional
+    :param format: csv or parquet, defaults to csv
+    :type format: str, optional
+    :param rotate: Seconds before a new file is started, defaults to 86400 (1 day)
+    :type rotate: float, optional
+    :param flushrows: Rows to buffer before writing, defaults to 1000
+    :type flushrows: int, optional
+    :param flushseconds: Seconds before buffered rows are written regardless, defaults to 600
+    :type flushseconds: float, optional
+    '''
+
+    def __init__(self, directory=".", prefix="magnum", format="csv", rotate=86400, flushrows=1000, flushseconds=600):
+        format = format.lower()
+        if format not in ("csv", "parquet"):
+            raise ValueError(f"Unsupported format {format}")
+        if format == "parquet" and pyarrow == None:
+            raise ValueError("The parquet format requires the pyarrow package")
+        self.directory = directory
+        self.prefix = prefix
+        self.format = format
+        self.rotate = rotate
+        self.flushrows = flushrows
+        self.flushseconds = flushseconds
+        self.logs = {}
+        self.rowcount = 0
+        self.flushed = time.monotonic()
+
+    def write(self, alldata, flush=True):
+        '''
+        Buffer a magdump style document, or list of documents, as rows
+
+        :param alldata: A dictionary with datetime, comm_device and data items
+        :type alldata: dict
+        :param flush: Write the buffered rows when flushrows or flushseconds is reached, False holds them until flush(), defaults to True
+        :type flush: boolean, optional
+        '''
+        if type(alldata) != list:
+            alldata = [alldata]
+        for item in alldata:
+            log = self.logs.get(item['comm_device'])
+            if log == None:
+                log = _LogFile(self, item['comm_device'])
+                self.logs[item['comm_device']] = log
+            if log.schema.update(item['data']) and len(log.rows) > 0:
+                #
+                # rows buffered under the old layout are kept apart, they go to the old file
+                #
+                log.blocks.append((log.columns, log.types, log.rows))
+                log.rows = []
+            log.columns = log.schema.columns
+            log.rows.append(log.schema.row(item))
+            log.types = log.schema.columnTypes()
+            self.rowcount += 1
+        if flush and (self.rowcount >= self.flushrows or time.monotonic() - self.flushed >= self.flushseconds):
+            self.flush()
+
+    def flush(self):
+        '''
+        Write all buffered rows
+        '''
+        self.flushed = time.monotonic()
+        for log in self.logs.values():
+            log.flush()
+        self.rowcount = 0
+
+    def discard(self):
+        '''
+        Drop all buffered rows
+        '''
+        for log in self.logs.values():
+            log.blocks = []
+            log.rows = []
+        self.rowcount = 0
+
+    def close(self):
+        '''
+        Write all buffered rows and close the current files
+        '''
+        self.flush()
+        for log in self.logs.values():
+            log.close()
+
+
+class _LogFile:
+    '''
+    The layout, buffered rows and current file of one comm_device
+    '''
+
+    def __init__(self, owner, comm_device):
+        self.owner = owner
+        self.format = owner.format
+        #
+        # /dev/ttyUSB0 is named ttyUSB0, anything that can't be in a file name is replaced
+        #
+        name = os.path.basename(comm_device.rstrip("/\\")) or "device"
+        self.name = "".join([character if character.isalnum() or character in "-." else "_" for character in name])
+        self.schema = FlatSchema()
+        self.blocks = []
+        self.rows = []
+        self.columns = self.schema.columns
+        self.types = self.schema.columnTypes()
+        self.filename = None
+        self.file = None
+        self.writer = None
+        self.filecolumns = None
+        self.filetypes = None
+        self.opened = 0.0
+
+    def flush(self):
+        for columns, types, rows in self.blocks + [(self.columns, self.types, self.rows)]:
+            self._write(columns, types, rows)
+        self.blocks = []
+        self.rows = []
+
+    def _write(self, columns, types, rows):
+        if len(rows) == 0:
+            return
+        #
+        # a Parquet file is also started again when a column that was always None gets its type
+        #
+        if (self.writer == None or self.filecolumns is not columns
+                or (self.format == "parquet" and self.filetypes != types)
+                or time.monotonic() - self.opened >= self.owner.rotate):
+            self._open(columns, types)
+        if self.format == "csv":
+            self.writer.writerows(rows)
+            self.file.flush()
+        else:
+            self.writer.write_table(self._table(columns, rows))
+
+    def close(self):
+        self._close()
+
+    def _open(self, columns, types):
+        self._close()
+        directory = self.owner.directory
+        stamp = datetime.now(timezone.utc).astimezone().strftime("%Y%m%dT%H%M%S")
+        basename = f"{self.owner.prefix}_{self.name}_{stamp}"
+        self.filename = os.path.join(directory, f"{basename}.{self.format}")
+        count = 0
+        while os.path.exists(self.filename):
+            count += 1
+            self.filename = os.path.join(directory, f"{basename}_{count}.{self.format}")
+        self.filecolumns = columns
+        self.filetypes = types
+        self.opened = time.monotonic()
+        if self.format == "csv":
+            self.file = open(self.filename, "w", newline="")
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(columns)
+        else:
+            self.writer = pyarrow.parquet.ParquetWriter(self.filename, self._arrowschema(columns, types),
+                                                        compression="zstd")
+
+    def _close(self):
+        if self.format == "csv":
+            if self.file != None:
+                self.file.close()
+        elif self.writer != None:
+            self.writer.close()
+        self.file = None
+        self.writer = None
+
+    #
+    # Parquet columns are typed from the types the schema has learned for each field.
+    # Numbers are stored as float64 as some fields switch between int and float
+    #
+    def _arrowschema(self, columns, types):
+        fields = [pyarrow.field("datetime", pyarrow.timestamp("s", tz="UTC")),
+                  pyarrow.field("comm_device", pyarrow.string())]
+        for index in range(2, len(columns)):
+            arrowtype = pyarrow.string()
+            if types[index] == bool:
+                arrowtype = pyarrow.bool_()
+            elif types[index] == float:
+                arrowtype = pyarrow.float64()
+            fields.append(pyarrow.field(columns[index], arrowtype))
+        return pyarrow.schema(fields)
+
+    def _table(self, columns, rows):
+        schema = self.writer.schema
+        arrays = [pyarrow.array([datetime.fromisoformat(row[0]) for row in rows], type=schema.field(0).type),
+                  pyarrow.array([row[1] for row in rows], type=pyarrow.string())]
+        for index in range(2, len(columns)):
+            arrowtype = schema.field(index).type
+            values = [row[index] for row in rows]
+            if arrowtype == pyarrow.string():
+                values = [None if value == None else str(value) for value in values]
+            elif arrowtype == pyarrow.float64():
+                values = [value if type(value) in (int, float) else None for value in values]
+            arrays.append(pyarrow.array(values, type=arrowtype))
+        return pyarrow.Table.from_arrays(arrays, schema=schema)
+
+
+def sigint_handler(signal, frame):
+    print('Interrupted. Shutting down.')
+    sys.exit(0)
+
+
+def main():
+    #
+    # imported here as importing magnum.magnum may wait for the system to settle after boot
+    #
+    from magnum.magnum import Magnum
+    from magnum.magparser import MagnumArgumentParser
+
+    signal.signal(signal.SIGINT, sigint_handler)
+    parser = MagnumArgumentParser(description="Magnum Data Logger", prog="maglog", fromfile_prefix_chars='@',
+                                  epilog="Refer to https://github.com/CharlesGodwin/pymagnum for details")
+    parser.add_argument("--device", "-d", nargs='+', default=f"{'/dev/ttyUSB0' if parser.isPosix else 'COM1'}",
+                        help="Serial device name (default: %(default)s). You can specify more than one.")
+    parser.add_argument("--interval", "-i", default=60, type=int, dest='interval',
+                        help="Interval, in seconds, between log records (default: %(default)s)")
+    parser.add_argument("--directory", default=".",
+                        help="Folder for the log files (default: %(default)s)")
+    parser.add_argument("--format", default="csv", choices=["csv", "parquet"],
+                        help="Type of log file. parquet requires the pyarrow package (default: %(default)s)")
+    parser.add_argument("--verbose", '-v', action="store_true", default=False,
+                        help="Display options at runtime (default: %(default)s)")
+    seldom = parser.add_argument_group("Seldom used")
+    seldom.add_argument('--version', action='version',
+                        version="%(prog)s Version:{}".format(magnum.__version__))
+    seldom.add_argument("--prefix", default="magnum",
+                        help="Start of each log file name (default: %(default)s)")
+    seldom.add_argument("--rotate", default=86400, type=int,
+                        help="Seconds before a new log file is started (default: %(default)s)")
+    seldom.add_argument("--flushrows", default=1000, type=int,
+                        help="Rows buffered in memory before writing (default: %(default)s)")
+    seldom.add_argument("--flushseconds", default=600, type=int,
+                        help="Seconds before buffered rows are written (default: %(default)s)")
+    seldom.add_argument("--packets", default=50, type=int,
+                        help="Number of packets to generate in reader (default: %(default)s)")
+    seldom.add_argument("--timeout", default=0.005, type=float,
+                        help="Timeout for serial read (default: %(default)s)")
+    seldom.add_argument("--nocleanup", action="store_true", default=False, dest='cleanpackets',
+                        help="Suppress clean up of unknown packets (default: False)")
+    args = parser.magnum_parse_args()
+    if args.verbose:
+        print('Magnum Logger Version:{0}'.format(magnum.__version__))
+        print(f"Options:{str(args)[10:-1]}")
+    magnumReaders = {}
+    for device in args.device:
+        try:
+            magnumReader = Magnum(device=device, packets=args.packets,
+                                  timeout=args.timeout, cleanpackets=args.cleanpackets)
+            magnumReader.getDevices()  # test read to see if all's good
+            magnumReaders[magnumReader.getComm_Device()] = magnumReader
+        except Exception as e:
+            print("{0} {1}".format(device, str(e)))
+    if len(magnumReaders) == 0:
+        print("Error: There are no usable devices connected.")
+        exit(2)
+    writer = RollingWriter(directory=args.directory, prefix=args.prefix, format=args.format, rotate=args.rotate,
+                           flushrows=args.flushrows, flushseconds=args.flushseconds)
+    try:
+        while True:
+            start = time.time()
+            timestamp = datetime.now(timezone.utc).replace(microsecond=0).astimezone().isoformat()
+            for comm_device, magnumReader in magnumReaders.items():
+                try:
+                    devices = magnumReader.getDevices()
+                    if len(devices) != 0:
+                        writer.write({"datetime": timestamp, "device": "MAGNUM",
+                                      "comm_device": comm_device, "data": devices})
+                except Exception as e:
+                    print("{0} {1}".format(comm_device, str(e)))
+            sleep = args.interval - (time.time() - start)
+            if sleep > 0:
+                time.sleep(sleep)
+    finally:
+        writer.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#
+# Copyright (c) 2026 Charles Godwin <magnum@godwin.ca>
+#
+# SPDX-License-Identifier:    BSD-3-Clause
+#
+# Replaying a spool must write every document to the sink once, even when the sink fails part way
+#
+#  python -m pytest tests
+#
+import sqlite3
+
+import pytest
+
+from magnum.magspool import Spool, SpooledSink
+from magnum.magsql import SQLSink
+
+
+class FailingConnection:
+    '''
+    A sqlite3 connection that fails the first time it is given a row with one value
+    '''
+
+    def __init__(self, connection, failon):
+        self.connection = connection
+        self.failon = failon
+
+    def cursor(self):
+        return FailingCursor(self, self.connection.cursor())
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def close(self):
+        pass
+
+
+class FailingCursor:
+
+    def __init__(self, owner, cursor):
+        self.owner = owner
+        self.cursor = cursor
+
+    def execute(self, *args):
+        return self.cursor.execute(*args)
+
+    def executemany(self, statement, rows):
+        if any(self.owner.failon in row for row in rows):
+            self.owner.failon = None
+            raise sqlite3.OperationalError("database is locked")
+        return self.cursor.executemany(statement, rows)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
+
+def document(index):
+    return {"datetime": f"2026-01-01T00:{index // 60:02d}:{index % 60:02d}+00:00", "device": "MAGNUM", "comm_device": "test",
+            "data": [{"device": "INVERTER", "data": {"sample": index}}]}
+
+
+def test_replay_failure_writes_each_document_once(tmp_path):
+    database = sqlite3.connect(tmp_path / "magnum.db")
+    database.execute("CREATE TABLE INVERTER (datetime TEXT, comm_device TEXT, sample INTEGER)")
+    #
+    # writing the fifth document fails once
+    #
+    connection = FailingConnection(database, failon=4)
+    sink = SQLSink(lambda: connection, batchrows=1)
+    spooled = SpooledSink(sink, str(tmp_path / "spool"), batch=1, backoff=0)
+    #
+    # the database is down while the first six documents arrive
+    #
+    spooled.retry = float("inf")
+    for index in range(6):
+        spooled.write(document(index))
+    spooled.retry = 0.0
+    assert not spooled.flush()
+    spooled.retry = 0.0
+    assert spooled.flush()
+    spooled.write(document(6))
+    spooled.close()
+    samples = [row[0] for row in database.execute("SELECT sample FROM INVERTER ORDER BY sample")]
+    assert samples == list(range(7))
+    assert sink.batchrows == 1
+
+
+def test_replay_reads_every_document_across_segments(tmp_path):
+    database = sqlite3.connect(tmp_path / "magnum.db")
+    database.execute("CREATE TABLE INVERTER (datetime TEXT, comm_device TEXT, sample INTEGER)")
+    sink = SQLSink(lambda: FailingConnection(database, failon=None), batchrows=1)
+    spooled = SpooledSink(sink, Spool(str(tmp_path / "spool"), segmentbytes=5000), batch=1, backoff=0)
+    spooled.retry = float("inf")
+    for index in range(250):
+        spooled.write(document(index))
+    spooled.retry = 0.0
+    assert spooled.flush()
+    spooled.close()
+    samples = [row[0] for row in database.execute("SELECT sample FROM INVERTER ORDER BY sample")]
+    assert samples == list(range(250))
+
+
+def test_sink_without_flush_parameter_is_refused(tmp_path):
+    class Immediate:
+        def write(self, alldata):
+            pass
+    with pytest.raises(ValueError):
+        SpooledSink(Immediate(), str(tmp_path / "spool"))